@@ -0,0 +1,126 @@
+"""
+Address deduplication, so each distinct location is resolved once
+
+Many export rows share one address (chains and branches registered
+several times, repeated exports), but placement and geocoding used to
+resolve every row. dedupe_addresses groups the rows by a canonical key of
+their address columns:
+
+    whitespace collapsed and case folded
+    streets normalized like duplicate detection (normalize_street): umlauts
+    folded, punctuation dropped, 'Straße', 'Strasse' and 'Str.' written as 'str'
+    postal codes without a country prefix ('A-1140', 'D-72221') or inner
+    spaces, numeric codes left-padded to their country's length (Excel
+    drops the leading zero of '01067')
+
+and returns one cleaned representative per group: the first row's values
+with whitespace collapsed and the postal code prefix removed and padded.
+Callers resolve only the representatives (through the gazetteer, the
+built-in tables or a geocoding service) and broadcast the results back to
+every row by indexing with the group codes.
+
+Canonical values are computed once per distinct column value, and the
+run report records the rows and unique addresses of every call
+(dedup_ratio is rows per unique address).
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from duplicate_detection import normalize_street
+from gazetteer import DEFAULT_COUNTRY
+from instrumentation import instrumented, record_metrics
+
+WHITESPACE = re.compile(r'\s+')
+
+# Country prefix of a postal code, e.g. 'A-1140', 'D-72221', 'CH-8000'
+POSTAL_PREFIX = re.compile(r'^[A-Z]{1,3}-\s*(?=\d)')
+
+# Digits of numeric postal codes, for padding codes that lost leading zeros
+POSTAL_CODE_LENGTHS = {
+    'DE': 5, 'FR': 5, 'IT': 5, 'ES': 5, 'FI': 5, 'HR': 5,
+    'AT': 4, 'CH': 4, 'BE': 4, 'LU': 4, 'DK': 4, 'NO': 4, 'HU': 4, 'SI': 4
+}
+
+def clean_text(value):
+    """Value with runs of whitespace collapsed to one space and surrounding whitespace removed"""
+    return WHITESPACE.sub(' ', value).strip()
+
+def text_key(value):
+    """Comparison key of a text value: whitespace collapsed and case folded"""
+    return clean_text(value).casefold()
+
+def clean_postal_code(postal_code, country):
+    """Postal code without country prefix, padded to the country's length when numeric"""
+    postal_code = POSTAL_PREFIX.sub('', clean_text(postal_code).upper())
+    length = POSTAL_CODE_LENGTHS.get(country or DEFAULT_COUNTRY)
+    if length and postal_code.isdigit() and len(postal_code) < length:
+        postal_code = postal_code.zfill(length)
+    return postal_code
+
+def postal_key(postal_code, country):
+    """Comparison key of a postal code: cleaned and without inner spaces"""
+    return clean_postal_code(postal_code, country).replace(' ', '')
+
+def distinct_values(values):
+    """(codes, distinct values as str) of a column; missing values are ''"""
+    codes, uniques = pd.factorize(values)
+    distinct = [str(value) for value in uniques]
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(distinct), codes)
+        distinct.append('')
+    return codes, distinct
+
+def combine_codes(code_arrays):
+    """Codes of the distinct combinations of several code arrays, in order of first appearance"""
+    combined = np.zeros(len(code_arrays[0]), dtype=np.int64)
+    for codes in code_arrays:
+        combined = pd.factorize(combined * (int(codes.max(initial=0)) + 1) + codes)[0]
+    return combined
+
+def first_positions(codes):
+    """Position of the first row of every code 0..k-1 (codes numbered by first appearance)"""
+    running_max = np.maximum.accumulate(codes) if len(codes) else codes
+    return np.flatnonzero(np.diff(running_max, prepend=-1) > 0)
+
+@instrumented(rows=False)
+def dedupe_addresses(df, columns):
+    """Group the rows of df by the canonical key of the given address columns
+
+    Returns (codes, locations): codes[i] is the group of row i and
+    locations a DataFrame with the cleaned values of the columns for each
+    group, by order of first appearance. A postal_code column is cleaned
+    with the row's country when a country column is given too.
+    """
+
+    countries = distinct_values(df['country']) if 'country' in columns else None
+    value_codes = {}
+    cleaned = {}
+    key_codes = []
+
+    for column in columns:
+        codes, values = distinct_values(df[column])
+        if column == 'postal_code' and countries is not None:
+            # Padding depends on the country, so the distinct (postal code, country) pairs are cleaned
+            country_codes, country_values = countries
+            pair_codes = combine_codes([codes, country_codes])
+            pairs = [(values[codes[i]], clean_text(country_values[country_codes[i]]).upper())
+                     for i in first_positions(pair_codes)]
+            codes = pair_codes
+            cleaned[column] = [clean_postal_code(*pair) for pair in pairs]
+            keys = [postal_key(*pair) for pair in pairs]
+        else:
+            cleaned[column] = [clean_text(value) for value in values]
+            keys = [(normalize_street if column == 'street' else text_key)(value) for value in values]
+        value_codes[column] = codes
+        key_codes.append(pd.factorize(pd.Series(keys, dtype=object))[0][codes])
+
+    codes = combine_codes(key_codes)
+    first = first_positions(codes)
+    locations = pd.DataFrame({column: np.array(cleaned[column], dtype=object)[value_codes[column][first]]
+                              for column in columns})
+
+    record_metrics(addresses=len(codes), unique_addresses=len(locations))
+    return codes, locations
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the processing stages on synthetic exports
+
+For every size a seeded synthetic export is generated (see
+synthetic_export.py, cached in benchmark_data/) and each stage of
+improved_data_processor.py is run on it:
+
+    clean_and_standardize_data   read and clean the export (bypassing the clean cache)
+    clean_country_codes          country column of the raw export
+    create_improved_geocoded_data   placement of the cleaned customers
+    save_data_for_map            customers_for_map.json
+    create_clean_csv_summary     customer_summary_clean.csv
+
+Each stage is timed (best of --repeat runs) and then run once more in a
+forked child process for its peak memory. The child returns the free heap
+it inherited to the system and resets its peak (on Linux), so the growth
+of its peak resident set size (VmHWM, or ru_maxrss) is the memory the
+stage adds, Arrow buffers and other native allocations included. The
+stages run inside benchmark_data/ starting from an empty city
+canonicalizer cache, so runs are comparable.
+
+Results are compared with benchmark_baseline.json: a stage that got more
+than --tolerance slower or hungrier than its baseline is reported as a
+regression and the script exits with status 1. --save-baseline replaces
+the baseline entries of the measured sizes.
+
+Usage:  python benchmark.py [--sizes 10000 100000 1000000 10000000] [--repeat N]
+                            [--tolerance 0.25] [--save-baseline]
+"""
+
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+import improved_data_processor as processor
+from city_canonicalizer import DEFAULT_CACHE_FILE
+from synthetic_export import write_synthetic_export
+
+BASELINE_FILE = 'benchmark_baseline.json'
+DATA_DIR = 'benchmark_data'
+DEFAULT_SIZES = [10000, 100000, 1000000, 10000000]
+DEFAULT_SEED = 42
+DEFAULT_TOLERANCE = 0.25
+
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS = 0.05
+MIN_PEAK_MB = 5.0
+
+STAGES = ['clean_and_standardize_data', 'clean_country_codes', 'create_improved_geocoded_data',
+          'save_data_for_map', 'create_clean_csv_summary']
+
+def synthetic_export(rows, seed=DEFAULT_SEED):
+    """Path of the synthetic export with rows rows, generated on first use"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    filename = os.path.join(DATA_DIR, f'synthetic_{rows}_{seed}.csv')
+    if not os.path.exists(filename):
+        write_synthetic_export(filename, rows, seed=seed)
+    return filename
+
+def release_free_memory():
+    """Return freed heap and Arrow pool memory to the operating system where possible"""
+    gc.collect()
+    if pa is not None:
+        pa.default_memory_pool().release_unused()
+    with contextlib.suppress(OSError, AttributeError):
+        ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim(0)
+
+def reset_peak_rss():
+    """Reset the process's peak resident set size to its current size (Linux only, no-op elsewhere)"""
+    with contextlib.suppress(OSError):
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+
+def peak_rss():
+    """Peak resident set size of the process so far (MB)
+
+    Read from VmHWM on Linux, which follows reset_peak_rss (ru_maxrss does not).
+    """
+    with contextlib.suppress(OSError):
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1e3
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1e6 if sys.platform == 'darwin' else 1e3)
+
+def peak_rss_mb(function):
+    """Peak resident memory (MB) that function adds, measured in a forked child process
+
+    The child hands the free memory it inherited back to the system and
+    resets its peak, so the stage cannot hide allocations in pages freed
+    by earlier stages. The growth of its peak is the stage's own peak,
+    native allocations included.
+    """
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        status = 0
+        try:
+            release_free_memory()
+            reset_peak_rss()
+            start = peak_rss()
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+            os.write(write_end, str(peak_rss() - start).encode())
+        except BaseException:
+            status = 1
+        os._exit(status)
+
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as f:
+        growth = f.read()
+    _, status = os.waitpid(pid, 0)
+    if status != 0 or not growth:
+        raise RuntimeError(f"Stage failed in the memory measurement process (status {status})")
+    return float(growth)
+
+def measure(function, repeat=1):
+    """Run function quietly; returns (best seconds, peak RSS MB)"""
+
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        del result
+
+    return best, peak_rss_mb(function)
+
+def stage_functions(source):
+    """(stage name, function) of every stage, chained through the results of the previous ones"""
+
+    results = {}
+
+    def clean():
+        results['df'] = processor.clean_and_standardize_data(source, cache=False)
+        return results['df']
+
+    def countries():
+        return processor.clean_country_codes(results['raw']['country'])
+
+    def placement():
+        results['records'] = processor.create_improved_geocoded_data(results['df'])
+        return results['records']
+
+    def map_data():
+        return processor.save_data_for_map(results['records'], 'customers_for_map.json')
+
+    def summary():
+        return processor.create_clean_csv_summary(results['df'], 'customer_summary_clean.csv')
+
+    results['raw'] = processor.read_customer_export(source)
+    return results, list(zip(STAGES, [clean, countries, placement, map_data, summary]))
+
+def run_size(rows, seed=DEFAULT_SEED, repeat=1):
+    """Timings and peak memory of every stage on a synthetic export of rows rows"""
+
+    source = os.path.abspath(synthetic_export(rows, seed))
+    previous = os.getcwd()
+    os.chdir(DATA_DIR)
+    try:
+        if os.path.exists(DEFAULT_CACHE_FILE):
+            os.remove(DEFAULT_CACHE_FILE)
+        processor.city_canonicalizer.cache_clear()
+
+        measured = {}
+        results, stages = stage_functions(source)
+        for stage, function in stages:
+            seconds, peak_mb = measure(function, repeat)
+            measured[stage] = {'seconds': round(seconds, 4), 'peak_rss_mb': round(peak_mb, 1)}
+            print(f"  {stage:<32} {seconds:9.3f} s {peak_mb:10.1f} MB")
+        results.clear()
+    finally:
+        os.chdir(previous)
+
+    return measured
+
+def load_baseline(filename=BASELINE_FILE):
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'results': {}}
+
+def save_baseline(baseline, filename=BASELINE_FILE):
+    baseline['environment'] = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count()
+    }
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Baseline saved to {filename}")
+
+def find_regressions(measured, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Descriptions of the stages of one size that are slower or use more memory than the baseline"""
+
+    regressions = []
+    for stage, result in measured.items():
+        reference = baseline.get(stage)
+        if reference is None:
+            continue
+        for key, unit, noise in (('seconds', 's', MIN_SECONDS), ('peak_rss_mb', 'MB', MIN_PEAK_MB)):
+            if key not in reference:
+                continue
+            limit = reference[key] * (1 + tolerance)
+            if result[key] > limit and result[key] - reference[key] > noise:
+                regressions.append(f"{stage}: {result[key]} {unit} (baseline {reference[key]} {unit})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the processing stages on synthetic exports')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='export sizes in rows')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='seed of the synthetic exports')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (the best one counts)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed relative slowdown or memory growth over the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    regressions = []
+
+    for rows in args.sizes:
+        print(f"\n=== {rows} rows ===")
+        measured = run_size(rows, seed=args.seed, repeat=args.repeat)
+        key = str(rows)
+        for regression in find_regressions(measured, baseline['results'].get(key, {}), args.tolerance):
+            regressions.append(f"{rows} rows, {regression}")
+        if args.save_baseline:
+            baseline['results'][key] = measured
+
+    if args.save_baseline:
+        save_baseline(baseline)
+    elif regressions:
+        print(f"\n{len(regressions)} regressions against {BASELINE_FILE}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    else:
+        print(f"\nNo regressions against {BASELINE_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ Check for Munich customers in the generated data
 
 import json
 
+from search_index import SearchIndex
+
 def check_munich_customers():
     try:
         with open('customers_for_map.json', 'r', encoding='utf-8') as f:
@@ -13,12 +15,19 @@ def check_munich_customers():
         
         print(f"Total customers: {len(data['customers'])}")
         
+        # Use the prebuilt search index unless it is missing or was built from other data
+        try:
+            index = SearchIndex.open_default(data['customers'])
+        except ValueError as e:
+            print(f"{e}, building the search index from the loaded data")
+            index = None
+        if index is None:
+            index = SearchIndex.from_customers(data['customers'])
+        by_id = {customer['id']: customer for customer in data['customers']}
+        
         # Find Munich customers
-        munich_customers = []
-        for customer in data['customers']:
-            city = str(customer['city']).strip()
-            if 'München' in city or 'Munich' in city:
-                munich_customers.append(customer)
+        munich_ids = set(index.search('München', field='city')) | set(index.search('Munich', field='city'))
+        munich_customers = [customer for customer in data['customers'] if customer['id'] in munich_ids]
         
         print(f"\nMunich customers found: {len(munich_customers)}")
         
@@ -35,10 +44,10 @@ def check_munich_customers():
         major_cities = ['Berlin', 'Hamburg', 'Köln', 'Frankfurt', 'Stuttgart', 'Düsseldorf']
         print(f"\nChecking other major cities:")
         for city_name in major_cities:
-            city_customers = [c for c in data['customers'] if city_name in str(c['city'])]
+            city_customers = [by_id[i] for i in index.search(city_name, field='city')]
             print(f"  {city_name}: {len(city_customers)} customers")
             
-    except Exception as e:
+    except (OSError, ValueError) as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+"""
+City name canonicalization against the known city table
+
+Export city values come in many spellings of the same place ('Muenchen',
+'MÜNCHEN', 'München ', 'München-Pasing'). Each distinct value is mapped to
+a canonical known name, or to None, by trying in order:
+
+1. the folded name (case, ä/ö/ü/ß -> ae/oe/ue/ss, accents, punctuation),
+   also with umlauts written without the e ('Munchen', 'Lubeck'). Aliases
+   include the official long names ('Frankfurt am Main', 'Halle (Saale)')
+2. a known name followed by a trailing part after a separator or in
+   parentheses, when that part is one of its known districts
+   ('München-Pasing', 'Köln - Porz', 'Hamburg (Altona)') or a generic
+   qualifier ('Berlin, Germany', 'Berlin 10'). Any other trailing part
+   names a different place ('Halle/Westfalen' is not Halle (Saale),
+   'Münster-Sarmsheim' is not Münster, 'Essen / Oldenburg' is not Essen)
+   or a state, so the value is left unknown rather than guessed
+3. the nearest known name within a small edit distance, found through a
+   BK-tree. Only long names with the same first letter are matched this
+   way: the known table holds the larger cities, and an edit on a short
+   name or on the first letter usually spells a different town ('Freiberg'
+   is not 'Freiburg', 'Röttingen' is not 'Göttingen')
+
+Results are memoized and persisted in city_canonical_cache.json, keyed by a
+hash of the known names, aliases and districts, so each distinct value is
+resolved once and later runs only resolve values they have not seen.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+from search_index import fold_text
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_FILE = 'city_canonical_cache.json'
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+PARENTHESISED = re.compile(r'^(.*?)\s*\((.*)\)\s*$')
+DISTRICT_SEPARATOR = re.compile(r'\s*[-/,]\s*')
+TRAILING_NUMBER = re.compile(r'^(.*?)\s+(\d+)$')
+
+# Trailing parts that qualify any city without naming another place (folded keys)
+GENERIC_QUALIFIERS = {'de', 'brd', 'deutschland', 'germany', 'stadt', 'city', 'innenstadt', 'zentrum'}
+
+def city_key(name):
+    """Comparison key of a city name: folded, punctuation collapsed to single spaces"""
+    return NON_ALNUM.sub(' ', fold_text(name)).strip()
+
+def plain_key(key):
+    """Key with folded umlauts reduced to the bare vowel (muenchen -> munchen)"""
+    return key.replace('ae', 'a').replace('oe', 'o').replace('ue', 'u')
+
+def qualified_parts(name):
+    """(city key, trailing part key) pairs of a name split before a parenthesised part, separator or number"""
+    folded = fold_text(str(name)).strip()
+    splits = []
+    for match in (PARENTHESISED.match(folded), TRAILING_NUMBER.match(folded)):
+        if match:
+            splits.append(match.groups())
+    parts = DISTRICT_SEPARATOR.split(folded, maxsplit=1)
+    if len(parts) == 2:
+        splits.append(parts)
+
+    keys = []
+    for head, tail in splits:
+        key = (city_key(head), city_key(tail))
+        if all(key) and key not in keys:
+            keys.append(key)
+    return keys
+
+def max_edit_distance(key):
+    """Edit distance tolerated when matching a key of this length"""
+    if len(key) < 10:
+        return 0
+    if len(key) < 16:
+        return 1
+    return 2
+
+def levenshtein(a, b, limit):
+    """Levenshtein distance of a and b, or limit + 1 once it is known to exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    """Burkhard-Keller tree over strings for bounded edit distance search"""
+
+    # Distances only need to be exact up to this bound for the tree to stay valid
+    MAX_DISTANCE = 64
+
+    def __init__(self, words=()):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = levenshtein(word, node[0], self.MAX_DISTANCE)
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, {})
+                return
+            node = node[1][distance]
+
+    def nearest(self, word, limit):
+        """Closest word within limit edits as (distance, word), ties broken alphabetically; None if none"""
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            candidate, children = stack.pop()
+            distance = levenshtein(word, candidate, self.MAX_DISTANCE)
+            if distance <= limit and (best is None or (distance, candidate) < best):
+                best = (distance, candidate)
+            for child_distance, child in children.items():
+                if distance - limit <= child_distance <= distance + limit:
+                    stack.append(child)
+        return best
+
+class CityCanonicalizer:
+    """Memoized mapping of raw city values to canonical known city names"""
+
+    def __init__(self, known_names, aliases=None, districts=None, cache_file=DEFAULT_CACHE_FILE):
+        self.keys = {city_key(name): name for name in known_names}
+        for alias, name in (aliases or {}).items():
+            self.keys.setdefault(city_key(alias), name)
+        self.plain_keys = {}
+        for key, name in sorted(self.keys.items()):
+            self.plain_keys.setdefault(plain_key(key), name)
+        self.districts = {name: {city_key(district) for district in names}
+                          for name, names in (districts or {}).items()}
+
+        self.tree = BKTree(sorted(self.keys))
+        self.cache_file = cache_file
+        known = [sorted(self.keys.items()), sorted((name, sorted(keys)) for name, keys in self.districts.items())]
+        self.fingerprint = hashlib.sha256(json.dumps([CACHE_VERSION, known], ensure_ascii=False)
+                                          .encode('utf-8')).hexdigest()[:16]
+        self.memo = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """Load persisted results if they were made against the same known names"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except json.JSONDecodeError:
+            return
+        if cache.get('version') == CACHE_VERSION and cache.get('fingerprint') == self.fingerprint:
+            self.memo = cache.get('cities', {})
+
+    def save(self):
+        """Persist the memoized results (only if something new was resolved)"""
+        if not self.cache_file or not self.dirty:
+            return
+        # Write to a private file and rename, so concurrent worker processes never see a partial cache
+        temporary = f'{self.cache_file}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'fingerprint': self.fingerprint, 'cities': self.memo},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temporary, self.cache_file)
+        self.dirty = False
+
+    def lookup(self, key):
+        """Known name of a city key, also with umlauts written without the e, or None"""
+        return self.keys.get(key) or self.plain_keys.get(plain_key(key))
+
+    def resolve(self, name):
+        """Canonical known name of a raw city value, or None (not memoized)"""
+        key = city_key(name)
+        known = self.lookup(key)
+        if known:
+            return known
+
+        for city, part in qualified_parts(name):
+            known = self.lookup(city)
+            if known and (part in GENERIC_QUALIFIERS or part.isdigit() or part in self.districts.get(known, ())):
+                return known
+
+        limit = max_edit_distance(key)
+        match = self.tree.nearest(key, limit) if limit else None
+        if match is not None and match[1][0] == key[0]:
+            return self.keys[match[1]]
+        return None
+
+    def canonicalize(self, name):
+        """Memoized canonical name of a raw city value, or None"""
+        name = str(name)
+        if name not in self.memo:
+            self.memo[name] = self.resolve(name)
+            self.dirty = True
+        return self.memo[name]
+
+    def canonicalize_many(self, values):
+        """Canonical name of every value ('' where unknown), resolving each distinct value once"""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna('').astype(str))
+        canonical = [self.canonicalize(value) or '' for value in uniques]
+        self.save()
+        return pd.Series(canonical + [''], dtype=object).to_numpy()[codes]
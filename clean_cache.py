@@ -0,0 +1,100 @@
+"""
+Content-addressed cache of cleaned customer tables
+
+Every run parses and cleans the whole export before it reaches placement
+or the summaries, although the cleaned table only changes when the export
+or the cleaning rules do. cached_table stores the cleaned table in cache/
+as an Arrow IPC file named after a key of
+
+    the SHA-256 of the export file's bytes
+    the name and version of the cleaning step
+    anything else the cleaning depends on (e.g. configured country aliases)
+
+When the key matches, the file is memory-mapped instead of parsing and
+cleaning: numeric columns and Arrow strings are then views of the mapped
+file and only the pandas wrappers are built. The files are written
+uncompressed so they can be mapped. Only the newest file of each cleaning
+step is kept.
+
+Bump the version of a cleaning step whenever its rules change.
+
+pyarrow is optional: without it nothing is cached and every run cleans.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from instrumentation import instrumented
+
+CACHE_DIR = 'cache'
+HASH_BLOCK_SIZE = 1 << 20
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(path, name, version, extra=None):
+    """Key of the cleaned table of path made by cleaning step name at version"""
+    payload = json.dumps([name, version, file_digest(path), extra], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+def cache_filename(name, key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'{name}.{key}.arrow')
+
+def string_types(string_dtype):
+    """types_mapper giving Arrow string columns string_dtype (None keeps pyarrow's default)"""
+    if string_dtype is None:
+        return None
+    return {pyarrow.string(): string_dtype, pyarrow.large_string(): string_dtype}.get
+
+@instrumented
+def load_table(filename, string_dtype=None):
+    """Memory-map a cached table as a DataFrame"""
+    source = pyarrow.memory_map(filename)
+    table = pyarrow.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=string_types(string_dtype))
+
+@instrumented(rows=False)
+def save_table(df, filename):
+    """Write a DataFrame (with its index) as an uncompressed Arrow IPC file"""
+    table = pyarrow.Table.from_pandas(df, preserve_index=True)
+    temp_file = f'{filename}.{os.getpid()}.tmp'
+    with pyarrow.OSFile(temp_file, 'wb') as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_file, filename)
+
+def cached_table(path, name, version, build, extra=None, string_dtype=None, cache_dir=CACHE_DIR):
+    """The cleaned table of path: loaded from the cache when its key matches, else build() and cached
+
+    build is called without arguments and returns the cleaned DataFrame.
+    string_dtype is the pandas dtype string columns are loaded with.
+    """
+
+    if pyarrow is None:
+        print("pyarrow is not installed, the cleaned data is not cached")
+        return build()
+
+    filename = cache_filename(name, cache_key(path, name, version, extra), cache_dir)
+    if os.path.exists(filename):
+        print(f"Loading cleaned data from {filename}")
+        return load_table(filename, string_dtype)
+
+    df = build()
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(cache_filename(name, '*', cache_dir)):
+        os.remove(stale)
+    save_table(df, filename)
+    print(f"Cleaned data cached in {filename}")
+    return df
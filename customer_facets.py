@@ -0,0 +1,164 @@
+"""
+Facet counts and id lists of the cleaned customers, from one aggregation pass
+
+A single groupby over (country, city, is_active) yields the positions of
+every group. The country x status counts behind customer_summary_clean.csv,
+the city counts and the per-facet id lists are all derived from those
+groups. The data quality counters are counted in the same call. Frames can
+be added chunk by chunk, so the streaming pipeline uses the same engine,
+and the facets of separately processed partitions can be merged.
+
+customers_facets.json holds:
+
+    total, active, inactive     customer counts
+    quality                     records with street / postal_code / city / country
+    country_status              {country: {"active": n, "inactive": n}}
+    cities                      [[country, city, count], ...] by descending count
+    ids                         {"status": {"active": [...], "inactive": [...]},
+                                 "country": {country: [...]}}, sorted customer ids
+
+A country or status filter is then an intersection of sorted id lists
+instead of a scan over all customers.
+"""
+
+import json
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_FACETS_FILE = 'customers_facets.json'
+QUALITY_FIELDS = ['street', 'postal_code', 'city', 'country']
+
+def factorize_text(series):
+    """Codes and distinct values (as str) of a text column, without decoding categorical rows
+
+    Missing values get code -1, which picks the trailing 'nan' entry.
+    """
+    codes, uniques = pd.factorize(series)
+    return codes, np.array([str(value) for value in np.asarray(uniques, dtype=object)] + ['nan'], dtype=object)
+
+def data_quality_counts(df):
+    """Number of records with a non-empty value in each of QUALITY_FIELDS"""
+    return {field: int((df[field].to_numpy(dtype=object, na_value='nan') != '').sum()) for field in QUALITY_FIELDS}
+
+class CustomerFacets:
+    """Accumulates facet counts and id lists over one or more cleaned customer frames"""
+
+    def __init__(self):
+        self.total = 0
+        self.active = 0
+        self.quality = dict.fromkeys(QUALITY_FIELDS, 0)
+        self.groups = defaultdict(int)
+        self.status_ids = {True: [], False: []}
+        self.country_ids = defaultdict(list)
+
+    @classmethod
+    def from_frame(cls, df):
+        facets = cls()
+        facets.add(df)
+        return facets
+
+    def add(self, df):
+        """Add the customers of a cleaned frame (with id, country, city and is_active columns)"""
+
+        if len(df) == 0:
+            return self
+
+        ids = df['id'].to_numpy()
+        is_active = df['is_active'].to_numpy(dtype=bool)
+        country_codes, countries = factorize_text(df['country'])
+        city_codes, cities = factorize_text(df['city'])
+
+        self.total += len(df)
+        self.active += int(is_active.sum())
+        for field, count in data_quality_counts(df).items():
+            self.quality[field] += count
+
+        # Grouping by the integer codes; the names are looked up once per group
+        grouped = pd.DataFrame({'country': country_codes, 'city': city_codes,
+                                'is_active': is_active}).groupby(['country', 'city', 'is_active'], sort=False)
+        for (country_code, city_code, active), positions in grouped.indices.items():
+            country, city = countries[country_code], cities[city_code]
+            self.groups[country, city, bool(active)] += len(positions)
+            group_ids = ids[positions]
+            self.status_ids[bool(active)].append(group_ids)
+            self.country_ids[country].append(group_ids)
+
+        return self
+
+    def merge(self, other, id_offset=0):
+        """Add the counts and ids of another CustomerFacets, shifting its ids by id_offset"""
+
+        self.total += other.total
+        self.active += other.active
+        for field, count in other.quality.items():
+            self.quality[field] += count
+        for key, count in other.groups.items():
+            self.groups[key] += count
+        for active, chunks in other.status_ids.items():
+            self.status_ids[active].extend(chunk + id_offset for chunk in chunks)
+        for country, chunks in other.country_ids.items():
+            self.country_ids[country].extend(chunk + id_offset for chunk in chunks)
+
+        return self
+
+    def country_status_counts(self):
+        """Series of customer counts per (country, is_active), ignoring rows without a valid country"""
+        counts = defaultdict(int)
+        for (country, _, active), count in self.groups.items():
+            if country != '':
+                counts[country, active] += count
+        index = pd.MultiIndex.from_tuples(sorted(counts), names=['country', 'is_active'])
+        return pd.Series([counts[key] for key in index], index=index, dtype='int64')
+
+    def city_counts(self):
+        """[(country, city, count)] of every non-empty city, by descending count"""
+        counts = defaultdict(int)
+        for (country, city, _), count in self.groups.items():
+            if city != '':
+                counts[country, city] += count
+        return sorted(((country, city, count) for (country, city), count in counts.items()),
+                      key=lambda item: (-item[2], item[0], item[1]))
+
+    def facet_ids(self):
+        """Sorted customer id lists per status and per country"""
+        def merged(chunks):
+            return np.sort(np.concatenate(chunks)).tolist() if chunks else []
+
+        return {
+            'status': {'active': merged(self.status_ids[True]), 'inactive': merged(self.status_ids[False])},
+            'country': {country: merged(chunks) for country, chunks in sorted(self.country_ids.items()) if country}
+        }
+
+    def to_dict(self):
+        country_status = {}
+        for (country, active), count in self.country_status_counts().items():
+            country_status.setdefault(country, {'active': 0, 'inactive': 0})['active' if active else 'inactive'] = int(count)
+
+        return {
+            'total': self.total,
+            'active': self.active,
+            'inactive': self.total - self.active,
+            'quality': self.quality,
+            'country_status': country_status,
+            'cities': [list(item) for item in self.city_counts()],
+            'ids': self.facet_ids()
+        }
+
+    def save(self, filename=DEFAULT_FACETS_FILE):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+        print(f"Facet index saved to {filename}")
+
+    def print_quality(self):
+        """Print the record counts and data quality counters"""
+        print(f"Records with addresses: {self.total}")
+        print(f"Active customers: {self.active}")
+        print(f"Inactive customers: {self.total - self.active}")
+
+        print(f"\nData quality:")
+        print(f"Records with street: {self.quality['street']}")
+        print(f"Records with postal code: {self.quality['postal_code']}")
+        print(f"Records with city: {self.quality['city']}")
+        print(f"Records with country: {self.quality['country']}")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Indexed queries over the customer map data
+
+improved_data_processor.py --query-index writes a query index next to
+customers_for_map.json, so questions like "customers in Köln" or "within
+25 km of this point" are answered without parsing the JSON:
+
+    customers_query.bin     columnar container (map_binary.py), one row per
+                            customer sorted by grid cell, then id:
+                              id, cell, latitude, longitude, is_active,
+                              place (row of places in customers_query.json),
+                              place_order (rows sorted by place, then id),
+                              customer_identifier
+    customers_query.json    version, cell_degrees, customers and places:
+                            [[country, city key, city name, count], ...]
+                            sorted by country and city key
+
+Cells form a cell_degrees lat/lng grid numbered row-major from the south
+west, so the cells of one grid row inside a bounding box are one contiguous
+range of rows. City keys are folded like the search index (case, umlauts,
+accents, white space), so 'Köln', 'KOELN' and 'koeln ' are one city; the
+city name is its most common spelling.
+
+Only numpy is needed to query; the file is memory-mapped and only the rows
+that are printed are decoded.
+
+Usage:
+    python customer_query.py city NAME [--country CC]
+    python customer_query.py near LAT LNG RADIUS_KM
+    python customer_query.py bbox SOUTH WEST NORTH EAST
+    python customer_query.py top-cities [N] [--country CC]
+Every command takes --active (active customers only) and --limit N (rows to print)
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from map_binary import ColumnFile, write_columns, FLOAT32, INT32, BITSET, STRING
+from search_index import fold_text
+
+FORMAT_VERSION = 1
+DEFAULT_QUERY_INDEX = 'customers_query.bin'
+DEFAULT_CELL_DEGREES = 0.1
+EARTH_RADIUS_KM = 6371.0088
+
+def city_key(city):
+    """Folded comparison key of a city name"""
+    return ' '.join(fold_text(city).split())
+
+def sidecar_filename(filename):
+    return filename.rsplit('.bin', 1)[0] + '.json'
+
+def grid_columns(cell_degrees):
+    return int(math.ceil(360.0 / cell_degrees))
+
+def grid_cells(lat, lng, cell_degrees):
+    """Row-major grid cell number of each point"""
+    rows = np.clip(np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / cell_degrees), 0,
+                   math.ceil(180.0 / cell_degrees) - 1)
+    columns = np.clip(np.floor((np.asarray(lng, dtype=np.float64) + 180.0) / cell_degrees), 0,
+                      grid_columns(cell_degrees) - 1)
+    return (rows * grid_columns(cell_degrees) + columns).astype(np.int64)
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Vectorized great-circle distance in km"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def write_query_index(customers, filename=DEFAULT_QUERY_INDEX, cell_degrees=DEFAULT_CELL_DEGREES):
+    """Build the query index of customer records (a list of dicts) and save it"""
+    import pandas as pd
+
+    df = pd.DataFrame(customers, columns=['id', 'customer_identifier', 'is_active', 'city', 'country',
+                                          'latitude', 'longitude'])
+    cities = df['city'].fillna('').astype(str)
+    countries = df['country'].fillna('').astype(str)
+
+    codes, uniques = pd.factorize(cities)
+    keys = pd.Series([city_key(city) for city in uniques] + [''], dtype=object).to_numpy()[codes]
+    places = pd.DataFrame({'country': countries, 'key': keys, 'city': cities})
+    place_codes, place_index = pd.factorize(pd.MultiIndex.from_frame(places[['country', 'key']]), sort=True)
+
+    # Name each place after its most common spelling
+    spellings = places.assign(place=place_codes).groupby(['place', 'city'], sort=False).size()
+    names = spellings.sort_values(ascending=False, kind='stable').reset_index().drop_duplicates('place')
+    names = names.set_index('place')['city'].sort_index()
+    counts = np.bincount(place_codes, minlength=len(place_index))
+
+    ids = df['id'].to_numpy(dtype=np.int64)
+    # Cells are assigned from the stored float32 coordinates so queries see the same values
+    lat = df['latitude'].to_numpy(dtype=np.float32)
+    lng = df['longitude'].to_numpy(dtype=np.float32)
+    cells = grid_cells(lat, lng, cell_degrees)
+    order = np.lexsort((ids, cells))
+    place_order = np.lexsort((ids[order], place_codes[order]))
+
+    write_columns(filename, len(df), [
+        ('id', INT32, ids[order]),
+        ('cell', INT32, cells[order]),
+        ('latitude', FLOAT32, lat[order]),
+        ('longitude', FLOAT32, lng[order]),
+        ('is_active', BITSET, df['is_active'].fillna(False).astype(bool).to_numpy()[order]),
+        ('place', INT32, place_codes[order]),
+        ('place_order', INT32, place_order),
+        ('customer_identifier', STRING, df['customer_identifier'].fillna('').astype(str).to_numpy()[order])
+    ])
+
+    with open(sidecar_filename(filename), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': FORMAT_VERSION,
+            'cell_degrees': cell_degrees,
+            'customers': len(df),
+            'places': [[country, key, names[i], int(counts[i])] for i, (country, key) in enumerate(place_index)]
+        }, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"Query index saved to {filename} ({len(df)} customers, {len(place_index)} cities)")
+
+class QueryIndex:
+    """Memory-mapped query index; queries return row numbers of the index"""
+
+    def __init__(self, filename=DEFAULT_QUERY_INDEX):
+        with open(sidecar_filename(filename), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported query index version: {meta.get('version')}")
+
+        self.columns = ColumnFile(filename)
+        self.cell_degrees = meta['cell_degrees']
+        self.places = meta['places']
+        self.place_start = np.concatenate([[0], np.cumsum([place[3] for place in self.places])]).astype(np.int64)
+        self.places_by_key = {}
+        for row, (_, key, _, _) in enumerate(self.places):
+            self.places_by_key.setdefault(key, []).append(row)
+
+        self.ids = self.columns.column('id')
+        self.cells = self.columns.column('cell')
+        self.lat = self.columns.column('latitude')
+        self.lng = self.columns.column('longitude')
+        self.place = self.columns.column('place')
+        self.place_order = self.columns.column('place_order')
+        self._active = None
+
+    @classmethod
+    def open_default(cls, filename=DEFAULT_QUERY_INDEX):
+        """Open the index, or return None if it has not been built"""
+        if not os.path.exists(filename):
+            return None
+        return cls(filename)
+
+    @property
+    def active(self):
+        if self._active is None:
+            self._active = self.columns.column('is_active')
+        return self._active
+
+    def in_city(self, name, country=None):
+        """Rows of the customers in a city (any spelling folding to the same key), by id"""
+        places = [place for place in self.places_by_key.get(city_key(name), [])
+                  if country is None or self.places[place][0] == country]
+        rows = [self.place_order[self.place_start[place]:self.place_start[place + 1]] for place in places]
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate(rows)
+        return rows[np.argsort(self.ids[rows], kind='stable')]
+
+    def cell_ranges(self, south, west, north, east):
+        """Rows of the cells overlapping a box (west <= east), grid row by grid row"""
+        columns = grid_columns(self.cell_degrees)
+        first = grid_cells([south, north], [west, east], self.cell_degrees)
+        grid_rows = np.arange(first[0] // columns, first[1] // columns + 1)
+        starts = np.searchsorted(self.cells, grid_rows * columns + first[0] % columns, side='left')
+        ends = np.searchsorted(self.cells, grid_rows * columns + first[1] % columns, side='right')
+        rows = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        return np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+    def in_bbox(self, south, west, north, east):
+        """Rows of the customers inside a box; west > east crosses the antimeridian"""
+        if west > east:
+            return np.concatenate([self.in_bbox(south, west, north, 180.0), self.in_bbox(south, -180.0, north, east)])
+        rows = self.cell_ranges(south, west, north, east)
+        lat, lng = self.lat[rows].astype(np.float64), self.lng[rows].astype(np.float64)
+        return rows[(lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)]
+
+    def within(self, lat, lng, radius_km):
+        """(rows, distances in km) of the customers within radius_km of a point, nearest first"""
+        degrees = math.degrees(radius_km / EARTH_RADIUS_KM)
+        south, north = max(lat - degrees, -90.0), min(lat + degrees, 90.0)
+        widest = max(abs(south), abs(north))
+        if widest >= 90.0 or degrees / math.cos(math.radians(widest)) >= 180.0:
+            west, east = -180.0, 180.0
+        else:
+            span = degrees / math.cos(math.radians(widest))
+            west, east = (lng - span + 180.0) % 360.0 - 180.0, (lng + span + 180.0) % 360.0 - 180.0
+
+        rows = self.in_bbox(south, west, north, east)
+        distances = haversine_km(lat, lng, self.lat[rows], self.lng[rows])
+        inside = distances <= radius_km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+    def top_cities(self, count=10, country=None, active_only=False):
+        """[(city name, country, customers)] of the largest cities"""
+        if active_only:
+            counts = np.bincount(self.place[self.active], minlength=len(self.places)).tolist()
+        else:
+            counts = [place[3] for place in self.places]
+        places = [(-counts[row], place[0], place[1], place[2]) for row, place in enumerate(self.places)
+                  if place[1] and counts[row] and (country is None or place[0] == country)]
+        places.sort()
+        return [(name, place_country, -customers) for customers, place_country, _, name in places[:count]]
+
+    def records(self, rows):
+        """Printable records of some rows"""
+        identifiers = self.columns.strings('customer_identifier', rows.tolist())
+        return [{'id': int(self.ids[row]), 'customer_identifier': identifier,
+                 'city': self.places[self.place[row]][2], 'country': self.places[self.place[row]][0],
+                 'latitude': float(self.lat[row]), 'longitude': float(self.lng[row]),
+                 'is_active': bool(self.active[row])}
+                for row, identifier in zip(rows.tolist(), identifiers)]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Query the customer map data through the prebuilt index')
+    parser.add_argument('--index', default=DEFAULT_QUERY_INDEX, help='query index file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # Options shared by every command, accepted after the command name
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--limit', type=int, default=10, help='customers to print')
+    common.add_argument('--active', action='store_true', help='only active customers')
+
+    city = commands.add_parser('city', parents=[common], help='customers in a city')
+    city.add_argument('name')
+    city.add_argument('--country', help='ISO country code')
+
+    near = commands.add_parser('near', parents=[common], help='customers within a radius of a point')
+    near.add_argument('lat', type=float)
+    near.add_argument('lng', type=float)
+    near.add_argument('radius_km', type=float)
+
+    bbox = commands.add_parser('bbox', parents=[common], help='customers in a bounding box')
+    for name in ('south', 'west', 'north', 'east'):
+        bbox.add_argument(name, type=float)
+
+    top = commands.add_parser('top-cities', parents=[common], help='cities with the most customers')
+    top.add_argument('count', type=int, nargs='?', default=10)
+    top.add_argument('--country', help='ISO country code')
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = QueryIndex.open_default(args.index)
+    if index is None:
+        print(f"{args.index} not found, run improved_data_processor.py --query-index first")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    if args.command == 'top-cities':
+        cities = index.top_cities(args.count, args.country, active_only=args.active)
+        elapsed = (time.perf_counter() - start) * 1000
+        for name, country, customers in cities:
+            print(f"  {name} ({country or '?'}): {customers} customers")
+        print(f"{len(cities)} cities ({elapsed:.1f} ms)")
+        return
+
+    distances = None
+    if args.command == 'city':
+        rows = index.in_city(args.name, args.country)
+    elif args.command == 'near':
+        rows, distances = index.within(args.lat, args.lng, args.radius_km)
+    else:
+        rows = index.in_bbox(args.south, args.west, args.north, args.east)
+    if args.active:
+        keep = index.active[rows]
+        rows = rows[keep]
+        distances = distances[keep] if distances is not None else None
+    elapsed = (time.perf_counter() - start) * 1000
+
+    for position, record in enumerate(index.records(rows[:args.limit])):
+        distance = f"  {distances[position]:.2f} km" if distances is not None else ''
+        print(f"  {record['id']:>8}  {record['customer_identifier']}, {record['city']} ({record['country'] or '?'}) "
+              f"{record['latitude']:.5f}, {record['longitude']:.5f}{'' if record['is_active'] else '  inactive'}{distance}")
+    print(f"{len(rows)} customers ({elapsed:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,47 @@
 import pandas as pd
 import numpy as np
 import re
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
-import time
 import json
+from geocode_cache import GeocodeCache
+from geocoding_pipeline import geocode_addresses_concurrently
+from improved_data_processor import iter_customer_export, SOURCE_CSV, TEXT_EXPORT_DTYPES
+from instrumentation import RunReport, instrumented
+from clean_cache import cached_table
+from address_resolution import dedupe_addresses
 
+# Bump whenever the cleaning rules below change so the cached cleaned table is rebuilt
+CLEANING_VERSION = 1
+
+@instrumented
 def clean_customer_data():
     """Clean and standardize customer data from CSV files"""
     
-    # Read the main CSV file
+    # The cleaned table is reused from the clean cache while the export is unchanged
     print("Reading customer data...")
-    df = pd.read_csv('updated_Excel_with_Customer_details - updated_Excel_with_Customer_details.csv.csv')
+    df = cached_table(SOURCE_CSV, 'data_processor', CLEANING_VERSION, clean_export)
+    
+    print(f"Total customers with addresses: {len(df)}")
+    print(f"Active customers: {df['is_active'].sum()}")
+    print(f"Inactive customers: {len(df) - df['is_active'].sum()}")
     
-    # Clean column names
-    df.columns = ['customer_number', 'customer_name', 'is_active', 'street', 'postal_code', 'city', 'country']
+    return df
+
+def clean_export():
+    """Read and clean the export, keeping the records that have an address"""
+    
+    # Read the main CSV file in chunks and clean each chunk on its own,
+    # so only one raw chunk is held in memory at a time
+    df = pd.concat([clean_chunk(chunk) for chunk in iter_customer_export(dtype=TEXT_EXPORT_DTYPES)])
+    
+    # Create customer identifier (name or number if name is missing)
+    df['customer_identifier'] = df.apply(lambda row: 
+        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != '' 
+        else f"Customer {row['customer_number']}", axis=1)
     
-    # Clean the data
-    print("Cleaning data...")
+    return df
+
+def clean_chunk(df):
+    """Clean one chunk of the raw export and keep only rows with address information"""
     
     # Standardize active status
     df['is_active'] = df['is_active'].str.lower().map({'ja': True, 'nein': False, 'yes': True, 'no': False})
@@ -43,18 +67,7 @@ def clean_customer_data():
     df['full_address'] = df.apply(lambda row: create_full_address(row), axis=1)
     
     # Remove rows with no address information
-    df = df[df['full_address'] != '']
-    
-    # Create customer identifier (name or number if name is missing)
-    df['customer_identifier'] = df.apply(lambda row: 
-        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != '' 
-        else f"Customer {row['customer_number']}", axis=1)
-    
-    print(f"Total customers with addresses: {len(df)}")
-    print(f"Active customers: {df['is_active'].sum()}")
-    print(f"Inactive customers: {len(df) - df['is_active'].sum()}")
-    
-    return df
+    return df[df['full_address'] != '']
 
 def create_full_address(row):
     """Create a full address string for geocoding"""
@@ -74,47 +87,54 @@ def create_full_address(row):
     
     return ', '.join(parts) if parts else ''
 
-def geocode_addresses(df, sample_size=None):
-    """Geocode addresses to get coordinates"""
+# Address columns sent to the geocoding services
+ADDRESS_COLUMNS = ['street', 'postal_code', 'city', 'country']
+
+RESULT_COLUMNS = ['customer_number', 'customer_identifier', 'is_active', 'street', 'postal_code', 'city',
+                  'country', 'full_address']
+
+@instrumented
+def geocode_addresses(df, sample_size=None, cache=None, config=None, providers=None):
+    """Geocode addresses to get coordinates
+    
+    Rows are grouped by their canonical address first (see
+    address_resolution), so each distinct address is geocoded once and the
+    coordinates are broadcast to all of its rows. Addresses are resolved
+    concurrently by geocoding_pipeline using the providers, rate limits and
+    retry settings from config.json. Results (including addresses that
+    could not be found) are stored in a persistent GeocodeCache, so
+    unchanged addresses are never sent to a geocoding service again.
+    """
     
     if sample_size:
         df = df.sample(n=min(sample_size, len(df)), random_state=42)
     
-    geolocator = Nominatim(user_agent="aboutwater_customers")
-    
-    coordinates = []
-    
-    for idx, row in df.iterrows():
-        try:
-            print(f"Geocoding: {row['full_address']}")
-            location = geolocator.geocode(row['full_address'])
-            
-            if location:
-                coordinates.append({
-                    'customer_number': row['customer_number'],
-                    'customer_identifier': row['customer_identifier'],
-                    'is_active': row['is_active'],
-                    'street': row['street'],
-                    'postal_code': row['postal_code'],
-                    'city': row['city'],
-                    'country': row['country'],
-                    'full_address': row['full_address'],
-                    'latitude': location.latitude,
-                    'longitude': location.longitude
-                })
-                print(f"✓ Found coordinates: {location.latitude}, {location.longitude}")
-            else:
-                print(f"✗ No coordinates found")
-            
-            # Be respectful to the geocoding service
-            time.sleep(1)
-            
-        except (GeocoderTimedOut, GeocoderUnavailable) as e:
-            print(f"✗ Geocoding error: {e}")
-            continue
-    
-    return pd.DataFrame(coordinates)
+    owns_cache = cache is None
+    if owns_cache:
+        cache = GeocodeCache()
+    
+    codes, locations = dedupe_addresses(df, ADDRESS_COLUMNS)
+    addresses = locations.apply(create_full_address, axis=1).tolist() if len(locations) else []
+    print(f"Geocoding {len(addresses)} distinct addresses for {len(df)} customers")
+    
+    results, stats = geocode_addresses_concurrently(addresses, cache=cache, config=config, providers=providers)
+    
+    found = [results.get(address) for address in addresses]
+    latitude = np.array([result['latitude'] if result else np.nan for result in found])[codes]
+    longitude = np.array([result['longitude'] if result else np.nan for result in found])[codes]
+    geocoded = ~np.isnan(latitude)
+    
+    coordinates = df.loc[geocoded, RESULT_COLUMNS].assign(latitude=latitude[geocoded],
+                                                          longitude=longitude[geocoded])
+    
+    print(f"Geocoding: {stats['cached']} cached, {stats['found']} found, "
+          f"{stats['not_found']} not found, {stats['failed']} failed")
+    if owns_cache:
+        cache.close()
+    
+    return coordinates.reset_index(drop=True)
 
+@instrumented
 def save_processed_data(df, filename='processed_customers.json'):
     """Save processed data to JSON file"""
     data = df.to_dict('records')
@@ -126,33 +146,35 @@ def save_processed_data(df, filename='processed_customers.json'):
 
 def main():
     """Main function to process customer data"""
-    print("Starting customer data processing...")
-    
-    # Clean the data
-    df = clean_customer_data()
-    
-    # For demonstration, let's process a sample first
-    print("\nGeocoding sample addresses...")
-    sample_df = geocode_addresses(df, sample_size=50)
-    
-    if not sample_df.empty:
-        # Save the sample data
-        save_processed_data(sample_df, 'sample_customers_geocoded.json')
+    with RunReport() as report:
+        print("Starting customer data processing...")
+        
+        # Clean the data
+        df = clean_customer_data()
+        
+        # For demonstration, let's process a sample first
+        print("\nGeocoding sample addresses...")
+        sample_df = geocode_addresses(df, sample_size=50)
+        
+        if not sample_df.empty:
+            # Save the sample data
+            save_processed_data(sample_df, 'sample_customers_geocoded.json')
         
-        print(f"\nSuccessfully geocoded {len(sample_df)} addresses")
-        print("Sample data saved to 'sample_customers_geocoded.json'")
+            print(f"\nSuccessfully geocoded {len(sample_df)} addresses")
+            print("Sample data saved to 'sample_customers_geocoded.json'")
         
-        # Show some statistics
-        print(f"\nActive customers geocoded: {sample_df['is_active'].sum()}")
-        print(f"Inactive customers geocoded: {len(sample_df) - sample_df['is_active'].sum()}")
+            # Show some statistics
+            print(f"\nActive customers geocoded: {sample_df['is_active'].sum()}")
+            print(f"Inactive customers geocoded: {len(sample_df) - sample_df['is_active'].sum()}")
         
-        # Show countries
-        countries = sample_df['country'].value_counts()
-        print(f"\nCountries represented:")
-        for country, count in countries.head(10).items():
-            print(f"  {country}: {count}")
-    else:
-        print("No addresses were successfully geocoded")
+            # Show countries
+            countries = sample_df['country'].value_counts()
+            print(f"\nCountries represented:")
+            for country, count in countries.head(10).items():
+                print(f"  {country}: {count}")
+        else:
+            print("No addresses were successfully geocoded")
+    report.save()
 
 if __name__ == "__main__":
     main()
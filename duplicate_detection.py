@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Duplicate customer detection (record linkage)
+
+Records are blocked by postal code (or by city when the postal code is
+missing); records in different blocks are never compared. Inside a block
+two sorted-neighbourhood passes generate candidate pairs: one over the
+records sorted by normalized street, one sorted by normalized
+customer_identifier. Each record is compared with the next WINDOW - 1
+records only, so the work is O(n * window) instead of O(n**2) even for
+large blocks.
+
+Pairs are scored with the Dice coefficient of character trigrams:
+
+    score = 0.5 * street similarity + 0.4 * name similarity + 0.1 * same city
+
+Missing streets and cities count as no match, so records without an
+address only pair up on near-identical names at most. Pairs scoring at
+least the threshold are joined into clusters (union-find). Blocks are spread over worker processes by postal code, so
+the result does not depend on the number of workers.
+
+Output (customer_duplicates.csv) has one row per record in a duplicate
+cluster: cluster, id, customer_number, customer_identifier, street,
+postal_code, city and score (its best match within the cluster).
+
+Usage:  python duplicate_detection.py
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from search_index import fold_text
+
+DEFAULT_DUPLICATES_FILE = 'customer_duplicates.csv'
+DEFAULT_WINDOW = 5
+DEFAULT_THRESHOLD = 0.8
+
+STREET_WEIGHT = 0.5
+NAME_WEIGHT = 0.4
+CITY_WEIGHT = 0.1
+
+# Below this many rows the process pool costs more than it saves
+MIN_PARALLEL_ROWS = 50000
+
+STREET_SUFFIX = re.compile(r'(str\.|strasse|straße)(?=\s|\d|$)')
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+LEGAL_FORMS = re.compile(r'\b(gmbh|ag|kg|ohg|ug|e\s?v|co|mbh|haftungsbeschrankt)\b')
+
+def normalize_street(street):
+    """Fold case/umlauts, unify Str./Straße/Strasse and drop punctuation ('hauptstr.5' -> 'hauptstr 5')"""
+    street = STREET_SUFFIX.sub('str ', str(street).lower())
+    return NON_ALNUM.sub(' ', fold_text(street)).strip()
+
+def normalize_name(name):
+    """Fold case/umlauts and drop punctuation and legal forms (GmbH, AG, ...)"""
+    name = NON_ALNUM.sub(' ', fold_text(name))
+    return ' '.join(LEGAL_FORMS.sub(' ', name).split())
+
+def trigram_set(text):
+    """Trigrams of a string padded with spaces, so short strings still get some (empty for '')"""
+    if not text:
+        return frozenset()
+    padded = f'  {text} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def dice(a, b):
+    """Dice coefficient of two trigram sets (0 when either is empty)"""
+    if not a or not b:
+        return 0.0
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+def normalize_distinct(values, normalize):
+    """Apply normalize once per distinct value and broadcast the results back"""
+    codes, uniques = pd.factorize(values.astype(str))
+    return np.array([normalize(value) for value in uniques], dtype=object)[codes] if len(codes) else \
+        np.array([], dtype=object)
+
+def prepare_records(df):
+    """Normalized blocking and comparison columns of a cleaned customer frame"""
+
+    postal = df['postal_code'].astype(str).str.replace(' ', '', regex=False).str.upper().to_numpy(dtype=object)
+    city = normalize_distinct(df['city'], fold_text)
+    return pd.DataFrame({
+        'id': df['id'].to_numpy(),
+        'block': np.where(postal != '', 'P' + postal + '|' + df['country'].astype(str).to_numpy(dtype=object),
+                          'C' + city),
+        'street': normalize_distinct(df['street'], normalize_street),
+        'name': normalize_distinct(df['customer_identifier'], normalize_name),
+        'city': city
+    })
+
+def trigram_sets(values):
+    """Trigram set of every value, built once per distinct value"""
+    codes, uniques = pd.factorize(values)
+    sets = [trigram_set(value) for value in uniques]
+    return [sets[code] for code in codes.tolist()]
+
+def score_block_partition(records, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    """Find matching pairs within the blocks of one partition
+
+    Returns (id_a, id_b, score) arrays with id_a < id_b.
+    """
+
+    records = records.reset_index(drop=True)
+    ids = records['id'].tolist()
+    blocks = records['block'].tolist()
+    cities = records['city'].tolist()
+    streets = trigram_sets(records['street'])
+    names = trigram_sets(records['name'])
+
+    pairs = {}
+    for sort_column in ('street', 'name'):
+        order = records.sort_values(['block', sort_column, 'id'], kind='stable').index.tolist()
+        for position, i in enumerate(order):
+            for j in order[position + 1:position + window]:
+                if blocks[j] != blocks[i]:
+                    break
+                key = (ids[i], ids[j]) if ids[i] < ids[j] else (ids[j], ids[i])
+                if key in pairs:
+                    continue
+                score = (STREET_WEIGHT * dice(streets[i], streets[j]) +
+                         NAME_WEIGHT * dice(names[i], names[j]) +
+                         CITY_WEIGHT * (cities[i] != '' and cities[i] == cities[j]))
+                pairs[key] = score
+
+    matches = [(a, b, score) for (a, b), score in pairs.items() if score >= threshold]
+    if not matches:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    id_a, id_b, scores = zip(*matches)
+    return np.array(id_a, dtype=np.int64), np.array(id_b, dtype=np.int64), np.array(scores)
+
+def find_duplicate_pairs(df, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD, workers=None):
+    """Matching (id_a, id_b, score) pairs of a cleaned customer frame, using all cores for large inputs"""
+
+    records = prepare_records(df)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if len(records) < MIN_PARALLEL_ROWS:
+        workers = 1
+
+    # Whole blocks go to one partition, so partitioning never loses pairs
+    partition = pd.util.hash_array(records['block'].to_numpy(dtype=object)) % np.uint64(workers * 4)
+    partitions = [group for _, group in records.groupby(partition, sort=True)]
+
+    if workers == 1:
+        results = [score_block_partition(part, window, threshold) for part in partitions]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(score_block_partition, partitions,
+                                        [window] * len(partitions), [threshold] * len(partitions)))
+
+    if not results:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def cluster_pairs(id_a, id_b, scores):
+    """Union-find clusters of matched pairs
+
+    Returns a DataFrame with id, cluster (numbered from 1 by smallest member
+    id) and score (best pair score of the record).
+    """
+
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(x, x) != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for a, b in zip(id_a.tolist(), id_b.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    best = pd.concat([pd.Series(scores, index=id_a), pd.Series(scores, index=id_b)]).groupby(level=0).max()
+    members = best.index.to_numpy()
+    roots = np.array([find(member) for member in members.tolist()], dtype=np.int64)
+
+    clusters = pd.DataFrame({'id': members, 'root': roots, 'score': best.to_numpy()})
+    clusters['cluster'] = pd.factorize(clusters['root'], sort=True)[0] + 1
+    return clusters[['id', 'cluster', 'score']].sort_values(['cluster', 'id']).reset_index(drop=True)
+
+def detect_duplicates(df, filename=DEFAULT_DUPLICATES_FILE, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+                      workers=None):
+    """Find duplicate clusters in a cleaned customer frame and write them as CSV"""
+
+    id_a, id_b, scores = find_duplicate_pairs(df, window, threshold, workers)
+    clusters = cluster_pairs(id_a, id_b, scores)
+
+    columns = ['id', 'customer_number', 'customer_identifier', 'street', 'postal_code', 'city']
+    result = clusters.merge(df[columns], on='id', how='left')
+    result['score'] = result['score'].round(3)
+    result = result[['cluster'] + columns + ['score']]
+    result.to_csv(filename, index=False)
+
+    print(f"Duplicate detection: {len(id_a)} matching pairs, {result['cluster'].nunique()} clusters "
+          f"covering {len(result)} records, saved to {filename}")
+    return result
+
+def main():
+    from improved_data_processor import clean_and_standardize_data
+    detect_duplicates(clean_and_standardize_data())
+
+if __name__ == "__main__":
+    main()
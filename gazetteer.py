@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline postal-code / city / country gazetteer
+
+The index is built once from GeoNames postal code dumps
+(https://download.geonames.org/export/zip/, tab separated: country code,
+postal code, place name, admin names/codes, latitude, longitude, accuracy)
+plus the built-in GERMAN_CITIES and COUNTRY_COORDS tables, and stored as a
+directory of .npy files:
+
+    index.json            metadata (format version, entry counts, sources)
+    <level>_keys.npy      sorted UTF-8 keys, fixed-width bytes ('DE|72221', 'DE|haiterbach', 'DE')
+    <level>_coords.npy    float32 array of shape (n, 3): latitude, longitude, spread
+
+for the levels 'postal', 'city' and 'country'. Opening the index memory-maps
+the arrays, so startup takes milliseconds and only touched pages are read.
+
+Build:  python gazetteer.py build DE.txt AT.txt CH.txt ...
+"""
+
+import json
+import os
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DEFAULT_GAZETTEER_DIR = 'gazetteer'
+LEVELS = ['postal', 'city', 'country']
+
+# Precision of a resolved coordinate, from best to worst
+PRECISION_POSTAL = 3
+PRECISION_CITY = 2
+PRECISION_COUNTRY = 1
+PRECISION_DEFAULT = 0
+
+# Jitter (degrees) applied around centroids read from the GeoNames dumps
+POSTAL_SPREAD = 0.02
+CITY_SPREAD = 0.05
+
+# Country used when a row has no (known) country
+DEFAULT_COUNTRY = 'DE'
+
+def normalize_postal(postal_codes):
+    """Normalize postal codes for lookup (upper case, inner whitespace removed)"""
+    postal_codes = np.char.upper(np.char.strip(np.asarray(postal_codes, dtype=str)))
+    return np.char.replace(postal_codes, ' ', '')
+
+def normalize_city(cities):
+    """Normalize city names for lookup (lower case, surrounding whitespace removed)"""
+    return np.char.lower(np.char.strip(np.asarray(cities, dtype=str)))
+
+def make_keys(*parts):
+    """Join equally long string arrays into 'A|B' lookup keys"""
+    keys = np.asarray(parts[0], dtype=str)
+    for part in parts[1:]:
+        keys = np.char.add(np.char.add(keys, '|'), np.asarray(part, dtype=str))
+    return keys
+
+def read_geonames(path):
+    """Yield (country, postal_code, city, lat, lng) from a GeoNames postal code dump"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 11:
+                continue
+            try:
+                lat = float(fields[9])
+                lng = float(fields[10])
+            except ValueError:
+                continue
+            yield fields[0].strip().upper(), fields[1], fields[2], lat, lng
+
+def centroid_table(sums, spread):
+    """Turn {key: [lat_sum, lng_sum, count]} into {key: (lat, lng, spread)}"""
+    return {key: (lat / count, lng / count, spread) for key, (lat, lng, count) in sums.items()}
+
+def write_level(out_dir, level, table):
+    """Write one level of the index as sorted fixed-width keys plus a float32 coordinate array"""
+    keys = sorted(key.encode('utf-8') for key in table)
+    width = max((len(key) for key in keys), default=1)
+    key_array = np.array(keys, dtype=f'S{width}')
+    coords = np.array([table[key.decode('utf-8')] for key in keys], dtype=np.float32).reshape(-1, 3)
+
+    np.save(os.path.join(out_dir, f'{level}_keys.npy'), key_array)
+    np.save(os.path.join(out_dir, f'{level}_coords.npy'), coords)
+    return len(keys)
+
+def build_gazetteer(sources=(), out_dir=DEFAULT_GAZETTEER_DIR):
+    """Build the index from GeoNames postal code dumps plus the built-in coordinate tables"""
+    from improved_data_processor import COUNTRY_COORDS, GERMAN_CITIES, CITY_ALIASES
+
+    postal_sums = defaultdict(lambda: [0.0, 0.0, 0])
+    city_sums = defaultdict(lambda: [0.0, 0.0, 0])
+
+    for path in sources:
+        print(f"Reading {path}...")
+        for country, postal_code, city, lat, lng in read_geonames(path):
+            postal_key = country + '|' + postal_code.strip().upper().replace(' ', '')
+            city_key = country + '|' + city.strip().lower()
+            for sums, key in ((postal_sums, postal_key), (city_sums, city_key)):
+                entry = sums[key]
+                entry[0] += lat
+                entry[1] += lng
+                entry[2] += 1
+
+    postal = centroid_table(postal_sums, POSTAL_SPREAD)
+    city = centroid_table(city_sums, CITY_SPREAD)
+
+    # The hand-maintained city table wins over GeoNames centroids
+    for name, coords in GERMAN_CITIES.items():
+        key = 'DE|' + name.strip().lower()
+        city[key] = (coords['lat'], coords['lng'], coords['spread'])
+    for alias, name in CITY_ALIASES.items():
+        coords = GERMAN_CITIES[name]
+        city['DE|' + alias.strip().lower()] = (coords['lat'], coords['lng'], coords['spread'])
+
+    country = {code: (coords['lat'], coords['lng'], coords['spread']) for code, coords in COUNTRY_COORDS.items()}
+
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    for level, table in zip(LEVELS, (postal, city, country)):
+        counts[level] = write_level(out_dir, level, table)
+
+    metadata = {
+        'format_version': FORMAT_VERSION,
+        'counts': counts,
+        'sources': [os.path.basename(path) for path in sources]
+    }
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"Gazetteer written to {out_dir}: {counts}")
+    return metadata
+
+class Gazetteer:
+    """Memory-mapped gazetteer index with vectorized postal code -> city -> country lookup"""
+
+    def __init__(self, directory=DEFAULT_GAZETTEER_DIR):
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported gazetteer format in {directory}: {self.metadata.get('format_version')}")
+
+        self.keys = {}
+        self.coords = {}
+        for level in LEVELS:
+            self.keys[level] = np.load(os.path.join(directory, f'{level}_keys.npy'), mmap_mode='r')
+            self.coords[level] = np.load(os.path.join(directory, f'{level}_coords.npy'), mmap_mode='r')
+
+    @classmethod
+    def open_default(cls, directory=DEFAULT_GAZETTEER_DIR):
+        """Open the index in directory, or return None if it has not been built"""
+        if not os.path.exists(os.path.join(directory, 'index.json')):
+            return None
+        return cls(directory)
+
+    def find(self, level, keys):
+        """Return the row of each key in the given level (-1 if absent)"""
+        index_keys = self.keys[level]
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(keys) == 0 or len(index_keys) == 0:
+            return rows
+
+        encoded = np.char.encode(np.asarray(keys, dtype=str), 'utf-8')
+        # Keys longer than the index width would be truncated and could match a prefix
+        fits = np.char.str_len(encoded) <= index_keys.dtype.itemsize
+        queries = encoded.astype(index_keys.dtype)
+
+        positions = np.searchsorted(index_keys, queries)
+        positions = np.minimum(positions, len(index_keys) - 1)
+        found = fits & (index_keys[positions] == queries)
+        rows[found] = positions[found]
+        return rows
+
+    def lookup(self, countries, postal_codes, cities):
+        """Resolve rows to coordinates with a postal code -> city -> country fallback
+
+        Returns (lat, lng, spread, precision) arrays. Rows whose country is
+        empty or unknown fall back to DEFAULT_COUNTRY with PRECISION_DEFAULT.
+        Each distinct key is looked up once.
+        """
+
+        raw_countries = np.char.upper(np.char.strip(np.asarray(countries, dtype=str)))
+        countries = np.where(raw_countries == '', DEFAULT_COUNTRY, raw_countries)
+        n = len(countries)
+
+        lat = np.zeros(n, dtype=np.float64)
+        lng = np.zeros(n, dtype=np.float64)
+        spread = np.zeros(n, dtype=np.float64)
+        precision = np.full(n, -1, dtype=np.int8)
+
+        postal_keys = make_keys(countries, normalize_postal(postal_codes))
+        city_keys = make_keys(countries, normalize_city(cities))
+        default_keys = np.full(n, DEFAULT_COUNTRY)
+
+        for level, keys, level_precision in (('postal', postal_keys, PRECISION_POSTAL),
+                                             ('city', city_keys, PRECISION_CITY),
+                                             ('country', raw_countries, PRECISION_COUNTRY),
+                                             ('country', default_keys, PRECISION_DEFAULT)):
+            todo = np.flatnonzero(precision < 0)
+            if len(todo) == 0:
+                break
+
+            uniques, inverse = np.unique(keys[todo], return_inverse=True)
+            rows = self.find(level, uniques)[inverse]
+            hit = rows >= 0
+
+            targets = todo[hit]
+            coords = np.asarray(self.coords[level][rows[hit]], dtype=np.float64)
+            lat[targets] = coords[:, 0]
+            lng[targets] = coords[:, 1]
+            spread[targets] = coords[:, 2]
+            precision[targets] = level_precision
+
+        return lat, lng, spread, precision
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python gazetteer.py build [GEONAMES_FILE ...]")
+        sys.exit(1)
+    build_gazetteer(sys.argv[2:])
+
+if __name__ == "__main__":
+    main()
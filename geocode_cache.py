@@ -0,0 +1,123 @@
+import re
+import sqlite3
+import time
+
+# Sentinel returned by GeocodeCache.get when an address has never been looked up
+MISS = object()
+
+DEFAULT_CACHE_PATH = 'geocode_cache.sqlite'
+
+# Found coordinates are kept for 180 days, failed lookups are retried after 7 days
+DEFAULT_TTL = 180 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 100000
+
+def normalize_address(address):
+    """Normalize an address string into a cache key (case, whitespace and separator spacing)"""
+    if address is None:
+        return ''
+    key = str(address).casefold()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+    return key.strip(' ,')
+
+class GeocodeCache:
+    """Persistent SQLite-backed cache of geocoding results
+
+    Entries are keyed on the normalized address and store the provider,
+    confidence and time of the lookup. Positive results expire after ttl
+    seconds, negative results (address not found) after negative_ttl.
+    Once the cache holds more than max_entries rows the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                address_key TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                provider TEXT,
+                confidence REAL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_geocode_last_used ON geocode_cache (last_used)')
+        self.conn.commit()
+
+    def get(self, address, now=None):
+        """Return the cached result for address, None for a cached negative result or MISS"""
+        now = time.time() if now is None else now
+        key = normalize_address(address)
+
+        row = self.conn.execute(
+            'SELECT latitude, longitude, provider, confidence, created_at FROM geocode_cache WHERE address_key = ?',
+            (key,)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return MISS
+
+        latitude, longitude, provider, confidence, created_at = row
+        ttl = self.negative_ttl if latitude is None else self.ttl
+        if now - created_at > ttl:
+            self.conn.execute('DELETE FROM geocode_cache WHERE address_key = ?', (key,))
+            self.misses += 1
+            return MISS
+
+        self.conn.execute('UPDATE geocode_cache SET last_used = ? WHERE address_key = ?', (now, key))
+        self.hits += 1
+
+        if latitude is None:
+            return None
+
+        return {
+            'latitude': latitude,
+            'longitude': longitude,
+            'provider': provider,
+            'confidence': confidence
+        }
+
+    def put(self, address, latitude=None, longitude=None, provider=None, confidence=None, now=None):
+        """Store a lookup result; leave latitude/longitude as None to cache a negative result"""
+        now = time.time() if now is None else now
+        key = normalize_address(address)
+
+        self.conn.execute(
+            'INSERT OR REPLACE INTO geocode_cache '
+            '(address_key, latitude, longitude, provider, confidence, created_at, last_used) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, latitude, longitude, provider, confidence, now, now)
+        )
+        self.evict()
+        self.conn.commit()
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_entries"""
+        count = self.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                'DELETE FROM geocode_cache WHERE address_key IN '
+                '(SELECT address_key FROM geocode_cache ORDER BY last_used ASC LIMIT ?)',
+                (excess,)
+            )
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+
+    def close(self):
+        """Commit pending last-used updates and close the database"""
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Nominatim search API
+
+Used to exercise geocoding_pipeline offline: it answers /search requests with
+deterministic coordinates and can inject latency, 503 errors and not-found
+answers. Point the pipeline at it with a config override such as
+
+    "nominatim": {"enabled": true, "domain": "localhost:8089", "scheme": "http", ...}
+
+Run `python geocode_stub_server.py --demo` to start the server and geocode the
+customer export against it, printing throughput and failure statistics.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    """Answer Nominatim-style /search requests"""
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get('q', [''])[0]
+
+        with server.lock:
+            server.request_count += 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if url.path != '/search':
+            self.send_error(404)
+            return
+
+        if server.rng.random() < server.fail_rate:
+            with server.lock:
+                server.error_count += 1
+            self.send_error(503, 'Service Unavailable')
+            return
+
+        digest = hashlib.sha1(query.encode('utf-8')).digest()
+        if digest[0] / 255 < server.not_found_rate:
+            body = []
+        else:
+            lat = 47.0 + digest[1] / 255 * 8.0
+            lon = 6.0 + digest[2] / 255 * 9.0
+            body = [{'lat': str(lat), 'lon': str(lon), 'display_name': query, 'importance': 0.5}]
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, latency=0.0, fail_rate=0.0, not_found_rate=0.0, seed=42):
+    """Start the stub server in a background thread and return it (server.server_port holds the port)"""
+    server = ThreadingHTTPServer(('localhost', port), StubGeocoderHandler)
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.not_found_rate = not_found_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.error_count = 0
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def run_demo(args):
+    """Geocode the customer export against the stub server and report throughput"""
+    from data_processor import clean_customer_data
+    from geocoding_pipeline import geocode_addresses_concurrently
+
+    server = start_stub_server(args.port, args.latency, args.fail_rate, args.not_found_rate)
+    print(f"Stub geocoder listening on localhost:{server.server_port}")
+
+    config = {
+        'geocoding_services': {
+            'nominatim': {
+                'enabled': True,
+                'user_agent': 'aboutwater_stub_demo',
+                'domain': f'localhost:{server.server_port}',
+                'scheme': 'http',
+                'timeout': 5,
+                'max_retries': 3,
+                'requests_per_second': args.rate
+            }
+        },
+        'data_processing': {
+            'batch_size': 100,
+            'max_concurrent_requests': args.concurrency
+        }
+    }
+
+    df = clean_customer_data()
+    addresses = df['full_address'].head(args.limit).tolist()
+
+    start = time.perf_counter()
+    results, stats = geocode_addresses_concurrently(addresses, config=config)
+    elapsed = time.perf_counter() - start
+
+    print(f"\nGeocoded {len(results)} distinct addresses in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s)")
+    print(f"Requests served: {server.request_count}, injected errors: {server.error_count}")
+    print(f"Results: {stats}")
+    server.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Nominatim search API')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--not-found-rate', type=float, default=0.0, help='fraction of addresses that are unknown')
+    parser.add_argument('--demo', action='store_true', help='geocode the customer export against the server')
+    parser.add_argument('--limit', type=int, default=1000, help='number of addresses used by --demo')
+    parser.add_argument('--rate', type=float, default=200.0, help='requests per second allowed by --demo')
+    parser.add_argument('--concurrency', type=int, default=5, help='concurrent requests used by --demo')
+    args = parser.parse_args()
+
+    if args.demo:
+        run_demo(args)
+        return
+
+    server = start_stub_server(args.port, args.latency, args.fail_rate, args.not_found_rate)
+    print(f"Stub geocoder listening on localhost:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
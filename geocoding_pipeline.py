@@ -0,0 +1,191 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from geopy.geocoders import Nominatim, ArcGIS, GoogleV3
+from geopy.exc import GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited
+
+from geocode_cache import MISS
+from improved_data_processor import load_config
+
+# Errors worth retrying against the same provider; any other service error fails over immediately
+RETRYABLE_ERRORS = (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited)
+
+# Provider order used for failover
+PROVIDER_ORDER = ['nominatim', 'arcgis', 'google']
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class Provider:
+    """A geocoder together with its rate limiter (None for no limit) and retry budget"""
+
+    def __init__(self, name, geocoder, limiter=None, max_retries=3):
+        self.name = name
+        self.geocoder = geocoder
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+def build_providers(config=None):
+    """Create the enabled providers from config.json's geocoding_services section
+
+    Each provider gets its own token bucket. The rate is the provider's
+    requests_per_second if set, otherwise 1 / data_processing.delay_between_requests;
+    a provider without a positive, finite rate is not rate limited.
+    """
+
+    if config is None:
+        config = load_config()
+
+    services = config.get('geocoding_services', {})
+    delay = config.get('data_processing', {}).get('delay_between_requests', 1.0)
+    default_rate = 1.0 / delay if delay > 0 else float('inf')
+
+    providers = []
+    for name in PROVIDER_ORDER:
+        settings = services.get(name)
+        if not settings or not settings.get('enabled', False):
+            continue
+
+        options = {'timeout': settings.get('timeout', 10)}
+        if 'domain' in settings:
+            options['domain'] = settings['domain']
+        if 'scheme' in settings:
+            options['scheme'] = settings['scheme']
+
+        if name == 'nominatim':
+            geocoder = Nominatim(user_agent=settings.get('user_agent', 'aboutwater_customers'), **options)
+        elif name == 'arcgis':
+            geocoder = ArcGIS(user_agent=settings.get('user_agent', 'aboutwater_customers'), **options)
+        else:
+            api_key = settings.get('api_key', '')
+            if not api_key or api_key.startswith('YOUR_'):
+                print(f"Skipping {name}: no API key configured")
+                continue
+            geocoder = GoogleV3(api_key=api_key, **options)
+
+        rate = settings.get('requests_per_second', default_rate)
+        limiter = TokenBucket(rate, capacity=max(1, int(rate))) if 0 < rate < float('inf') else None
+        providers.append(Provider(name, geocoder, limiter, settings.get('max_retries', 3)))
+
+    return providers
+
+def geocode_with_failover(address, providers, backoff=0.5):
+    """Geocode one address, retrying with exponential backoff and failing over between providers
+
+    Returns (result, status) where status is 'found', 'not_found' (every
+    provider answered but none knew the address) or 'failed' (at least one
+    provider could not be reached and none found it).
+    """
+
+    failed = False
+
+    for provider in providers:
+        for attempt in range(provider.max_retries + 1):
+            if provider.limiter is not None:
+                provider.limiter.acquire()
+            try:
+                location = provider.geocoder.geocode(address)
+            except RETRYABLE_ERRORS:
+                if attempt == provider.max_retries:
+                    failed = True
+                else:
+                    time.sleep(backoff * 2 ** attempt)
+                continue
+            except GeocoderServiceError:
+                failed = True
+                break
+
+            if location:
+                raw = getattr(location, 'raw', None) or {}
+                return {
+                    'latitude': location.latitude,
+                    'longitude': location.longitude,
+                    'provider': provider.name,
+                    'confidence': raw.get('importance', raw.get('score'))
+                }, 'found'
+            break
+
+    return None, 'failed' if failed else 'not_found'
+
+def geocode_many(addresses, providers, cache=None, batch_size=100, max_concurrent=5, backoff=0.5):
+    """Geocode many addresses concurrently
+
+    Addresses are deduplicated and looked up in the cache first. The rest are
+    submitted to a thread pool of max_concurrent workers in batches of
+    batch_size, so at most one batch is in flight at a time. Results are
+    written to the cache from the calling thread.
+
+    Returns (results, stats) where results maps each address to its result
+    dict or None.
+    """
+
+    results = {}
+    pending = []
+    stats = {'cached': 0, 'found': 0, 'not_found': 0, 'failed': 0}
+
+    for address in dict.fromkeys(addresses):
+        cached = cache.get(address) if cache is not None else MISS
+        if cached is MISS:
+            pending.append(address)
+        else:
+            results[address] = cached
+            stats['cached'] += 1
+
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            futures = [executor.submit(geocode_with_failover, address, providers, backoff) for address in batch]
+
+            for address, future in zip(batch, futures):
+                result, status = future.result()
+                results[address] = result
+                stats[status] += 1
+
+                if cache is None or status == 'failed':
+                    continue
+                if result:
+                    cache.put(address, result['latitude'], result['longitude'], result['provider'], result['confidence'])
+                else:
+                    cache.put(address, provider=','.join(p.name for p in providers))
+
+            print(f"Geocoded {min(start + batch_size, len(pending))}/{len(pending)} addresses")
+
+    return results, stats
+
+def geocode_addresses_concurrently(addresses, cache=None, config=None, providers=None):
+    """Geocode addresses using the providers and limits declared in config.json"""
+
+    if config is None:
+        config = load_config()
+    if providers is None:
+        providers = build_providers(config)
+
+    processing = config.get('data_processing', {})
+    return geocode_many(
+        addresses,
+        providers,
+        cache=cache,
+        batch_size=processing.get('batch_size', 100),
+        max_concurrent=processing.get('max_concurrent_requests', 5)
+    )
@@ -1,124 +1,298 @@
 import pandas as pd
 import numpy as np
+import argparse
+import glob
+import io
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from gazetteer import Gazetteer
+from map_writer import write_map_data_stream
+from map_binary import write_map_binary
+from map_tiles import write_tiles, DEFAULT_MIN_ZOOM, DEFAULT_MAX_ZOOM
+from map_clusters import write_clusters, DEFAULT_CELL_SIZE
+from search_index import write_search_index
+from customer_query import write_query_index
+from map_publish import publish_map_data, DEFAULT_KEEP_VERSIONS
+from customer_facets import CustomerFacets
+from city_canonicalizer import CityCanonicalizer
+from duplicate_detection import detect_duplicates
+from instrumentation import RunReport, instrumented, stage, PROFILE_MODES
+from clean_cache import cached_table
+from address_resolution import dedupe_addresses
 
-def clean_and_standardize_data():
-    """Clean and standardize all customer data from the CSV files with improved data quality handling"""
+SOURCE_CSV = 'updated_Excel_with_Customer_details - updated_Excel_with_Customer_details.csv.csv'
+LAYER_CSV_PATTERN = 'updated_Excel_with_Customer_details - Layer_*.csv'
+EXPORT_COLUMNS = ['customer_number', 'customer_name', 'is_active', 'street', 'postal_code', 'city', 'country']
+
+# Arrow-backed strings when pyarrow is installed, pandas' own string dtype otherwise
+try:
+    import pyarrow
+    STRING_DTYPE = pd.StringDtype('pyarrow')
+except ImportError:
+    STRING_DTYPE = pd.StringDtype('python')
+
+# Compact dtypes enforced while parsing, so every chunk gets the same dtypes: the
+# low-cardinality columns as categories, free text as strings
+EXPORT_DTYPES = {0: 'Int32', 1: STRING_DTYPE, 2: 'category', 3: STRING_DTYPE, 4: STRING_DTYPE, 5: 'category',
+                 6: 'category'}
+
+# Plain object columns (and a float customer number) for the cleaning of
+# data_processor.py and process_all_customers.py, which expects them
+TEXT_EXPORT_DTYPES = {0: 'float64', 1: str, 2: str, 3: str, 4: str, 5: str, 6: str}
+
+# Schema of the cleaned customer table (see validate_clean_frame). full_address
+# is not stored; build_full_addresses derives it when the records are placed.
+CLEAN_SCHEMA = {
+    'customer_number': 'Int32',
+    'customer_name': STRING_DTYPE,
+    'is_active': 'bool',
+    'street': STRING_DTYPE,
+    'postal_code': STRING_DTYPE,
+    'city': 'category',
+    'country': 'category',
+    'customer_identifier': STRING_DTYPE,
+    'id': 'int64'
+}
+
+# Values of the active column that mark an active customer; anything else is inactive
+ACTIVE_VALUES = ['ja', 'yes']
+
+DEFAULT_CHUNK_SIZE = 50000
+
+@instrumented
+def read_customer_export(path=SOURCE_CSV):
+    """Read the raw customer export and give its columns their English names"""
+    df = pd.read_csv(path, dtype=EXPORT_DTYPES)
+    df.columns = EXPORT_COLUMNS
+    return df
+
+def iter_customer_export(path=SOURCE_CSV, chunksize=DEFAULT_CHUNK_SIZE, dtype=EXPORT_DTYPES):
+    """Read the raw customer export in chunks of at most chunksize rows"""
+    with pd.read_csv(path, dtype=dtype, chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk.columns = EXPORT_COLUMNS
+            yield chunk
+
+@instrumented
+def clean_and_standardize_data(path=SOURCE_CSV, facets=None, cache=True):
+    """Clean and standardize all customer data from the CSV files with improved data quality handling
+    
+    With cache, the cleaned table is loaded from the clean cache when the
+    export, PROCESSING_VERSION and the country aliases are unchanged (see
+    clean_cache.py), and cached after cleaning otherwise.
+    """
     
     print("Reading and processing customer data...")
     
-    # Read the main CSV file
-    df = pd.read_csv('updated_Excel_with_Customer_details - updated_Excel_with_Customer_details.csv.csv')
+    if not cache:
+        return clean_customer_frame(read_customer_export(path), facets=facets)
     
-    # Clean column names
-    df.columns = ['customer_number', 'customer_name', 'is_active', 'street', 'postal_code', 'city', 'country']
+    country_aliases = load_config().get('data_processing', {}).get('country_aliases', {})
+    cleaned = []
     
-    print(f"Total records: {len(df)}")
+    def build():
+        cleaned.append(clean_customer_frame(read_customer_export(path), facets=facets))
+        return cleaned[0]
     
-    # Clean the data
-    print("Cleaning data...")
+    df = cached_table(path, 'clean_customer_frame', PROCESSING_VERSION, build, extra=country_aliases,
+                      string_dtype=STRING_DTYPE)
+    if not cleaned:
+        # Loaded from the cache: count the facets the cleaning step would have counted
+        validate_clean_frame(df)
+        if facets is None:
+            facets = CustomerFacets()
+        facets.add(df)
+        facets.print_quality()
     
-    # Standardize active status
-    df['is_active'] = df['is_active'].str.lower().map({'ja': True, 'nein': False, 'yes': True, 'no': False})
-    df['is_active'] = df['is_active'].fillna(False)
+    return df
+
+@instrumented
+def clean_customer_frame(df, first_id=1, verbose=True, facets=None):
+    """Clean and standardize a raw customer export DataFrame (or any subset of its rows)
     
-    # Clean and validate country codes
-    df['country'] = clean_country_codes(df['country'])
+    Records that keep an address are numbered from first_id. The cleaned
+    records are added to facets (a CustomerFacets) when given; verbose
+    prints its counts and data quality counters. The result has the dtypes
+    of CLEAN_SCHEMA.
+    """
     
-    # Clean postal codes
-    df['postal_code'] = df['postal_code'].astype(str).str.strip()
-    df['postal_code'] = df['postal_code'].replace(['nan', '0', ''], '')
+    if verbose:
+        print(f"Total records: {len(df)}")
+        
+        # Clean the data
+        print("Cleaning data...")
+    df = df.copy()
     
-    # Clean cities
-    df['city'] = df['city'].astype(str).str.strip()
-    df['city'] = df['city'].replace(['nan', '0'], '')
+    # Standardize active status
+    df['is_active'] = clean_distinct(df['is_active'], lambda values: values.astype(str).str.lower().isin(ACTIVE_VALUES),
+                                     missing=False).astype(bool)
     
-    # Clean streets
-    df['street'] = df['street'].astype(str).str.strip()
-    df['street'] = df['street'].replace(['nan', '0'], '')
+    # Clean and validate country codes
+    config = load_config()
+    country_aliases = config.get('data_processing', {}).get('country_aliases', {})
+    df['country'] = clean_country_codes(df['country'], country_aliases)
     
-    # Create full address for geocoding
-    df['full_address'] = df.apply(lambda row: create_full_address(row), axis=1)
+    # Clean postal codes, cities and streets
+    df['postal_code'] = clean_distinct(df['postal_code'], strip_placeholders).astype(STRING_DTYPE)
+    df['city'] = clean_distinct(df['city'], strip_placeholders).astype('category')
+    df['street'] = clean_distinct(df['street'], strip_placeholders).astype(STRING_DTYPE)
     
-    # Remove rows with no address information
-    df_with_addresses = df[df['full_address'] != ''].copy()
+    # Remove rows with no address information (an empty full address)
+    has_address = np.zeros(len(df), dtype=bool)
+    for column in ADDRESS_COLUMNS:
+        has_address |= df[column].astype(object).to_numpy() != ''
+    df_with_addresses = df[has_address].copy()
     
     # Create customer identifier (name or number if name is missing)
-    df_with_addresses['customer_identifier'] = df_with_addresses.apply(lambda row: 
-        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != '' 
-        else f"Customer {int(row['customer_number'])}", axis=1)
+    df_with_addresses['customer_identifier'] = build_customer_identifiers(df_with_addresses).astype(STRING_DTYPE)
     
     # Add a unique ID for each record
-    df_with_addresses['id'] = range(1, len(df_with_addresses) + 1)
+    df_with_addresses['id'] = range(first_id, first_id + len(df_with_addresses))
     
-    print(f"Records with addresses: {len(df_with_addresses)}")
-    print(f"Active customers: {df_with_addresses['is_active'].sum()}")
-    print(f"Inactive customers: {len(df_with_addresses) - df_with_addresses['is_active'].sum()}")
+    if facets is None and verbose:
+        facets = CustomerFacets()
+    if facets is not None:
+        facets.add(df_with_addresses)
     
-    # Show data quality statistics
-    print(f"\nData quality:")
-    print(f"Records with street: {(df_with_addresses['street'].str.len() > 0).sum()}")
-    print(f"Records with postal code: {(df_with_addresses['postal_code'].str.len() > 0).sum()}")
-    print(f"Records with city: {(df_with_addresses['city'].str.len() > 0).sum()}")
-    print(f"Records with country: {(df_with_addresses['country'].str.len() > 0).sum()}")
+    if verbose:
+        # Show record counts and data quality statistics
+        facets.print_quality()
     
+    validate_clean_frame(df_with_addresses)
     return df_with_addresses
 
-def clean_country_codes(country_series):
-    """Clean and standardize country codes"""
+def clean_distinct(series, clean, missing=''):
+    """Apply clean (a function of an object Series) to the distinct values of series only
     
-    # Define valid country codes
-    valid_countries = {
-        'DE', 'AT', 'IT', 'FR', 'ES', 'PL', 'CZ', 'PT', 'LU', 'CH', 'NL', 'BE', 'DK', 'SE', 'NO', 'FI',
-        'GB', 'IE', 'HR', 'SI', 'SK', 'HU', 'RO', 'BG', 'GR', 'CY', 'LT', 'LI', 'MC', 'MA', 'ZA', 'US',
-        'CN', 'IN', 'IS', 'GE', 'RE', 'SG'
-    }
+    Missing values become missing. The result is an object Series aligned
+    with series; callers cast it to the column's CLEAN_SCHEMA dtype.
+    """
+    codes, uniques = pd.factorize(series)
+    cleaned = clean(pd.Series(np.asarray(uniques, dtype=object), dtype=object)).to_numpy(dtype=object)
+    return pd.Series(np.append(cleaned, missing)[codes], index=series.index, name=series.name)
+
+def strip_placeholders(values):
+    """Strip text values and blank the '0' and 'nan' placeholders of the export"""
+    return values.astype(str).str.strip().replace(['nan', '0'], '')
+
+def validate_clean_frame(df):
+    """Raise ValueError if a column of a cleaned customer frame is missing or does not have its CLEAN_SCHEMA dtype"""
+    problems = [f"{column} is missing" if column not in df.columns
+                else f"{column} is {df[column].dtype!r}, not {dtype!r}"
+                for column, dtype in CLEAN_SCHEMA.items()
+                if column not in df.columns or df[column].dtype != dtype]
+    if problems:
+        raise ValueError(f"Cleaned customer data does not match the schema: {'; '.join(problems)}")
+
+# Valid ISO 3166-1 alpha-2 country codes seen in the customer export
+VALID_COUNTRIES = frozenset({
+    'DE', 'AT', 'IT', 'FR', 'ES', 'PL', 'CZ', 'PT', 'LU', 'CH', 'NL', 'BE', 'DK', 'SE', 'NO', 'FI',
+    'GB', 'IE', 'HR', 'SI', 'SK', 'HU', 'RO', 'BG', 'GR', 'CY', 'LT', 'LI', 'MC', 'MA', 'ZA', 'US',
+    'CN', 'IN', 'IS', 'GE', 'RE', 'SG'
+})
+
+# Known spellings of countries (German/English names, vehicle codes and typos from the Layer CSVs)
+COUNTRY_ALIASES = {
+    'D': 'DE', 'DEUTSCHLAND': 'DE', 'GERMANY': 'DE',
+    'A': 'AT', 'ÖSTERREICH': 'AT', 'OESTERREICH': 'AT', 'AUSTRIA': 'AT',
+    'I': 'IT', 'ITALIEN': 'IT', 'ITALY': 'IT', 'ITALIA': 'IT',
+    'F': 'FR', 'FRANKREICH': 'FR', 'FRANCE': 'FR',
+    'E': 'ES', 'SPANIEN': 'ES', 'SPAIN': 'ES', 'ESPAÑA': 'ES',
+    'PL': 'PL', 'POLEN': 'PL', 'POLAND': 'PL',
+    'CZ': 'CZ', 'TSCHECHIEN': 'CZ', 'CZECH': 'CZ', 'CZECHIA': 'CZ', 'CZECH REPUBLIC': 'CZ',
+    'CH': 'CH', 'SCHWEIZ': 'CH', 'SWITZERLAND': 'CH', 'SUISSE': 'CH', 'SVIZZERA': 'CH',
+    'NL': 'NL', 'NIEDERLANDE': 'NL', 'NETHERLANDS': 'NL', 'HOLLAND': 'NL',
+    'B': 'BE', 'BELGIEN': 'BE', 'BELGIUM': 'BE',
+    'DK': 'DK', 'DÄNEMARK': 'DK', 'DAENEMARK': 'DK', 'DENMARK': 'DK',
+    'S': 'SE', 'SCHWEDEN': 'SE', 'SWEDEN': 'SE',
+    'N': 'NO', 'NORWEGEN': 'NO', 'NORWAY': 'NO',
+    'FIN': 'FI', 'FINNLAND': 'FI', 'FINLAND': 'FI',
+    'UK': 'GB', 'GROSSBRITANNIEN': 'GB', 'GROßBRITANNIEN': 'GB', 'UNITED KINGDOM': 'GB', 'ENGLAND': 'GB',
+    'IRL': 'IE', 'IRLAND': 'IE', 'IRELAND': 'IE',
+    'P': 'PT', 'PORTUGAL': 'PT',
+    'L': 'LU', 'LUXEMBURG': 'LU', 'LUXEMBOURG': 'LU',
+    'KROATIEN': 'HR', 'CROATIA': 'HR',
+    'SL': 'SI', 'SLO': 'SI', 'SLOWENIEN': 'SI', 'SLOVENIA': 'SI',
+    'SLOWAKEI': 'SK', 'SLOVAKIA': 'SK',
+    'UNGARN': 'HU', 'HUNGARY': 'HU',
+    'RUMÄNIEN': 'RO', 'ROMANIA': 'RO',
+    'BULGARIEN': 'BG', 'BULGARIA': 'BG',
+    'GRIECHENLAND': 'GR', 'GREECE': 'GR',
+    'ZYPERN': 'CY', 'CYPRUS': 'CY',
+    'LITAUEN': 'LT', 'LITHUANIA': 'LT',
+    'FL': 'LI', 'LIECHTENSTEIN': 'LI',
+    'MONACO': 'MC',
+    'MAROKKO': 'MA', 'MOROCCO': 'MA',
+    'SÜDAFRIKA': 'ZA', 'SOUTH AFRICA': 'ZA',
+    'USA': 'US', 'UNITED STATES': 'US',
+    'CHINA': 'CN',
+    'INDIEN': 'IN', 'INDIA': 'IN',
+    'ISLAND': 'IS', 'ICELAND': 'IS',
+    'GEORGIEN': 'GE', 'GEORGIA': 'GE',
+    'RÉUNION': 'RE', 'REUNION': 'RE',
+    'SINGAPUR': 'SG', 'SINGAPORE': 'SG'
+}
+
+# Categories of the cleaned country column ('' marks an unknown country)
+COUNTRY_CATEGORIES = [''] + sorted(VALID_COUNTRIES)
+
+CONFIG_PATH = 'react-customer-map/public/config.json'
+
+def load_config(path=CONFIG_PATH):
+    """Load the shared map configuration, returning an empty dict if it is missing"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def resolve_country(country, aliases=COUNTRY_ALIASES):
+    """Resolve a single raw country value to an ISO code ('' if unknown)"""
+    if pd.isna(country):
+        return ''
     
-    def clean_country(country):
-        if pd.isna(country) or country == '' or country == '0':
-            return ''
-        
-        # Convert to string and clean
-        country_str = str(country).strip().upper()
-        
-        # Check if it's a valid country code
-        if country_str in valid_countries:
-            return country_str
-        
-        # Check if it looks like an address (contains numbers or common address words)
-        if re.search(r'\d', country_str) or any(word in country_str.lower() for word in ['straße', 'str', 'platz', 'weg', 'allee']):
-            return ''
-        
-        # Check if it's a variation of known countries
-        country_variations = {
-            'D': 'DE', 'DEUTSCHLAND': 'DE', 'GERMANY': 'DE',
-            'AT': 'AT', 'ÖSTERREICH': 'AT', 'AUSTRIA': 'AT',
-            'IT': 'IT', 'ITALIEN': 'IT', 'ITALY': 'IT',
-            'FR': 'FR', 'FRANKREICH': 'FR', 'FRANCE': 'FR',
-            'ES': 'ES', 'SPANIEN': 'ES', 'SPAIN': 'ES',
-            'PL': 'PL', 'POLEN': 'PL', 'POLAND': 'PL',
-            'CZ': 'CZ', 'TSCHECHIEN': 'CZ', 'CZECH': 'CZ',
-            'CH': 'CH', 'SCHWEIZ': 'CH', 'SWITZERLAND': 'CH',
-            'NL': 'NL', 'NIEDERLANDE': 'NL', 'NETHERLANDS': 'NL',
-            'BE': 'BE', 'BELGIEN': 'BE', 'BELGIUM': 'BE',
-            'DK': 'DK', 'DÄNEMARK': 'DK', 'DENMARK': 'DK',
-            'SE': 'SE', 'SCHWEDEN': 'SE', 'SWEDEN': 'SE',
-            'NO': 'NO', 'NORWEGEN': 'NO', 'NORWAY': 'NO',
-            'FI': 'FI', 'FINNLAND': 'FI', 'FINLAND': 'FI',
-            'GB': 'GB', 'GROSSBRITANNIEN': 'GB', 'UNITED KINGDOM': 'GB',
-            'IE': 'IE', 'IRLAND': 'IE', 'IRELAND': 'IE',
-            'PT': 'PT', 'PORTUGAL': 'PT',
-            'LU': 'LU', 'LUXEMBURG': 'LU', 'LUXEMBOURG': 'LU'
-        }
-        
-        if country_str in country_variations:
-            return country_variations[country_str]
-        
+    country_str = str(country).strip().upper()
+    if country_str == '' or country_str == '0':
         return ''
     
-    return country_series.apply(clean_country)
+    if country_str in VALID_COUNTRIES:
+        return country_str
+    
+    # Anything else (street addresses, coordinates, typos) is treated as unknown
+    return aliases.get(country_str, '')
+
+@instrumented
+def clean_country_codes(country_series, extra_aliases=None):
+    """Clean and standardize country codes
+    
+    Each distinct raw value is resolved once and the results are mapped back
+    onto the rows, so the cost depends on the number of distinct values only.
+    extra_aliases (e.g. data_processing.country_aliases from config.json)
+    extends the built-in alias table.
+    """
+    
+    aliases = COUNTRY_ALIASES
+    if extra_aliases:
+        aliases = dict(COUNTRY_ALIASES)
+        aliases.update({str(k).strip().upper(): str(v).strip().upper() for k, v in extra_aliases.items()})
+    
+    categories = list(COUNTRY_CATEGORIES)
+    categories += sorted(set(aliases.values()) - set(categories))
+    
+    codes, uniques = pd.factorize(country_series)
+    
+    # Missing values get code -1, which picks the trailing '' entry
+    resolved = np.array([resolve_country(value, aliases) for value in uniques] + [''], dtype=object)
+    
+    return pd.Series(
+        pd.Categorical(resolved[codes], categories=categories),
+        index=country_series.index,
+        name=country_series.name
+    )
 
 def create_full_address(row):
     """Create a full address string for geocoding"""
@@ -138,7 +312,422 @@ def create_full_address(row):
     
     return ', '.join(parts) if parts else ''
 
-def create_improved_geocoded_data(df, sample_size=None):
+ADDRESS_COLUMNS = ['street', 'postal_code', 'city', 'country']
+
+def build_full_addresses(df):
+    """Column-wise equivalent of create_full_address for a cleaned customer frame
+
+    The address columns of a cleaned frame are already stripped, so each
+    column is appended as a whole; the mask only decides where a separator goes.
+    """
+
+    full_address = np.full(len(df), '', dtype=object)
+
+    for column in ADDRESS_COLUMNS:
+        part = df[column].to_numpy(dtype=object, na_value='')
+
+        # Only insert the separator between two non-empty parts
+        full_address[(part != '') & (full_address != '')] += ', '
+        full_address += part
+
+    return pd.Series(full_address, index=df.index, dtype=object)
+
+def build_customer_identifiers(df):
+    """Column-wise equivalent of the customer identifier fallback (name, else number)"""
+    
+    names = df['customer_name']
+    has_name = names.notna() & (names.fillna('').astype(str).str.strip() != '')
+    
+    identifiers = names.astype(object).copy()
+    missing = ~has_name
+    if missing.any():
+        numbers = df.loc[missing, 'customer_number'].astype('int64').astype(str)
+        identifiers[missing] = 'Customer ' + numbers
+    
+    return identifiers
+
+# Country coordinates (approximate centers)
+COUNTRY_COORDS = {
+    'DE': {'lat': 51.1657, 'lng': 10.4515, 'spread': 2.0},
+    'AT': {'lat': 47.5162, 'lng': 14.5501, 'spread': 1.0},
+    'IT': {'lat': 41.8719, 'lng': 12.5674, 'spread': 2.0},
+    'FR': {'lat': 46.2276, 'lng': 2.2137, 'spread': 2.0},
+    'ES': {'lat': 40.4637, 'lng': -3.7492, 'spread': 1.5},
+    'PL': {'lat': 51.9194, 'lng': 19.1451, 'spread': 1.5},
+    'CZ': {'lat': 49.8175, 'lng': 15.4730, 'spread': 0.8},
+    'PT': {'lat': 39.3999, 'lng': -8.2245, 'spread': 1.0},
+    'LU': {'lat': 49.8153, 'lng': 6.1296, 'spread': 0.3},
+    'CH': {'lat': 46.8182, 'lng': 8.2275, 'spread': 1.0},
+    'NL': {'lat': 52.1326, 'lng': 5.2913, 'spread': 1.0},
+    'BE': {'lat': 50.8503, 'lng': 4.3517, 'spread': 0.5},
+    'DK': {'lat': 56.2639, 'lng': 9.5018, 'spread': 0.8},
+    'SE': {'lat': 60.1282, 'lng': 18.6435, 'spread': 1.5},
+    'NO': {'lat': 60.4720, 'lng': 8.4689, 'spread': 1.5},
+    'FI': {'lat': 61.9241, 'lng': 25.7482, 'spread': 1.5},
+    'GB': {'lat': 55.3781, 'lng': -3.4360, 'spread': 1.5},
+    'IE': {'lat': 53.4129, 'lng': -8.2439, 'spread': 1.0},
+    'HR': {'lat': 45.1000, 'lng': 15.2000, 'spread': 0.8},
+    'SI': {'lat': 46.1512, 'lng': 14.9955, 'spread': 0.5},
+    'SK': {'lat': 48.6690, 'lng': 19.6990, 'spread': 0.8},
+    'HU': {'lat': 47.1625, 'lng': 19.5033, 'spread': 0.8},
+    'RO': {'lat': 45.9432, 'lng': 24.9668, 'spread': 1.0},
+    'BG': {'lat': 42.7339, 'lng': 25.4858, 'spread': 0.8},
+    'GR': {'lat': 39.0742, 'lng': 21.8243, 'spread': 1.0},
+    'CY': {'lat': 35.1264, 'lng': 33.4299, 'spread': 0.3},
+    'LT': {'lat': 55.1694, 'lng': 23.8813, 'spread': 0.5},
+    'LI': {'lat': 47.1660, 'lng': 9.5554, 'spread': 0.2},
+    'MC': {'lat': 43.7384, 'lng': 7.4246, 'spread': 0.1},
+    'MA': {'lat': 31.7917, 'lng': -7.0926, 'spread': 1.0},
+    'ZA': {'lat': -30.5595, 'lng': 22.9375, 'spread': 2.0},
+    'US': {'lat': 39.8283, 'lng': -98.5795, 'spread': 3.0},
+    'CN': {'lat': 35.8617, 'lng': 104.1954, 'spread': 3.0},
+    'IN': {'lat': 20.5937, 'lng': 78.9629, 'spread': 2.0},
+    'IS': {'lat': 64.9631, 'lng': -19.0208, 'spread': 1.0},
+    'GE': {'lat': 42.3154, 'lng': 43.3569, 'spread': 0.5},
+    'RE': {'lat': -21.1151, 'lng': 55.5364, 'spread': 0.3},
+    'SG': {'lat': 1.3521, 'lng': 103.8198, 'spread': 0.2}
+}
+
+# Major German cities with specific coordinates for better representation
+GERMAN_CITIES = {
+    'München': {'lat': 48.1351, 'lng': 11.5820, 'spread': 0.3},
+    'Berlin': {'lat': 52.5200, 'lng': 13.4050, 'spread': 0.3},
+    'Hamburg': {'lat': 53.5511, 'lng': 9.9937, 'spread': 0.3},
+    'Köln': {'lat': 50.9375, 'lng': 6.9603, 'spread': 0.3},
+    'Frankfurt': {'lat': 50.1109, 'lng': 8.6821, 'spread': 0.3},
+    'Stuttgart': {'lat': 48.7758, 'lng': 9.1829, 'spread': 0.3},
+    'Düsseldorf': {'lat': 51.2277, 'lng': 6.7735, 'spread': 0.3},
+    'Dortmund': {'lat': 51.5136, 'lng': 7.4653, 'spread': 0.3},
+    'Essen': {'lat': 51.4556, 'lng': 7.0116, 'spread': 0.3},
+    'Leipzig': {'lat': 51.3397, 'lng': 12.3731, 'spread': 0.3},
+    'Bremen': {'lat': 53.0793, 'lng': 8.8017, 'spread': 0.3},
+    'Dresden': {'lat': 51.0504, 'lng': 13.7373, 'spread': 0.3},
+    'Hannover': {'lat': 52.3759, 'lng': 9.7320, 'spread': 0.3},
+    'Nürnberg': {'lat': 49.4521, 'lng': 11.0767, 'spread': 0.3},
+    'Duisburg': {'lat': 51.4344, 'lng': 6.7623, 'spread': 0.3},
+    'Bochum': {'lat': 51.4818, 'lng': 7.2162, 'spread': 0.3},
+    'Wuppertal': {'lat': 51.2562, 'lng': 7.1508, 'spread': 0.3},
+    'Bielefeld': {'lat': 52.0302, 'lng': 8.5325, 'spread': 0.3},
+    'Bonn': {'lat': 50.7374, 'lng': 7.0982, 'spread': 0.3},
+    'Mannheim': {'lat': 49.4875, 'lng': 8.4660, 'spread': 0.3},
+    'Karlsruhe': {'lat': 49.0069, 'lng': 8.4037, 'spread': 0.3},
+    'Wiesbaden': {'lat': 50.0782, 'lng': 8.2397, 'spread': 0.3},
+    'Münster': {'lat': 51.9607, 'lng': 7.6261, 'spread': 0.3},
+    'Gelsenkirchen': {'lat': 51.5177, 'lng': 7.0857, 'spread': 0.3},
+    'Aachen': {'lat': 50.7753, 'lng': 6.0839, 'spread': 0.3},
+    'Braunschweig': {'lat': 52.2689, 'lng': 10.5267, 'spread': 0.3},
+    'Chemnitz': {'lat': 50.8278, 'lng': 12.9249, 'spread': 0.3},
+    'Kiel': {'lat': 54.3233, 'lng': 10.1228, 'spread': 0.3},
+    'Halle': {'lat': 51.4964, 'lng': 11.9688, 'spread': 0.3},
+    'Magdeburg': {'lat': 52.1205, 'lng': 11.6276, 'spread': 0.3},
+    'Freiburg': {'lat': 47.9990, 'lng': 7.8421, 'spread': 0.3},
+    'Krefeld': {'lat': 51.3392, 'lng': 6.5861, 'spread': 0.3},
+    'Lübeck': {'lat': 53.8654, 'lng': 10.6866, 'spread': 0.3},
+    'Oberhausen': {'lat': 51.4706, 'lng': 6.8514, 'spread': 0.3},
+    'Erfurt': {'lat': 50.9848, 'lng': 11.0299, 'spread': 0.3},
+    'Mainz': {'lat': 49.9929, 'lng': 8.2473, 'spread': 0.3},
+    'Rostock': {'lat': 54.0924, 'lng': 12.0991, 'spread': 0.3},
+    'Kassel': {'lat': 51.3127, 'lng': 9.4797, 'spread': 0.3},
+    'Potsdam': {'lat': 52.3906, 'lng': 13.0645, 'spread': 0.3},
+    'Hagen': {'lat': 51.3671, 'lng': 7.4634, 'spread': 0.3},
+    'Saarbrücken': {'lat': 49.2374, 'lng': 6.9816, 'spread': 0.3},
+    'Mülheim': {'lat': 51.4275, 'lng': 6.8827, 'spread': 0.3},
+    'Ludwigshafen': {'lat': 49.4744, 'lng': 8.4402, 'spread': 0.3},
+    'Leverkusen': {'lat': 51.0459, 'lng': 6.9853, 'spread': 0.3},
+    'Oldenburg': {'lat': 53.1434, 'lng': 8.2146, 'spread': 0.3},
+    'Osnabrück': {'lat': 52.2799, 'lng': 8.0472, 'spread': 0.3},
+    'Solingen': {'lat': 51.1734, 'lng': 7.0845, 'spread': 0.3},
+    'Heidelberg': {'lat': 49.3988, 'lng': 8.6724, 'spread': 0.3},
+    'Herne': {'lat': 51.5416, 'lng': 7.2208, 'spread': 0.3},
+    'Neuss': {'lat': 51.2042, 'lng': 6.6879, 'spread': 0.3},
+    'Darmstadt': {'lat': 49.8728, 'lng': 8.6512, 'spread': 0.3},
+    'Paderborn': {'lat': 51.7187, 'lng': 8.7575, 'spread': 0.3},
+    'Regensburg': {'lat': 49.0134, 'lng': 12.1016, 'spread': 0.3},
+    'Ingolstadt': {'lat': 48.7665, 'lng': 11.4241, 'spread': 0.3},
+    'Würzburg': {'lat': 49.7913, 'lng': 9.9534, 'spread': 0.3},
+    'Fürth': {'lat': 49.4778, 'lng': 10.9887, 'spread': 0.3},
+    'Wolfsburg': {'lat': 52.4227, 'lng': 10.7865, 'spread': 0.3},
+    'Offenbach': {'lat': 50.1006, 'lng': 8.7665, 'spread': 0.3},
+    'Ulm': {'lat': 48.3984, 'lng': 9.9916, 'spread': 0.3},
+    'Heilbronn': {'lat': 49.1427, 'lng': 9.2185, 'spread': 0.3},
+    'Pforzheim': {'lat': 48.8926, 'lng': 8.6949, 'spread': 0.3},
+    'Göttingen': {'lat': 51.5413, 'lng': 9.9158, 'spread': 0.3},
+    'Bottrop': {'lat': 51.5235, 'lng': 6.9225, 'spread': 0.3},
+    'Trier': {'lat': 49.7499, 'lng': 6.6373, 'spread': 0.3},
+    'Recklinghausen': {'lat': 51.6138, 'lng': 7.1977, 'spread': 0.3},
+    'Reutlingen': {'lat': 48.4914, 'lng': 9.2045, 'spread': 0.3},
+    'Bremerhaven': {'lat': 53.5396, 'lng': 8.5809, 'spread': 0.3},
+    'Koblenz': {'lat': 50.3569, 'lng': 7.5940, 'spread': 0.3},
+    'Bergisch Gladbach': {'lat': 50.9856, 'lng': 7.1329, 'spread': 0.3},
+    'Jena': {'lat': 50.9279, 'lng': 11.5892, 'spread': 0.3},
+    'Remscheid': {'lat': 51.1784, 'lng': 7.1894, 'spread': 0.3},
+    'Erlangen': {'lat': 49.5897, 'lng': 11.0041, 'spread': 0.3},
+    'Moers': {'lat': 51.4514, 'lng': 6.6264, 'spread': 0.3},
+    'Siegen': {'lat': 50.8745, 'lng': 8.0243, 'spread': 0.3},
+    'Hildesheim': {'lat': 52.1508, 'lng': 9.9513, 'spread': 0.3},
+    'Salzgitter': {'lat': 52.1508, 'lng': 10.3333, 'spread': 0.3},
+    'Cottbus': {'lat': 51.7216, 'lng': 14.3344, 'spread': 0.3},
+    'Gera': {'lat': 50.8803, 'lng': 12.0826, 'spread': 0.3},
+    'Kaiserslautern': {'lat': 49.4431, 'lng': 7.7689, 'spread': 0.3},
+    'Schwerin': {'lat': 53.6355, 'lng': 11.4012, 'spread': 0.3},
+    'Gütersloh': {'lat': 51.9069, 'lng': 8.3785, 'spread': 0.3},
+    'Witten': {'lat': 51.4436, 'lng': 7.3305, 'spread': 0.3},
+    'Iserlohn': {'lat': 51.3754, 'lng': 7.7020, 'spread': 0.3},
+    'Ludwigsburg': {'lat': 48.8974, 'lng': 9.1916, 'spread': 0.3},
+    'Hanau': {'lat': 50.1348, 'lng': 8.9144, 'spread': 0.3},
+    'Esslingen': {'lat': 48.7424, 'lng': 9.3048, 'spread': 0.3},
+    'Zwickau': {'lat': 50.7186, 'lng': 12.4942, 'spread': 0.3},
+    'Düren': {'lat': 50.8008, 'lng': 6.4830, 'spread': 0.3},
+    'Ratingen': {'lat': 51.2972, 'lng': 6.8497, 'spread': 0.3},
+    'Tübingen': {'lat': 48.5206, 'lng': 9.0556, 'spread': 0.3},
+    'Villingen-Schwenningen': {'lat': 48.0582, 'lng': 8.4616, 'spread': 0.3},
+    'Königs Wusterhausen': {'lat': 52.3014, 'lng': 13.6330, 'spread': 0.3},
+    'Lünen': {'lat': 51.6164, 'lng': 7.5282, 'spread': 0.3},
+    'Marl': {'lat': 51.6567, 'lng': 7.0904, 'spread': 0.3},
+    'Velbert': {'lat': 51.3373, 'lng': 7.0419, 'spread': 0.3},
+    'Minden': {'lat': 52.2895, 'lng': 8.9145, 'spread': 0.3},
+    'Dessau-Roßlau': {'lat': 51.8364, 'lng': 12.2469, 'spread': 0.3},
+    'Viersen': {'lat': 51.2543, 'lng': 6.3944, 'spread': 0.3},
+    'Rheine': {'lat': 52.2799, 'lng': 7.4407, 'spread': 0.3},
+    'Lüdenscheid': {'lat': 51.2254, 'lng': 7.6273, 'spread': 0.3},
+    'Castrop-Rauxel': {'lat': 51.5561, 'lng': 7.3116, 'spread': 0.3},
+    'Gladbeck': {'lat': 51.5708, 'lng': 6.9854, 'spread': 0.3},
+    'Bocholt': {'lat': 51.8388, 'lng': 6.6153, 'spread': 0.3},
+    'Bamberg': {'lat': 49.8988, 'lng': 10.9027, 'spread': 0.3},
+    'Detmold': {'lat': 51.9334, 'lng': 8.8733, 'spread': 0.3},
+    'Arnsberg': {'lat': 51.3963, 'lng': 8.0641, 'spread': 0.3},
+    'Lüneburg': {'lat': 53.2504, 'lng': 10.4145, 'spread': 0.3},
+    'Bayreuth': {'lat': 49.9483, 'lng': 11.5783, 'spread': 0.3},
+    'Celle': {'lat': 52.6226, 'lng': 10.0805, 'spread': 0.3},
+    'Landshut': {'lat': 48.5378, 'lng': 12.1518, 'spread': 0.3},
+    'Aschaffenburg': {'lat': 49.9770, 'lng': 9.1521, 'spread': 0.3},
+    'Dinslaken': {'lat': 51.5667, 'lng': 6.7333, 'spread': 0.3},
+    'Aalen': {'lat': 48.8378, 'lng': 10.0933, 'spread': 0.3},
+    'Fulda': {'lat': 50.5598, 'lng': 9.6710, 'spread': 0.3},
+    'Lippstadt': {'lat': 51.6733, 'lng': 8.3447, 'spread': 0.3},
+    'Weimar': {'lat': 50.9795, 'lng': 11.3235, 'spread': 0.3},
+    'Dormagen': {'lat': 51.0963, 'lng': 6.8319, 'spread': 0.3},
+    'Neumünster': {'lat': 54.0744, 'lng': 9.9819, 'spread': 0.3},
+    'Sindelfingen': {'lat': 48.7136, 'lng': 8.9967, 'spread': 0.3},
+    'Rosenheim': {'lat': 47.8564, 'lng': 12.1291, 'spread': 0.3},
+    'Herten': {'lat': 51.6000, 'lng': 7.1333, 'spread': 0.3},
+    'Bergheim': {'lat': 50.9550, 'lng': 6.6390, 'spread': 0.3},
+    'Schwäbisch Gmünd': {'lat': 48.8014, 'lng': 9.7974, 'spread': 0.3},
+    'Friedrichshafen': {'lat': 47.6582, 'lng': 9.4758, 'spread': 0.3},
+    'Wesel': {'lat': 51.6583, 'lng': 6.6172, 'spread': 0.3},
+    'Kempten': {'lat': 47.7278, 'lng': 10.3137, 'spread': 0.3},
+    'Görlitz': {'lat': 51.1552, 'lng': 14.9885, 'spread': 0.3},
+    'Frankfurt (Oder)': {'lat': 52.3412, 'lng': 14.5500, 'spread': 0.3},
+    'Mönchengladbach': {'lat': 51.1805, 'lng': 6.4428, 'spread': 0.3}
+}
+
+# Other-language and official long names of GERMAN_CITIES; spelling variants are handled by the canonicalizer.
+# The river or region of a long name tells towns of the same name apart, so only the right one is listed.
+CITY_ALIASES = {
+    'Munich': 'München',
+    'Cologne': 'Köln',
+    'Nuremberg': 'Nürnberg',
+    'Frankfurt am Main': 'Frankfurt', 'Frankfurt a. M.': 'Frankfurt', 'Frankfurt a. Main': 'Frankfurt',
+    'Frankfurt/Main': 'Frankfurt',
+    'Frankfurt an der Oder': 'Frankfurt (Oder)',
+    'Halle (Saale)': 'Halle', 'Halle an der Saale': 'Halle',
+    'Freiburg im Breisgau': 'Freiburg', 'Freiburg i. Br.': 'Freiburg',
+    'Mülheim an der Ruhr': 'Mülheim', 'Mülheim a. d. Ruhr': 'Mülheim',
+    'Offenbach am Main': 'Offenbach', 'Offenbach/Main': 'Offenbach',
+    'Ludwigshafen am Rhein': 'Ludwigshafen',
+    'Esslingen am Neckar': 'Esslingen',
+    'Kempten (Allgäu)': 'Kempten',
+    'Wesel am Rhein': 'Wesel'
+}
+
+# Districts of GERMAN_CITIES written after the city name ('München-Pasing', 'Köln (Porz)')
+CITY_DISTRICTS = {
+    'Berlin': ['Mitte', 'Charlottenburg', 'Wilmersdorf', 'Charlottenburg-Wilmersdorf', 'Friedrichshain',
+               'Kreuzberg', 'Friedrichshain-Kreuzberg', 'Pankow', 'Prenzlauer Berg', 'Wedding', 'Moabit',
+               'Tiergarten', 'Spandau', 'Steglitz', 'Zehlendorf', 'Tempelhof', 'Schöneberg', 'Neukölln',
+               'Treptow', 'Köpenick', 'Adlershof', 'Marzahn', 'Hellersdorf', 'Mahlsdorf', 'Lichtenberg',
+               'Reinickendorf', 'Tegel', 'Weißensee', 'Buch'],
+    'Hamburg': ['Altona', 'Eimsbüttel', 'Harburg', 'Wandsbek', 'Bergedorf', 'Barmbek', 'Eppendorf', 'Ottensen',
+                'St. Pauli', 'Wilhelmsburg', 'Billbrook', 'Rahlstedt', 'Finkenwerder'],
+    'München': ['Flughafen', 'Pasing', 'Schwabing', 'Aubing', 'Allach', 'Olympiapark', 'Bogenhausen', 'Sendling',
+                'Giesing', 'Haidhausen', 'Moosach', 'Trudering', 'Neuperlach', 'Perlach', 'Riem', 'Freimann'],
+    'Köln': ['Porz', 'Deutz', 'Ehrenfeld', 'Nippes', 'Kalk', 'Lindenthal', 'Mülheim', 'Chorweiler', 'Rodenkirchen',
+             'Marsdorf', 'Lövenich', 'Niehl'],
+    'Frankfurt': ['Höchst', 'Rödelheim', 'Sachsenhausen', 'Bockenheim', 'Nieder-Eschbach', 'Fechenheim',
+                  'Bornheim', 'Flughafen'],
+    'Stuttgart': ['Feuerbach', 'Zuffenhausen', 'Vaihingen', 'Bad Cannstatt', 'Möhringen', 'Degerloch',
+                  'Untertürkheim', 'Weilimdorf'],
+    'Düsseldorf': ['Urdenbach', 'Benrath', 'Oberkassel', 'Bilk', 'Flingern', 'Reisholz', 'Flughafen'],
+    'Dortmund': ['Hörde', 'Aplerbeck', 'Brackel', 'Hombruch', 'Huckarde'],
+    'Essen': ['Kettwig', 'Rüttenscheid', 'Steele', 'Werden', 'Borbeck'],
+    'Wuppertal': ['Elberfeld', 'Barmen', 'Vohwinkel', 'Cronenberg', 'Ronsdorf'],
+    'Heidelberg': ['Bahnstadt', 'Bergheim', 'Handschuhsheim', 'Rohrbach', 'Wieblingen'],
+    'Halle': ['Ammendorf', 'Neustadt'],
+    'Münster': ['Albachten', 'Hiltrup', 'Roxel', 'Wolbeck', 'Amelsbüren'],
+    'Pforzheim': ['Büchenbronn'],
+    'Remscheid': ['Hasten', 'Lennep', 'Lüttringhausen'],
+    'Witten': ['Heven', 'Annen', 'Herbede'],
+    'Chemnitz': ['Röhrsdorf']
+}
+
+@lru_cache(maxsize=None)
+def city_canonicalizer():
+    """Shared canonicalizer of export city values to GERMAN_CITIES names (persisted between runs)"""
+    return CityCanonicalizer(GERMAN_CITIES, CITY_ALIASES, CITY_DISTRICTS)
+
+
+def build_coordinate_table(coords):
+    """Turn a {name: {'lat', 'lng', 'spread'}} mapping into lookup arrays
+    
+    Returns (names, lat, lng, spread) where names maps each key to its row.
+    """
+    names = {name: i for i, name in enumerate(coords)}
+    lat = np.array([c['lat'] for c in coords.values()], dtype=np.float64)
+    lng = np.array([c['lng'] for c in coords.values()], dtype=np.float64)
+    spread = np.array([c['spread'] for c in coords.values()], dtype=np.float64)
+    return names, lat, lng, spread
+
+COUNTRY_TABLE = build_coordinate_table(COUNTRY_COORDS)
+GERMAN_CITY_TABLE = build_coordinate_table(GERMAN_CITIES)
+
+def lookup_codes(values, names):
+    """Factorize values and map each distinct value to its row in a lookup table (-1 if absent)"""
+    codes, uniques = pd.factorize(values)
+    rows = np.array([names.get(value, -1) for value in uniques] + [-1], dtype=np.int64)
+    return rows[codes]
+
+def base_coordinates(df):
+    """Look up base lat/lng/spread per row from the built-in city and country tables
+    
+    City values are canonicalized first, so spelling variants and districts
+    of a known city ('Muenchen', 'München-Pasing') use its coordinates.
+    """
+    
+    country_names, country_lat, country_lng, country_spread = COUNTRY_TABLE
+    city_names, city_lat, city_lng, city_spread = GERMAN_CITY_TABLE
+    
+    countries = df['country'].astype(object).fillna('').replace('', 'DE')
+    cities = city_canonicalizer().canonicalize_many(df['city'])
+    
+    country_rows = lookup_codes(countries, country_names)
+    country_rows[country_rows < 0] = country_names['DE']
+    city_rows = lookup_codes(cities, city_names)
+    
+    has_city = city_rows >= 0
+    city_rows = np.where(has_city, city_rows, 0)
+    lat = np.where(has_city, city_lat[city_rows], country_lat[country_rows])
+    lng = np.where(has_city, city_lng[city_rows], country_lng[country_rows])
+    spread = np.where(has_city, city_spread[city_rows], country_spread[country_rows])
+    
+    return lat, lng, spread
+
+# Address columns the placement depends on
+LOCATION_COLUMNS = ['country', 'postal_code', 'city']
+
+@instrumented
+def locate_customers(df, gazetteer=None, verbose=True):
+    """Base lat/lng/spread of every row of df, before the random offset
+    
+    With a gazetteer, each row is placed at its postal code, city or country
+    centroid (whichever is found first). Without one, German cities with
+    known coordinates use the city centre, everything else the country
+    centre (Germany if the country is unknown). Rows are grouped by their
+    canonical location first (see address_resolution), so each distinct
+    location is resolved once and the results are broadcast to its rows.
+    """
+    
+    codes, locations = dedupe_addresses(df, LOCATION_COLUMNS)
+    if verbose:
+        print(f"Resolving {len(locations)} distinct locations for {len(df)} customers")
+    
+    if gazetteer is None:
+        lat, lng, spread = base_coordinates(locations)
+        return lat[codes], lng[codes], spread[codes]
+    
+    cities = locations['city'].to_numpy()
+    canonical = city_canonicalizer().canonicalize_many(cities)
+    lat, lng, spread, precision = gazetteer.lookup(
+        locations['country'].to_numpy(),
+        locations['postal_code'].to_numpy(),
+        np.where(canonical != '', canonical, cities)
+    )
+    if verbose:
+        levels = np.bincount(precision[codes], minlength=4)
+        print(f"Gazetteer placement: {levels[3]} by postal code, {levels[2]} by city, "
+              f"{levels[1]} by country, {levels[0]} by default country")
+    return lat[codes], lng[codes], spread[codes]
+
+# Columns identifying a customer and its address for its coordinate offset
+JITTER_KEY_COLUMNS = ['customer_number', 'customer_identifier', 'street', 'postal_code', 'city', 'country']
+
+def hash_distinct(series, hash_key):
+    """pd.util.hash_array of every value of series, hashing each distinct value once"""
+    codes, uniques = pd.factorize(series)
+    hashes = pd.util.hash_array(np.append(np.asarray(uniques, dtype=object), None), hash_key=hash_key)
+    return hashes[codes]
+
+def jitter_offsets(df, seed=42):
+    """Offsets in [-0.5, 0.5) for latitude and longitude of every row of df
+    
+    The offsets are derived from a seeded hash of the customer's number,
+    identifier and address rather than drawn in row order, so a customer
+    keeps its offsets from run to run whatever rows are added, removed or
+    reordered around it, and any subset of the rows gets the same offsets
+    as a single run over all of them.
+    """
+    hash_key = f'{seed:016d}'[-16:]
+    column_hashes = [pd.util.hash_array(df[column].fillna(0).astype('int64').to_numpy(), hash_key=hash_key)
+                     if column == 'customer_number' else hash_distinct(df[column], hash_key)
+                     for column in JITTER_KEY_COLUMNS]
+    
+    # Columns combined like pd.util.hash_pandas_object combines the columns of a DataFrame
+    hashes = np.full(len(df), 0x345678, dtype=np.uint64)
+    multiplier = np.uint64(1000003)
+    for i, column_hash in enumerate(column_hashes):
+        hashes ^= column_hash
+        hashes *= multiplier
+        multiplier += np.uint64(82520 + 2 * (len(column_hashes) - i))
+    hashes += np.uint64(97531)
+    
+    high = (hashes >> np.uint64(32)).astype(np.float64)
+    low = (hashes & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.column_stack([high, low]) / 2.0 ** 32 - 0.5
+
+@instrumented
+def place_customers(df, seed=42, gazetteer=None, located=None):
+    """Assign mock coordinates to every row of df as one array operation
+    
+    Each row gets an offset around its locate_customers position, a small
+    one around known German cities and a wider one around country centres.
+    The offsets come from jitter_offsets, so the result is reproducible and
+    a customer keeps its coordinates between runs as long as its address is
+    unchanged. Pass located to reuse (lat, lng, spread) computed elsewhere.
+    """
+    
+    if located is None:
+        located = locate_customers(df, gazetteer)
+    lat, lng, spread = located
+    
+    offsets = jitter_offsets(df, seed) * spread[:, None]
+    
+    placed = pd.DataFrame({
+        'id': df['id'].to_numpy(),
+        'customer_number': df['customer_number'].fillna(0).astype('int64').to_numpy(),
+        'customer_identifier': df['customer_identifier'].to_numpy(),
+        'is_active': df['is_active'].astype(bool).to_numpy(),
+        'street': df['street'].to_numpy(),
+        'postal_code': df['postal_code'].to_numpy(),
+        'city': df['city'].to_numpy(),
+        'country': df['country'].astype(object).to_numpy(),
+        'full_address': build_full_addresses(df).to_numpy(),
+        'latitude': lat + offsets[:, 0],
+        'longitude': lng + offsets[:, 1]
+    }, index=df.index)
+    
+    return placed
+
+@instrumented
+def create_improved_geocoded_data(df, sample_size=None, seed=42, gazetteer=None):
     """Create improved geocoded data with better coordinate distribution"""
     
     if sample_size is None:
@@ -154,262 +743,32 @@ def create_improved_geocoded_data(df, sample_size=None):
     
     # Create mock coordinates for demonstration
     # In a real scenario, you would use a geocoding service
-    sample_data = []
-    
-    # Country coordinates (approximate centers)
-    country_coords = {
-        'DE': {'lat': 51.1657, 'lng': 10.4515, 'spread': 2.0},
-        'AT': {'lat': 47.5162, 'lng': 14.5501, 'spread': 1.0},
-        'IT': {'lat': 41.8719, 'lng': 12.5674, 'spread': 2.0},
-        'FR': {'lat': 46.2276, 'lng': 2.2137, 'spread': 2.0},
-        'ES': {'lat': 40.4637, 'lng': -3.7492, 'spread': 1.5},
-        'PL': {'lat': 51.9194, 'lng': 19.1451, 'spread': 1.5},
-        'CZ': {'lat': 49.8175, 'lng': 15.4730, 'spread': 0.8},
-        'PT': {'lat': 39.3999, 'lng': -8.2245, 'spread': 1.0},
-        'LU': {'lat': 49.8153, 'lng': 6.1296, 'spread': 0.3},
-        'CH': {'lat': 46.8182, 'lng': 8.2275, 'spread': 1.0},
-        'NL': {'lat': 52.1326, 'lng': 5.2913, 'spread': 1.0},
-        'BE': {'lat': 50.8503, 'lng': 4.3517, 'spread': 0.5},
-        'DK': {'lat': 56.2639, 'lng': 9.5018, 'spread': 0.8},
-        'SE': {'lat': 60.1282, 'lng': 18.6435, 'spread': 1.5},
-        'NO': {'lat': 60.4720, 'lng': 8.4689, 'spread': 1.5},
-        'FI': {'lat': 61.9241, 'lng': 25.7482, 'spread': 1.5},
-        'GB': {'lat': 55.3781, 'lng': -3.4360, 'spread': 1.5},
-        'IE': {'lat': 53.4129, 'lng': -8.2439, 'spread': 1.0},
-        'HR': {'lat': 45.1000, 'lng': 15.2000, 'spread': 0.8},
-        'SI': {'lat': 46.1512, 'lng': 14.9955, 'spread': 0.5},
-        'SK': {'lat': 48.6690, 'lng': 19.6990, 'spread': 0.8},
-        'HU': {'lat': 47.1625, 'lng': 19.5033, 'spread': 0.8},
-        'RO': {'lat': 45.9432, 'lng': 24.9668, 'spread': 1.0},
-        'BG': {'lat': 42.7339, 'lng': 25.4858, 'spread': 0.8},
-        'GR': {'lat': 39.0742, 'lng': 21.8243, 'spread': 1.0},
-        'CY': {'lat': 35.1264, 'lng': 33.4299, 'spread': 0.3},
-        'LT': {'lat': 55.1694, 'lng': 23.8813, 'spread': 0.5},
-        'LI': {'lat': 47.1660, 'lng': 9.5554, 'spread': 0.2},
-        'MC': {'lat': 43.7384, 'lng': 7.4246, 'spread': 0.1},
-        'MA': {'lat': 31.7917, 'lng': -7.0926, 'spread': 1.0},
-        'ZA': {'lat': -30.5595, 'lng': 22.9375, 'spread': 2.0},
-        'US': {'lat': 39.8283, 'lng': -98.5795, 'spread': 3.0},
-        'CN': {'lat': 35.8617, 'lng': 104.1954, 'spread': 3.0},
-        'IN': {'lat': 20.5937, 'lng': 78.9629, 'spread': 2.0},
-        'IS': {'lat': 64.9631, 'lng': -19.0208, 'spread': 1.0},
-        'GE': {'lat': 42.3154, 'lng': 43.3569, 'spread': 0.5},
-        'RE': {'lat': -21.1151, 'lng': 55.5364, 'spread': 0.3},
-        'SG': {'lat': 1.3521, 'lng': 103.8198, 'spread': 0.2}
-    }
+    if gazetteer is None:
+        gazetteer = Gazetteer.open_default()
+    placed = place_customers(sample_df, seed=seed, gazetteer=gazetteer)
     
-    # Major German cities with specific coordinates for better representation
-    german_cities = {
-        'München': {'lat': 48.1351, 'lng': 11.5820, 'spread': 0.3},
-        'Munich': {'lat': 48.1351, 'lng': 11.5820, 'spread': 0.3},
-        'Berlin': {'lat': 52.5200, 'lng': 13.4050, 'spread': 0.3},
-        'Hamburg': {'lat': 53.5511, 'lng': 9.9937, 'spread': 0.3},
-        'Köln': {'lat': 50.9375, 'lng': 6.9603, 'spread': 0.3},
-        'Cologne': {'lat': 50.9375, 'lng': 6.9603, 'spread': 0.3},
-        'Frankfurt': {'lat': 50.1109, 'lng': 8.6821, 'spread': 0.3},
-        'Stuttgart': {'lat': 48.7758, 'lng': 9.1829, 'spread': 0.3},
-        'Düsseldorf': {'lat': 51.2277, 'lng': 6.7735, 'spread': 0.3},
-        'Dortmund': {'lat': 51.5136, 'lng': 7.4653, 'spread': 0.3},
-        'Essen': {'lat': 51.4556, 'lng': 7.0116, 'spread': 0.3},
-        'Leipzig': {'lat': 51.3397, 'lng': 12.3731, 'spread': 0.3},
-        'Bremen': {'lat': 53.0793, 'lng': 8.8017, 'spread': 0.3},
-        'Dresden': {'lat': 51.0504, 'lng': 13.7373, 'spread': 0.3},
-        'Hannover': {'lat': 52.3759, 'lng': 9.7320, 'spread': 0.3},
-        'Nürnberg': {'lat': 49.4521, 'lng': 11.0767, 'spread': 0.3},
-        'Nuremberg': {'lat': 49.4521, 'lng': 11.0767, 'spread': 0.3},
-        'Duisburg': {'lat': 51.4344, 'lng': 6.7623, 'spread': 0.3},
-        'Bochum': {'lat': 51.4818, 'lng': 7.2162, 'spread': 0.3},
-        'Wuppertal': {'lat': 51.2562, 'lng': 7.1508, 'spread': 0.3},
-        'Bielefeld': {'lat': 52.0302, 'lng': 8.5325, 'spread': 0.3},
-        'Bonn': {'lat': 50.7374, 'lng': 7.0982, 'spread': 0.3},
-        'Mannheim': {'lat': 49.4875, 'lng': 8.4660, 'spread': 0.3},
-        'Karlsruhe': {'lat': 49.0069, 'lng': 8.4037, 'spread': 0.3},
-        'Wiesbaden': {'lat': 50.0782, 'lng': 8.2397, 'spread': 0.3},
-        'Münster': {'lat': 51.9607, 'lng': 7.6261, 'spread': 0.3},
-        'Gelsenkirchen': {'lat': 51.5177, 'lng': 7.0857, 'spread': 0.3},
-        'Aachen': {'lat': 50.7753, 'lng': 6.0839, 'spread': 0.3},
-        'Braunschweig': {'lat': 52.2689, 'lng': 10.5267, 'spread': 0.3},
-        'Chemnitz': {'lat': 50.8278, 'lng': 12.9249, 'spread': 0.3},
-        'Kiel': {'lat': 54.3233, 'lng': 10.1228, 'spread': 0.3},
-        'Halle': {'lat': 51.4964, 'lng': 11.9688, 'spread': 0.3},
-        'Magdeburg': {'lat': 52.1205, 'lng': 11.6276, 'spread': 0.3},
-        'Freiburg': {'lat': 47.9990, 'lng': 7.8421, 'spread': 0.3},
-        'Krefeld': {'lat': 51.3392, 'lng': 6.5861, 'spread': 0.3},
-        'Lübeck': {'lat': 53.8654, 'lng': 10.6866, 'spread': 0.3},
-        'Oberhausen': {'lat': 51.4706, 'lng': 6.8514, 'spread': 0.3},
-        'Erfurt': {'lat': 50.9848, 'lng': 11.0299, 'spread': 0.3},
-        'Mainz': {'lat': 49.9929, 'lng': 8.2473, 'spread': 0.3},
-        'Rostock': {'lat': 54.0924, 'lng': 12.0991, 'spread': 0.3},
-        'Kassel': {'lat': 51.3127, 'lng': 9.4797, 'spread': 0.3},
-        'Potsdam': {'lat': 52.3906, 'lng': 13.0645, 'spread': 0.3},
-        'Hagen': {'lat': 51.3671, 'lng': 7.4634, 'spread': 0.3},
-        'Saarbrücken': {'lat': 49.2374, 'lng': 6.9816, 'spread': 0.3},
-        'Mülheim': {'lat': 51.4275, 'lng': 6.8827, 'spread': 0.3},
-        'Ludwigshafen': {'lat': 49.4744, 'lng': 8.4402, 'spread': 0.3},
-        'Leverkusen': {'lat': 51.0459, 'lng': 6.9853, 'spread': 0.3},
-        'Oldenburg': {'lat': 53.1434, 'lng': 8.2146, 'spread': 0.3},
-        'Osnabrück': {'lat': 52.2799, 'lng': 8.0472, 'spread': 0.3},
-        'Solingen': {'lat': 51.1734, 'lng': 7.0845, 'spread': 0.3},
-        'Heidelberg': {'lat': 49.3988, 'lng': 8.6724, 'spread': 0.3},
-        'Herne': {'lat': 51.5416, 'lng': 7.2208, 'spread': 0.3},
-        'Neuss': {'lat': 51.2042, 'lng': 6.6879, 'spread': 0.3},
-        'Darmstadt': {'lat': 49.8728, 'lng': 8.6512, 'spread': 0.3},
-        'Paderborn': {'lat': 51.7187, 'lng': 8.7575, 'spread': 0.3},
-        'Regensburg': {'lat': 49.0134, 'lng': 12.1016, 'spread': 0.3},
-        'Ingolstadt': {'lat': 48.7665, 'lng': 11.4241, 'spread': 0.3},
-        'Würzburg': {'lat': 49.7913, 'lng': 9.9534, 'spread': 0.3},
-        'Fürth': {'lat': 49.4778, 'lng': 10.9887, 'spread': 0.3},
-        'Wolfsburg': {'lat': 52.4227, 'lng': 10.7865, 'spread': 0.3},
-        'Offenbach': {'lat': 50.1006, 'lng': 8.7665, 'spread': 0.3},
-        'Ulm': {'lat': 48.3984, 'lng': 9.9916, 'spread': 0.3},
-        'Heilbronn': {'lat': 49.1427, 'lng': 9.2185, 'spread': 0.3},
-        'Pforzheim': {'lat': 48.8926, 'lng': 8.6949, 'spread': 0.3},
-        'Göttingen': {'lat': 51.5413, 'lng': 9.9158, 'spread': 0.3},
-        'Bottrop': {'lat': 51.5235, 'lng': 6.9225, 'spread': 0.3},
-        'Trier': {'lat': 49.7499, 'lng': 6.6373, 'spread': 0.3},
-        'Recklinghausen': {'lat': 51.6138, 'lng': 7.1977, 'spread': 0.3},
-        'Reutlingen': {'lat': 48.4914, 'lng': 9.2045, 'spread': 0.3},
-        'Bremerhaven': {'lat': 53.5396, 'lng': 8.5809, 'spread': 0.3},
-        'Koblenz': {'lat': 50.3569, 'lng': 7.5940, 'spread': 0.3},
-        'Bergisch Gladbach': {'lat': 50.9856, 'lng': 7.1329, 'spread': 0.3},
-        'Jena': {'lat': 50.9279, 'lng': 11.5892, 'spread': 0.3},
-        'Remscheid': {'lat': 51.1784, 'lng': 7.1894, 'spread': 0.3},
-        'Erlangen': {'lat': 49.5897, 'lng': 11.0041, 'spread': 0.3},
-        'Moers': {'lat': 51.4514, 'lng': 6.6264, 'spread': 0.3},
-        'Siegen': {'lat': 50.8745, 'lng': 8.0243, 'spread': 0.3},
-        'Hildesheim': {'lat': 52.1508, 'lng': 9.9513, 'spread': 0.3},
-        'Salzgitter': {'lat': 52.1508, 'lng': 10.3333, 'spread': 0.3},
-        'Cottbus': {'lat': 51.7216, 'lng': 14.3344, 'spread': 0.3},
-        'Gera': {'lat': 50.8803, 'lng': 12.0826, 'spread': 0.3},
-        'Kaiserslautern': {'lat': 49.4431, 'lng': 7.7689, 'spread': 0.3},
-        'Schwerin': {'lat': 53.6355, 'lng': 11.4012, 'spread': 0.3},
-        'Gütersloh': {'lat': 51.9069, 'lng': 8.3785, 'spread': 0.3},
-        'Witten': {'lat': 51.4436, 'lng': 7.3305, 'spread': 0.3},
-        'Iserlohn': {'lat': 51.3754, 'lng': 7.7020, 'spread': 0.3},
-        'Ludwigsburg': {'lat': 48.8974, 'lng': 9.1916, 'spread': 0.3},
-        'Hanau': {'lat': 50.1348, 'lng': 8.9144, 'spread': 0.3},
-        'Esslingen': {'lat': 48.7424, 'lng': 9.3048, 'spread': 0.3},
-        'Zwickau': {'lat': 50.7186, 'lng': 12.4942, 'spread': 0.3},
-        'Düren': {'lat': 50.8008, 'lng': 6.4830, 'spread': 0.3},
-        'Ratingen': {'lat': 51.2972, 'lng': 6.8497, 'spread': 0.3},
-        'Tübingen': {'lat': 48.5206, 'lng': 9.0556, 'spread': 0.3},
-        'Villingen-Schwenningen': {'lat': 48.0582, 'lng': 8.4616, 'spread': 0.3},
-        'Königs Wusterhausen': {'lat': 52.3014, 'lng': 13.6330, 'spread': 0.3},
-        'Lünen': {'lat': 51.6164, 'lng': 7.5282, 'spread': 0.3},
-        'Marl': {'lat': 51.6567, 'lng': 7.0904, 'spread': 0.3},
-        'Velbert': {'lat': 51.3373, 'lng': 7.0419, 'spread': 0.3},
-        'Minden': {'lat': 52.2895, 'lng': 8.9145, 'spread': 0.3},
-        'Dessau-Roßlau': {'lat': 51.8364, 'lng': 12.2469, 'spread': 0.3},
-        'Viersen': {'lat': 51.2543, 'lng': 6.3944, 'spread': 0.3},
-        'Rheine': {'lat': 52.2799, 'lng': 7.4407, 'spread': 0.3},
-        'Lüdenscheid': {'lat': 51.2254, 'lng': 7.6273, 'spread': 0.3},
-        'Castrop-Rauxel': {'lat': 51.5561, 'lng': 7.3116, 'spread': 0.3},
-        'Gladbeck': {'lat': 51.5708, 'lng': 6.9854, 'spread': 0.3},
-        'Bocholt': {'lat': 51.8388, 'lng': 6.6153, 'spread': 0.3},
-        'Bamberg': {'lat': 49.8988, 'lng': 10.9027, 'spread': 0.3},
-        'Detmold': {'lat': 51.9334, 'lng': 8.8733, 'spread': 0.3},
-        'Arnsberg': {'lat': 51.3963, 'lng': 8.0641, 'spread': 0.3},
-        'Lüneburg': {'lat': 53.2504, 'lng': 10.4145, 'spread': 0.3},
-        'Bayreuth': {'lat': 49.9483, 'lng': 11.5783, 'spread': 0.3},
-        'Celle': {'lat': 52.6226, 'lng': 10.0805, 'spread': 0.3},
-        'Landshut': {'lat': 48.5378, 'lng': 12.1518, 'spread': 0.3},
-        'Aschaffenburg': {'lat': 49.9770, 'lng': 9.1521, 'spread': 0.3},
-        'Dinslaken': {'lat': 51.5667, 'lng': 6.7333, 'spread': 0.3},
-        'Aalen': {'lat': 48.8378, 'lng': 10.0933, 'spread': 0.3},
-        'Fulda': {'lat': 50.5598, 'lng': 9.6710, 'spread': 0.3},
-        'Lippstadt': {'lat': 51.6733, 'lng': 8.3447, 'spread': 0.3},
-        'Weimar': {'lat': 50.9795, 'lng': 11.3235, 'spread': 0.3},
-        'Dormagen': {'lat': 51.0963, 'lng': 6.8319, 'spread': 0.3},
-        'Neumünster': {'lat': 54.0744, 'lng': 9.9819, 'spread': 0.3},
-        'Sindelfingen': {'lat': 48.7136, 'lng': 8.9967, 'spread': 0.3},
-        'Rosenheim': {'lat': 47.8564, 'lng': 12.1291, 'spread': 0.3},
-        'Herten': {'lat': 51.6000, 'lng': 7.1333, 'spread': 0.3},
-        'Bergheim': {'lat': 50.9550, 'lng': 6.6390, 'spread': 0.3},
-        'Schwäbisch Gmünd': {'lat': 48.8014, 'lng': 9.7974, 'spread': 0.3},
-        'Friedrichshafen': {'lat': 47.6582, 'lng': 9.4758, 'spread': 0.3},
-        'Wesel': {'lat': 51.6583, 'lng': 6.6172, 'spread': 0.3},
-        'Kempten': {'lat': 47.7278, 'lng': 10.3137, 'spread': 0.3},
-        'Görlitz': {'lat': 51.1552, 'lng': 14.9885, 'spread': 0.3},
-        'Frankfurt (Oder)': {'lat': 52.3412, 'lng': 14.5500, 'spread': 0.3},
-        'Frankfurt Oder': {'lat': 52.3412, 'lng': 14.5500, 'spread': 0.3},
-        'Lübeck': {'lat': 53.8654, 'lng': 10.6866, 'spread': 0.3},
-        'Mönchengladbach': {'lat': 51.1805, 'lng': 6.4428, 'spread': 0.3},
-        'Moenchengladbach': {'lat': 51.1805, 'lng': 6.4428, 'spread': 0.3}
-    }
+    return placed.to_dict('records')
+
+MAP_DATA_NOTE = 'This data includes ALL customers with mock coordinates for demonstration purposes. German cities have accurate coordinates. For production use, replace with real geocoding.'
+
+@instrumented
+def save_data_for_map(data, filename='customers_for_map.json', compact=True, precompress=False):
+    """Save data in the format needed for the map
     
-    for idx, row in sample_df.iterrows():
-        # Get base coordinates for the country and city
-        country = row['country'] if row['country'] else 'DE'
-        city = str(row['city']).strip() if pd.notna(row['city']) else ''
-        
-        # Check if we have specific coordinates for this city
-        if city in german_cities:
-            base_coords = german_cities[city]
-            # Add small randomness around the exact city coordinates
-            spread = base_coords['spread']
-            lat_variation = np.random.uniform(-spread/2, spread/2)
-            lng_variation = np.random.uniform(-spread/2, spread/2)
-        else:
-            # Use country coordinates
-            base_coords = country_coords.get(country, country_coords['DE'])
-            # Add random variation based on country spread
-            spread = base_coords['spread']
-            lat_variation = np.random.uniform(-spread/2, spread/2)
-            lng_variation = np.random.uniform(-spread/2, spread/2)
-        
-        # Handle NaN customer numbers
-        customer_num = row['customer_number']
-        if pd.isna(customer_num):
-            customer_num = 0
-        else:
-            try:
-                customer_num = int(customer_num)
-            except (ValueError, TypeError):
-                customer_num = 0
-        
-        sample_data.append({
-            'id': row['id'],
-            'customer_number': customer_num,
-            'customer_identifier': row['customer_identifier'],
-            'is_active': bool(row['is_active']),
-            'street': row['street'],
-            'postal_code': row['postal_code'],
-            'city': row['city'],
-            'country': row['country'],
-            'full_address': row['full_address'],
-            'latitude': base_coords['lat'] + lat_variation,
-            'longitude': base_coords['lng'] + lng_variation
-        })
-    
-    return sample_data
-
-def save_data_for_map(data, filename='customers_for_map.json'):
-    """Save data in the format needed for the map"""
-    
-    map_data = {
-        'metadata': {
-            'total_customers': len(data),
-            'active_customers': sum(1 for c in data if c['is_active']),
-            'inactive_customers': sum(1 for c in data if not c['is_active']),
-            'generated_at': datetime.now().isoformat(),
-            'note': 'This data includes ALL customers with mock coordinates for demonstration purposes. German cities have accurate coordinates. For production use, replace with real geocoding.'
-        },
-        'customers': data
-    }
+    The customers are streamed to disk one at a time (compact JSON unless
+    compact=False); precompress also writes .gz/.br siblings and
+    content-hashed copies, see map_writer.write_map_data_stream.
+    """
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(map_data, f, ensure_ascii=False, indent=2)
+    metadata = write_map_data_stream(data, filename, note=MAP_DATA_NOTE, compact=compact, precompress=precompress)
     
-    print(f"Map data saved to {filename}")
-    return map_data
+    return {'metadata': metadata, 'customers': data}
 
-def create_clean_csv_summary(df, filename='customer_summary_clean.csv'):
-    """Create a clean summary CSV file"""
-    
-    # Filter out invalid country codes
-    clean_df = df[df['country'] != ''].copy()
+@instrumented(rows=False)
+def write_clean_summary(counts, filename='customer_summary_clean.csv'):
+    """Write a (country, is_active) count series as the clean summary CSV"""
     
-    summary = clean_df.groupby(['country', 'is_active']).size().unstack(fill_value=0)
+    summary = counts.unstack(fill_value=0)
     summary.columns = ['Inactive', 'Active']
     summary['Total'] = summary['Active'] + summary['Inactive']
     
@@ -421,32 +780,410 @@ def create_clean_csv_summary(df, filename='customer_summary_clean.csv'):
     
     return summary
 
-def main():
-    """Main function to process all customer data with improved quality"""
-    print("=== aboutwater Customer Data Processing (Improved) ===")
-    print()
+@instrumented(rows=False)
+def create_clean_csv_summary(df, filename='customer_summary_clean.csv'):
+    """Create a clean summary CSV file"""
+    return write_clean_summary(CustomerFacets.from_frame(df).country_status_counts(), filename)
+
+def iter_placed_chunks(chunks, seed=42, gazetteer=None):
+    """Clean and place a stream of raw export chunks, yielding one placed DataFrame per chunk
+    
+    Ids continue across chunks and the offsets do not depend on the chunk
+    boundaries, so the concatenated output equals a single in-memory run.
+    """
+    
+    next_id = 1
+    
+    for chunk in chunks:
+        cleaned = clean_customer_frame(chunk, first_id=next_id, verbose=False)
+        next_id += len(cleaned)
+        if len(cleaned):
+            yield place_customers(cleaned, seed=seed, gazetteer=gazetteer)
+
+@instrumented
+def process_customers_streaming(source=SOURCE_CSV, filename='customers_for_map.json',
+                                chunksize=DEFAULT_CHUNK_SIZE, seed=42, gazetteer=None,
+                                compact=True, precompress=False):
+    """Run cleaning, placement, map data and summary output chunk by chunk with bounded memory
+    
+    Returns (metadata, facets) where facets is the CustomerFacets of all chunks.
+    """
+    
+    if gazetteer is None:
+        gazetteer = Gazetteer.open_default()
+    
+    facets = CustomerFacets()
+    
+    def counted_records(placed_chunks):
+        for placed in placed_chunks:
+            facets.add(placed)
+            yield from placed.to_dict('records')
+    
+    print(f"Streaming {source} in chunks of {chunksize} rows...")
+    placed_chunks = iter_placed_chunks(iter_customer_export(source, chunksize), seed=seed, gazetteer=gazetteer)
+    metadata = write_map_data_stream(counted_records(placed_chunks), filename, note=MAP_DATA_NOTE,
+                                     compact=compact, precompress=precompress)
+    
+    return metadata, facets
+
+def layer_files(pattern=LAYER_CSV_PATTERN):
+    """The Layer CSVs of the split export, in layer order"""
+    return sorted(glob.glob(pattern), key=lambda path: int(re.search(r'(\d+)\.csv$', path).group(1)))
+
+def file_partition(path):
+    """Work unit (path, start, end) covering all data rows of one export file"""
+    with open(path, 'rb') as f:
+        start = len(f.readline())
+    return path, start, os.path.getsize(path)
+
+def split_export(path=SOURCE_CSV, parts=4):
+    """Split the data rows of an export file into up to parts byte ranges on record boundaries
+    
+    Each range is a (path, start, end) work unit. Ranges end at a line end
+    outside quoted fields: the quotes are counted from the first data row,
+    and a line end after an even number of them ends a record (an escaped
+    quote "" counts twice). So every range holds whole records even when a
+    quoted field contains commas or line breaks.
+    """
+    
+    path, start, size = file_partition(path)
+    bounds = [start]
+    quotes = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for part in range(1, parts):
+            # Boundary after the line holding the byte before the target, as long as it is past the last one
+            target = start + (size - start) * part // parts - 1
+            if f.tell() > target:
+                continue
+            while f.tell() < target:
+                quotes += f.read(min(target - f.tell(), 1 << 20)).count(b'"')
+            # Finish the line, and further lines while inside a quoted field
+            while True:
+                line = f.readline()
+                quotes += line.count(b'"')
+                if not line or quotes % 2 == 0:
+                    break
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return [(path, begin, end) for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+def read_export_partition(unit):
+    """Read the raw export rows of a (path, start, end) work unit"""
+    path, start, end = unit
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(header + body), dtype=EXPORT_DTYPES)
+    df.columns = EXPORT_COLUMNS
+    return df
+
+def process_partition(unit):
+    """Clean, locate and count one work unit in a worker process
+    
+    Ids are local to the unit (numbered from 1); the records are placed in
+    the merge, once the global ids are known.
+    """
+    cleaned = clean_customer_frame(read_export_partition(unit), verbose=False)
+    located = locate_customers(cleaned, Gazetteer.open_default(), verbose=False)
+    return cleaned, located, CustomerFacets.from_frame(cleaned)
+
+@instrumented(rows=False)
+def process_customers_parallel(units, workers=None, seed=42):
+    """Run cleaning, placement and aggregation of independent work units in a process pool
+    
+    units are (path, start, end) ranges of export files (see split_export
+    and file_partition). Partial results are merged in unit order: global
+    ids continue from unit to unit and the offsets do not depend on the
+    partitioning, so the output equals a serial run over the same rows
+    whatever the number of units or workers.
+    
+    Returns (customer records, CustomerFacets).
+    """
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    print(f"Processing {len(units)} partitions with {workers} worker processes...")
+    if workers == 1:
+        results = [process_partition(unit) for unit in units]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process_partition, units))
     
-    # Clean and standardize the data
-    df = clean_and_standardize_data()
+    facets = CustomerFacets()
+    next_id = 1
+    for cleaned, _, partial in results:
+        facets.merge(partial, id_offset=next_id - 1)
+        next_id += len(cleaned)
+    facets.print_quality()
     
-    # Create improved geocoded data for ALL customers
-    sample_data = create_improved_geocoded_data(df, sample_size=len(df))
+    df = pd.concat([cleaned for cleaned, _, _ in results], ignore_index=True)
+    df['id'] = np.arange(1, len(df) + 1)
+    located = tuple(np.concatenate(parts) for parts in zip(*(located for _, located, _ in results)))
     
-    # Save data for the map
-    map_data = save_data_for_map(sample_data)
+    placed = place_customers(df, seed=seed, located=located)
+    return placed.to_dict('records'), facets
+
+# Bump whenever cleaning or placement rules change so incremental state is rebuilt
+PROCESSING_VERSION = 5
+
+def state_filename(filename):
+    """Sidecar state file for an incremental map data file"""
+    return filename.rsplit('.json', 1)[0] + '.state.json'
+
+def fingerprint_rows(raw):
+    """Content hash (uint64) of every raw export row"""
+    return pd.util.hash_pandas_object(raw, index=False).to_numpy()
+
+def load_incremental_state(filename):
+    """Load the previous map data and its fingerprints, or None if a full rebuild is needed"""
+    try:
+        with open(state_filename(filename), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        with open(filename, 'r', encoding='utf-8') as f:
+            customers = json.load(f)['customers']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+    
+    if state.get('processing_version') != PROCESSING_VERSION or len(state.get('rows', [])) != len(customers):
+        return None
+    
+    return state, customers
+
+def save_incremental_state(filename, rows):
+    """Write the (customer_number, fingerprint) of every output record, aligned with the customers list"""
+    state = {
+        'processing_version': PROCESSING_VERSION,
+        'generated_at': datetime.now().isoformat(),
+        'rows': rows
+    }
+    with open(state_filename(filename), 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+@instrumented
+def update_map_data_incrementally(source=SOURCE_CSV, filename='customers_for_map.json', seed=42, gazetteer=None,
+                                  compact=True, precompress=False):
+    """Rebuild the map data, re-cleaning and re-placing only new or changed export rows
+    
+    Every raw row is fingerprinted and matched against the fingerprints stored
+    per customer_number in the sidecar state file. Matching rows keep their
+    previous record (and coordinates), rows that no longer exist are dropped
+    and only the remaining rows go through cleaning and placement. Falls back
+    to a full rebuild when there is no usable state.
+    
+    Returns the saved map data, with customers in export order.
+    """
+    
+    raw = read_customer_export(source)
+    fingerprints = fingerprint_rows(raw)
+    numbers = raw['customer_number'].fillna(0).astype('int64').to_numpy()
+    
+    previous = load_incremental_state(filename)
+    carried = {}
+    if previous is None:
+        print("No incremental state found, processing all rows")
+    else:
+        state, customers = previous
+        for (number, fingerprint), record in zip(state['rows'], customers):
+            carried.setdefault((number, fingerprint), []).append(record)
+    
+    reused = {}
+    for position, key in enumerate(zip(numbers.tolist(), fingerprints.tolist())):
+        bucket = carried.get(key)
+        if bucket:
+            reused[position] = bucket.pop()
+    
+    changed_positions = np.setdiff1d(np.arange(len(raw)), np.fromiter(reused, dtype=np.int64, count=len(reused)))
+    removed = sum(len(bucket) for bucket in carried.values())
+    print(f"Incremental update: {len(reused)} unchanged, {len(changed_positions)} new or changed, {removed} removed")
+    
+    placed = {}
+    if len(changed_positions):
+        changed = clean_customer_frame(raw.iloc[changed_positions])
+        if len(changed):
+            if gazetteer is None:
+                gazetteer = Gazetteer.open_default()
+            records = place_customers(changed, seed=seed, gazetteer=gazetteer).to_dict('records')
+            placed = dict(zip(raw.index.get_indexer(changed.index).tolist(), records))
+    
+    data = []
+    rows = []
+    for position in range(len(raw)):
+        record = reused.get(position) or placed.get(position)
+        if record is None:
+            continue
+        record['id'] = len(data) + 1
+        data.append(record)
+        rows.append([int(numbers[position]), int(fingerprints[position])])
+    
+    map_data = save_data_for_map(data, filename, compact=compact, precompress=precompress)
+    save_incremental_state(filename, rows)
+    
+    return map_data
+
+def parse_args(argv=None):
+    """Parse the command line options of the processor"""
+    parser = argparse.ArgumentParser(description='Process the customer export into map data')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', action='store_true',
+                      help='only re-process export rows that changed since the last run')
+    mode.add_argument('--stream', action='store_true',
+                      help='process the export in chunks with bounded memory')
+    mode.add_argument('--parallel', action='store_true',
+                      help='process partitions of the export in a pool of worker processes')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='rows per chunk in --stream mode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes in --parallel mode (default: number of CPUs)')
+    parser.add_argument('--layers', action='store_true',
+                        help='in --parallel mode, use the Layer_*.csv files as partitions')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='clean the export even if the clean cache holds its cleaned table')
+    parser.add_argument('--report', default=None,
+                        help='where to write the JSON run report with per-stage timings, memory and row counts '
+                             '(default: run_report.improved_data_processor.json)')
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help='also profile each stage: cpu (cProfile, saved to profiles/) or memory (tracemalloc)')
+    parser.add_argument('--indent', action='store_true',
+                        help='write indented instead of compact JSON')
+    parser.add_argument('--precompress', action='store_true',
+                        help='also write .gz/.br siblings, content-hashed copies and a manifest')
+    parser.add_argument('--binary', action='store_true',
+                        help='also write the columnar customers_for_map.bin (not with --stream)')
+    parser.add_argument('--tiles', action='store_true',
+                        help='also write per-tile map data to tiles/ (not with --stream)')
+    parser.add_argument('--clusters', action='store_true',
+                        help='also write the zoom 0-18 marker cluster pyramid to clusters/ (not with --stream)')
+    parser.add_argument('--search-index', action='store_true',
+                        help='also write the customer search index customers_search_index.json (not with --stream)')
+    parser.add_argument('--query-index', action='store_true',
+                        help='also write the city/spatial query index customers_query.bin (not with --stream)')
+    parser.add_argument('--duplicates', action='store_true',
+                        help='also detect duplicate customers into customer_duplicates.csv (not with --stream)')
+    parser.add_argument('--publish', action='store_true',
+                        help='also publish a versioned snapshot and a delta from the previous version to publish/ '
+                             '(not with --stream)')
+    args = parser.parse_args(argv)
+    if (args.workers or args.layers) and not args.parallel:
+        parser.error('--workers and --layers require --parallel')
+    if args.stream and (args.binary or args.tiles or args.clusters or args.search_index or args.query_index
+                        or args.duplicates or args.publish):
+        parser.error('--binary, --tiles, --clusters, --search-index, --query-index, --duplicates and --publish '
+                     'need the whole table and cannot be combined with --stream')
+    return args
+
+def run_processing(args):
+    """Run the stages selected by the command line options
+    
+    Returns (summary, metadata, total_processed) for the closing report.
+    """
+    
+    if args.stream:
+        # Clean, place and write the export chunk by chunk
+        metadata, facets = process_customers_streaming(chunksize=args.chunksize, compact=not args.indent,
+                                                       precompress=args.precompress)
+    else:
+        if args.incremental:
+            # Only re-process rows that changed since the last run
+            map_data = update_map_data_incrementally(compact=not args.indent, precompress=args.precompress)
+            facets = CustomerFacets.from_frame(pd.DataFrame(map_data['customers']))
+        elif args.parallel:
+            # Clean, place and count independent partitions in worker processes
+            workers = args.workers or os.cpu_count() or 1
+            if args.layers:
+                units = [file_partition(path) for path in layer_files()]
+            else:
+                units = split_export(parts=workers * 4)
+            sample_data, facets = process_customers_parallel(units, workers=workers)
+            map_data = save_data_for_map(sample_data, compact=not args.indent, precompress=args.precompress)
+        else:
+            # Clean and standardize the data, counting facets on the way
+            facets = CustomerFacets()
+            df = clean_and_standardize_data(facets=facets, cache=not args.no_cache)
+            
+            # Create improved geocoded data for ALL customers
+            sample_data = create_improved_geocoded_data(df, sample_size=len(df))
+            
+            # Save data for the map
+            map_data = save_data_for_map(sample_data, compact=not args.indent, precompress=args.precompress)
+        
+        customers = map_data['customers']
+        
+        if args.binary:
+            with stage('write_map_binary') as step:
+                step.rows_in = len(customers)
+                write_map_binary(customers)
+        
+        if args.tiles:
+            processing = load_config().get('data_processing', {})
+            with stage('write_tiles') as step:
+                step.rows_in = len(customers)
+                write_tiles(customers,
+                            min_zoom=processing.get('tile_min_zoom', DEFAULT_MIN_ZOOM),
+                            max_zoom=processing.get('tile_max_zoom', DEFAULT_MAX_ZOOM))
+        
+        if args.clusters:
+            processing = load_config().get('data_processing', {})
+            with stage('write_clusters') as step:
+                step.rows_in = len(customers)
+                write_clusters(customers, cell_size=processing.get('cluster_cell_size', DEFAULT_CELL_SIZE))
+        
+        if args.search_index:
+            with stage('write_search_index') as step:
+                step.rows_in = len(customers)
+                write_search_index(customers)
+        
+        if args.query_index:
+            with stage('write_query_index') as step:
+                step.rows_in = len(customers)
+                write_query_index(customers)
+        
+        if args.duplicates:
+            with stage('detect_duplicates') as step:
+                step.rows_in = len(customers)
+                detect_duplicates(pd.DataFrame(customers))
+        
+        if args.publish:
+            processing = load_config().get('data_processing', {})
+            with stage('publish_map_data') as step:
+                step.rows_in = len(customers)
+                publish_map_data(customers, keep=processing.get('publish_keep_versions', DEFAULT_KEEP_VERSIONS))
+        
+        metadata = map_data['metadata']
+    
+    # Create clean summary and facet index
+    summary = write_clean_summary(facets.country_status_counts())
+    with stage('save_facets'):
+        facets.save()
+    total_processed = facets.total
+    
+    return summary, metadata, total_processed
+
+def main(argv=None):
+    """Main function to process all customer data with improved quality"""
+    args = parse_args(argv)
+    
+    print("=== aboutwater Customer Data Processing (Improved) ===")
+    print()
     
-    # Create clean summary
-    summary = create_clean_csv_summary(df)
+    with RunReport(profile=args.profile) as report:
+        summary, metadata, total_processed = run_processing(args)
+    report_file = report.save(args.report)
     
     print("\n=== Processing Complete ===")
-    print(f"Total customers processed: {len(df)}")
-    print(f"All customers processed: {len(sample_data)}")
-    print(f"Active customers in sample: {map_data['metadata']['active_customers']}")
-    print(f"Inactive customers in sample: {map_data['metadata']['inactive_customers']}")
+    print(f"Total customers processed: {total_processed}")
+    print(f"All customers processed: {metadata['total_customers']}")
+    print(f"Active customers in sample: {metadata['active_customers']}")
+    print(f"Inactive customers in sample: {metadata['inactive_customers']}")
     
     print("\nFiles created:")
     print("- customers_for_map.json (for the map)")
     print("- customer_summary_clean.csv (clean summary statistics)")
+    print("- customers_facets.json (facet counts and id lists)")
+    print(f"- {report_file} (per-stage timings, memory and row counts)")
     
     print("\nNext steps:")
     print("1. Open the HTML map file to visualize customers")
@@ -0,0 +1,278 @@
+"""
+Per-stage instrumentation of the processing runs
+
+Functions of improved_data_processor.py are wrapped with @instrumented,
+which records them as stages named after the function; other steps use
+the same timer as a context manager (with stage('write_tiles'):).
+While a RunReport is active, every stage records its wall time, how far
+it raised the process's maximum resident set size and its rows
+in/out/dropped:
+rows in from the first DataFrame or list argument, rows out from the
+result (a DataFrame, a list, a tuple starting with one, or map data with a
+customers list). A stage can add its own counts with record_metrics
+(e.g. addresses and unique_addresses of the address deduplication).
+Stages called inside other stages are nested; repeated calls of the same
+stage (one per chunk in --stream mode) are summed. Without an active
+report the wrappers only cost a function call.
+
+The report is written as JSON, to run_report.<script>.json by default so
+the entry points do not overwrite each other's reports:
+
+    version, command, started_at, seconds, max_rss_mb, profile
+    stages      [{name, calls, seconds, max_rss_growth_mb, rows_in, rows_out,
+                  rows_dropped, metrics, peak_traced_mb, profile_file, stages}, ...]
+
+max_rss_mb is the peak of the whole run. A stage's max_rss_growth_mb is how
+much the peak rose while it ran, summed over its calls: memory it needed
+beyond the peak reached before it (0 when it fit under that peak).
+
+metrics holds the recorded counts plus the ratios of METRIC_RATIOS whose
+counts were recorded.
+
+profile='cpu' runs each outermost stage under cProfile and saves the
+statistics to profiles/<stage>.prof; profile='memory' traces allocations
+with tracemalloc and adds each stage's peak traced memory. Both slow the
+run down, so they are opt-in.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+REPORT_VERSION = 2
+REPORT_FILE_PATTERN = 'run_report.{script}.json'
+PROFILE_DIR = 'profiles'
+PROFILE_MODES = ('cpu', 'memory')
+
+# Ratios added to a stage's metrics: name -> (numerator count, denominator count)
+METRIC_RATIOS = {'dedup_ratio': ('addresses', 'unique_addresses')}
+
+_active_report = None
+
+def max_rss_mb():
+    """Maximum resident set size of the process so far (MB)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(rss / (1e6 if sys.platform == 'darwin' else 1e3), 1)
+
+def report_filename(command=None):
+    """Default report file of a command line: run_report.<script>.json"""
+    command = sys.argv if command is None else command
+    script = os.path.splitext(os.path.basename(command[0]))[0] if command and command[0] else ''
+    return REPORT_FILE_PATTERN.format(script=script or 'python')
+
+def count_rows(value):
+    """Number of rows in a stage argument or result, or None if it has none"""
+    if isinstance(value, tuple):
+        return count_rows(value[0]) if value else None
+    if isinstance(value, dict):
+        return count_rows(value['customers']) if 'customers' in value else None
+    if hasattr(value, '__len__') and not isinstance(value, (str, bytes)):
+        return len(value)
+    return None
+
+class StageRecord:
+    """Accumulated measurements of one stage at one position in the stage tree"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.metrics = {}
+        self.max_rss_growth = 0.0
+        self.peak_traced = 0
+        self.profile_file = None
+        self.children = {}
+
+    def child(self, name):
+        if name not in self.children:
+            self.children[name] = StageRecord(name)
+        return self.children[name]
+
+    def add_rows(self, rows_in, rows_out):
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+
+    def add_metrics(self, counts):
+        for name, count in counts.items():
+            self.metrics[name] = self.metrics.get(name, 0) + count
+
+    def metrics_dict(self):
+        metrics = dict(self.metrics)
+        for name, (numerator, denominator) in METRIC_RATIOS.items():
+            if metrics.get(numerator) is not None and metrics.get(denominator):
+                metrics[name] = round(metrics[numerator] / metrics[denominator], 4)
+        return metrics
+
+    def to_dict(self):
+        record = {'name': self.name, 'calls': self.calls, 'seconds': round(self.seconds, 4),
+                  'max_rss_growth_mb': round(self.max_rss_growth, 1)}
+        if self.rows_in is not None:
+            record['rows_in'] = self.rows_in
+        if self.rows_out is not None:
+            record['rows_out'] = self.rows_out
+        if self.rows_in is not None and self.rows_out is not None:
+            record['rows_dropped'] = self.rows_in - self.rows_out
+        if self.metrics:
+            record['metrics'] = self.metrics_dict()
+        if self.peak_traced:
+            record['peak_traced_mb'] = round(self.peak_traced / 1e6, 1)
+        if self.profile_file:
+            record['profile_file'] = self.profile_file
+        if self.children:
+            record['stages'] = [child.to_dict() for child in self.children.values()]
+        return record
+
+class RunReport:
+    """Stage tree of one processing run
+
+    Use as a context manager around the run; stages record into it while
+    it is active.
+    """
+
+    def __init__(self, profile=None, command=None):
+        if profile is not None and profile not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {profile}")
+        self.profile = profile
+        self.command = sys.argv if command is None else command
+        self.root = StageRecord('run')
+        self.stack = [self.root]
+        self.started_at = None
+        self.start = None
+        self.seconds = None
+
+    def __enter__(self):
+        global _active_report
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        if self.profile == 'memory':
+            tracemalloc.start()
+        _active_report = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active_report
+        _active_report = None
+        self.seconds = time.perf_counter() - self.start
+        if self.profile == 'memory':
+            self.root.peak_traced = max(self.root.peak_traced, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return False
+
+    def enter(self, name):
+        record = self.stack[-1].child(name)
+        self.stack.append(record)
+        if self.profile == 'memory':
+            # The parent's peak so far is kept before the counter is reset for the child
+            parent = self.stack[-2]
+            parent.peak_traced = max(parent.peak_traced, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        return record
+
+    def exit(self, record, seconds, rows_in, rows_out, max_rss_growth=0.0):
+        self.stack.pop()
+        record.calls += 1
+        record.seconds += seconds
+        record.max_rss_growth += max_rss_growth
+        record.add_rows(rows_in, rows_out)
+        if self.profile == 'memory':
+            record.peak_traced = max(record.peak_traced, tracemalloc.get_traced_memory()[1])
+            parent = self.stack[-1]
+            parent.peak_traced = max(parent.peak_traced, record.peak_traced)
+
+    def to_dict(self):
+        return {
+            'version': REPORT_VERSION,
+            'command': self.command,
+            'started_at': self.started_at,
+            'seconds': round(self.seconds if self.seconds is not None else time.perf_counter() - self.start, 4),
+            'max_rss_mb': max_rss_mb(),
+            'profile': self.profile,
+            'stages': [child.to_dict() for child in self.root.children.values()]
+        }
+
+    def save(self, filename=None):
+        """Write the report (to report_filename of its command by default); returns the file name"""
+        if filename is None:
+            filename = report_filename(self.command)
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Run report saved to {filename}")
+        return filename
+
+def record_metrics(**counts):
+    """Add counts to the metrics of the innermost running stage (no-op without an active report)"""
+    if _active_report is not None:
+        _active_report.stack[-1].add_metrics(counts)
+
+def instrumented(function=None, rows=True):
+    """Decorator recording a function as a stage of the same name
+
+    rows=False skips the row counts, for functions whose arguments or
+    results are not customer rows.
+    """
+    if function is None:
+        return lambda function: instrumented(function, rows)
+    return stage(function.__name__, rows)(function)
+
+class stage:
+    """Time a stage of the active RunReport, as a decorator or a context manager
+
+    As a context manager, set rows_in/rows_out on the returned object.
+    """
+
+    def __init__(self, name, rows=True):
+        self.name = name
+        self.rows = rows
+        self.rows_in = None
+        self.rows_out = None
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active_report is None:
+                return function(*args, **kwargs)
+            with stage(self.name) as current:
+                if self.rows:
+                    current.rows_in = count_rows(args[0]) if args else None
+                result = function(*args, **kwargs)
+                if self.rows:
+                    current.rows_out = count_rows(result)
+            return result
+        return wrapper
+
+    def __enter__(self):
+        self.report = _active_report
+        if self.report is None:
+            return self
+        self.record = self.report.enter(self.name)
+        self.profiler = None
+        if self.report.profile == 'cpu' and len(self.report.stack) == 2:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start_rss = max_rss_mb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.report is None:
+            return False
+        seconds = time.perf_counter() - self.start
+        max_rss_growth = max_rss_mb() - self.start_rss
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self.record.profile_file = os.path.join(PROFILE_DIR, f'{self.name}.prof')
+            self.profiler.dump_stats(self.record.profile_file)
+        self.report.exit(self.record, seconds, self.rows_in, self.rows_out, max_rss_growth)
+        return False
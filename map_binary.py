@@ -0,0 +1,200 @@
+"""
+Columnar binary format for the map data (customers_for_map.bin)
+
+All integers are little-endian and every section starts on a 4-byte boundary,
+so a browser can view numeric columns directly as typed arrays.
+
+Header (16 bytes):
+    magic           4 bytes   b'AWCB'
+    version         uint32    1
+    row_count       uint32    n
+    column_count    uint32    k
+
+Column directory, k entries of 32 bytes each:
+    name            20 bytes  ASCII, NUL padded
+    type            uint32    see COLUMN_TYPES
+    offset          uint32    byte offset of the column section from the start of the file
+    length          uint32    byte length of the column section
+
+Column sections by type:
+    FLOAT32 (1)     n float32 values
+    INT32   (2)     n int32 values
+    BITSET  (3)     ceil(n / 8) bytes, row i is bit (i % 8) of byte (i // 8)
+    DICT    (4)     uint32 m, uint32 codes[n], uint32 offsets[m + 1], UTF-8 bytes of the m strings
+                    (row i is string codes[i]; string j is bytes[offsets[j]:offsets[j + 1]])
+    STRING  (5)     uint32 offsets[n + 1], UTF-8 bytes of the n strings
+
+full_address is not stored; readers rebuild it from street, postal_code,
+city and country exactly like create_full_address.
+
+Reading needs numpy only (pandas is imported by the writers), so command
+line tools built on the container start quickly.
+"""
+
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b'AWCB'
+FORMAT_VERSION = 1
+
+FLOAT32, INT32, BITSET, DICT, STRING = 1, 2, 3, 4, 5
+
+# Column layout of the binary file, in file order
+COLUMN_TYPES = [
+    ('id', INT32),
+    ('customer_number', INT32),
+    ('is_active', BITSET),
+    ('latitude', FLOAT32),
+    ('longitude', FLOAT32),
+    ('country', DICT),
+    ('city', DICT),
+    ('postal_code', DICT),
+    ('street', DICT),
+    ('customer_identifier', STRING)
+]
+
+HEADER = struct.Struct('<4sIII')
+DIRECTORY_ENTRY = struct.Struct('<20sIII')
+
+def pad4(data):
+    """Pad bytes to a multiple of 4"""
+    return data + b'\0' * (-len(data) % 4)
+
+def encode_strings(values):
+    """Encode strings as (uint32 offsets[m + 1], UTF-8 bytes)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets.tobytes() + b''.join(encoded)
+
+def decode_strings(buffer, start, count):
+    """Decode count strings stored as offsets + bytes at start; returns (strings, end)"""
+    offsets = np.frombuffer(buffer, dtype='<u4', count=count + 1, offset=start)
+    data_start = start + 4 * (count + 1)
+    blob = bytes(buffer[data_start:data_start + int(offsets[-1])])
+    strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(count)]
+    return strings, data_start + int(offsets[-1])
+
+def encode_column(values, column_type):
+    """Encode one column as its section bytes"""
+    import pandas as pd
+
+    if column_type == FLOAT32:
+        return np.asarray(values, dtype='<f4').tobytes()
+    if column_type == INT32:
+        return np.asarray(values, dtype='<i4').tobytes()
+    if column_type == BITSET:
+        return np.packbits(np.asarray(values, dtype=bool), bitorder='little').tobytes()
+
+    strings = pd.Series(values, dtype=object).fillna('').astype(str)
+    if column_type == DICT:
+        codes, uniques = pd.factorize(strings, sort=True)
+        return (struct.pack('<I', len(uniques)) + codes.astype('<u4').tobytes() +
+                encode_strings(list(uniques)))
+    return encode_strings(strings.tolist())
+
+def decode_column(buffer, offset, length, column_type, row_count):
+    """Decode one column section into a numpy array (or list of strings)"""
+    if column_type == FLOAT32:
+        return np.frombuffer(buffer, dtype='<f4', count=row_count, offset=offset)
+    if column_type == INT32:
+        return np.frombuffer(buffer, dtype='<i4', count=row_count, offset=offset)
+    if column_type == BITSET:
+        bits = np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset)
+        return np.unpackbits(bits, count=row_count, bitorder='little').astype(bool)
+    if column_type == DICT:
+        (unique_count,) = struct.unpack_from('<I', buffer, offset)
+        codes = np.frombuffer(buffer, dtype='<u4', count=row_count, offset=offset + 4)
+        uniques, _ = decode_strings(buffer, offset + 4 + 4 * row_count, unique_count)
+        return np.array(uniques, dtype=object)[codes] if row_count else np.array([], dtype=object)
+    strings, _ = decode_strings(buffer, offset, row_count)
+    return np.array(strings, dtype=object)
+
+def write_columns(filename, row_count, columns):
+    """Write [(name, type, values)] columns of row_count rows in the binary container format
+
+    Returns the file size in bytes.
+    """
+
+    sections = [pad4(encode_column(values if row_count else [], column_type))
+                for _, column_type, values in columns]
+
+    offset = HEADER.size + DIRECTORY_ENTRY.size * len(columns)
+    directory = b''
+    for (name, column_type, _), section in zip(columns, sections):
+        directory += DIRECTORY_ENTRY.pack(name.encode('ascii'), column_type, offset, len(section))
+        offset += len(section)
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, row_count, len(columns)))
+        f.write(directory)
+        for section in sections:
+            f.write(section)
+
+    return offset
+
+class ColumnFile:
+    """Memory-mapped binary container file whose columns are decoded on access"""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.row_count, column_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a customer map binary file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported customer map binary version {version}")
+
+        self.directory = {}
+        for i in range(column_count):
+            raw_name, column_type, offset, length = DIRECTORY_ENTRY.unpack_from(
+                self.buffer, HEADER.size + i * DIRECTORY_ENTRY.size)
+            self.directory[raw_name.rstrip(b'\0').decode('ascii')] = (column_type, offset, length)
+
+    def column(self, name):
+        """Decode a whole column (numeric columns are views of the mapped file)"""
+        column_type, offset, length = self.directory[name]
+        return decode_column(self.buffer, offset, length, column_type, self.row_count)
+
+    def strings(self, name, rows):
+        """Decode only the given rows of a STRING column"""
+        column_type, offset, _ = self.directory[name]
+        if column_type != STRING:
+            raise ValueError(f"Column {name} is not a STRING column")
+        offsets = np.frombuffer(self.buffer, dtype='<u4', count=self.row_count + 1, offset=offset)
+        data_start = offset + 4 * (self.row_count + 1)
+        return [self.buffer[data_start + int(offsets[row]):data_start + int(offsets[row + 1])].decode('utf-8')
+                for row in rows]
+
+def read_columns(filename):
+    """Read a binary container file into {name: numpy array}"""
+    columns = ColumnFile(filename)
+    return {name: columns.column(name) for name in columns.directory}
+
+def write_map_binary(customers, filename='customers_for_map.bin'):
+    """Write customer records (a list of dicts or a DataFrame) in the columnar binary format"""
+    import pandas as pd
+
+    df = customers if isinstance(customers, pd.DataFrame) else pd.DataFrame(customers)
+    row_count = len(df)
+
+    size = write_columns(filename, row_count,
+                         [(name, column_type, df[name] if row_count else []) for name, column_type in COLUMN_TYPES])
+
+    print(f"Binary map data saved to {filename} ({size} bytes)")
+    return size
+
+def read_map_binary(filename='customers_for_map.bin'):
+    """Read a columnar binary map file back into a DataFrame (including the derived full_address)"""
+    import pandas as pd
+
+    df = pd.DataFrame(read_columns(filename))
+
+    # Rebuild full_address the same way create_full_address does
+    parts = df[['street', 'postal_code', 'city', 'country']].apply(lambda column: column.str.strip())
+    df['full_address'] = [', '.join(part for part in row if part) for row in parts.itertuples(index=False)]
+
+    return df
@@ -0,0 +1,211 @@
+"""
+Precomputed hierarchical marker clusters for zoom levels 0-18
+
+Customers are aggregated on a Web Mercator grid whose cells are
+cell_size pixels wide at each zoom level (64 px by default, i.e. 4x4 cells
+per 256 px tile). Cells at zoom z are split into exactly four cells at
+zoom z + 1, so the clusters form a pyramid: every cluster has one parent
+and its children are a contiguous range of the next level.
+
+The points are sorted once by the Morton (Z-order) code of their cell at
+the finest level. That order is also the cell order at every coarser
+level, so each level is built by reducing the one below it, and the whole
+pyramid costs one O(n log n) sort plus O(n) per level.
+
+Output, in clusters/ next to customers_for_map.json, uses the columnar
+container of map_binary.py (readable with read_columns in Python and
+readCustomerBinary in the browser):
+
+    clusters/index.json     zoom range, cell size and cluster count per zoom
+    clusters/{z}.bin        one row per cluster at zoom z
+    clusters/customers.bin  customer ids (column 'id') in cluster order
+
+Columns of a level file:
+
+    count, active        number of customers and how many of them are active
+    lat, lng             centroid of the customers
+    min_lat ... max_lng  bounding box of the customers
+    parent               row of the enclosing cluster at zoom z - 1 (-1 at min_zoom)
+    child_start/end      row range of the children at zoom z + 1 (-1 at max_zoom)
+    point_start          first row of the cluster's customers in customers.bin;
+                         they are rows point_start:point_start + count at every zoom
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from map_binary import write_columns, FLOAT32, INT32
+from map_tiles import mercator_xy
+
+DEFAULT_CLUSTERS_DIR = 'clusters'
+DEFAULT_MIN_ZOOM = 0
+DEFAULT_MAX_ZOOM = 18
+DEFAULT_CELL_SIZE = 64
+
+TILE_SIZE = 256
+
+def spread_bits(values):
+    """Insert a zero bit between each of the low 32 bits of uint64 values"""
+    values = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+def morton_codes(lat, lng, level):
+    """Z-order code of the grid cell of each point on a 2**level x 2**level grid"""
+    mx, my = mercator_xy(lat, lng)
+    n = 1 << level
+    x = np.clip(np.floor(mx * n), 0, n - 1).astype(np.uint64)
+    y = np.clip(np.floor(my * n), 0, n - 1).astype(np.uint64)
+    return spread_bits(x) | (spread_bits(y) << np.uint64(1))
+
+def group_starts(keys):
+    """Start offsets of the runs of equal values in a sorted array"""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+
+def reduce_level(level, starts):
+    """Aggregate the clusters of one level over the groups starting at starts"""
+    return {
+        'count': np.add.reduceat(level['count'], starts),
+        'active': np.add.reduceat(level['active'], starts),
+        'lat_sum': np.add.reduceat(level['lat_sum'], starts),
+        'lng_sum': np.add.reduceat(level['lng_sum'], starts),
+        'min_lat': np.minimum.reduceat(level['min_lat'], starts),
+        'min_lng': np.minimum.reduceat(level['min_lng'], starts),
+        'max_lat': np.maximum.reduceat(level['max_lat'], starts),
+        'max_lng': np.maximum.reduceat(level['max_lng'], starts)
+    }
+
+def build_cluster_pyramid(lat, lng, is_active, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                          cell_size=DEFAULT_CELL_SIZE):
+    """Build the cluster levels for every zoom in [min_zoom, max_zoom]
+
+    Returns ({zoom: level}, order) where each level is a dict of numpy
+    arrays (count, active, lat_sum, lng_sum, min/max lat/lng, key, parent,
+    child_start/child_end) and order sorts the input points into max_zoom cluster order.
+    """
+
+    cells_per_tile = TILE_SIZE // cell_size
+    if cell_size <= 0 or TILE_SIZE % cell_size or cells_per_tile & (cells_per_tile - 1):
+        raise ValueError(f"cell_size must be a power of two dividing {TILE_SIZE}, got {cell_size}")
+    if not 0 <= min_zoom <= max_zoom:
+        raise ValueError(f"Invalid zoom range {min_zoom}-{max_zoom}")
+
+    cell_bits = cells_per_tile.bit_length() - 1
+    if max_zoom + cell_bits > 31:
+        raise ValueError(f"max_zoom {max_zoom} is too deep for {cell_size} px cells")
+
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    codes = morton_codes(lat, lng, max_zoom + cell_bits)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+
+    points = {
+        'count': np.ones(len(order), dtype=np.int64),
+        'active': np.asarray(is_active, dtype=np.int64)[order],
+        'lat_sum': lat[order],
+        'lng_sum': lng[order],
+        'min_lat': lat[order],
+        'min_lng': lng[order],
+        'max_lat': lat[order],
+        'max_lng': lng[order]
+    }
+
+    starts = group_starts(codes)
+    levels = {max_zoom: reduce_level(points, starts)}
+    levels[max_zoom]['key'] = codes[starts]
+
+    for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+        child = levels[zoom + 1]
+        parent_keys = child['key'] >> np.uint64(2)
+        starts = group_starts(parent_keys)
+
+        level = reduce_level(child, starts)
+        level['key'] = parent_keys[starts]
+        levels[zoom] = level
+
+        # Children are contiguous: cluster i owns child ids starts[i]:starts[i + 1]
+        level['child_start'] = starts
+        level['child_end'] = len(parent_keys)
+        child['parent'] = np.cumsum(np.r_[True, parent_keys[1:] != parent_keys[:-1]]) - 1 \
+            if len(parent_keys) else np.zeros(0, dtype=np.int64)
+
+    return levels, order
+
+def level_columns(level, zoom, min_zoom, max_zoom):
+    """Columns of one level file as [(name, type, values)]"""
+
+    count = level['count']
+    n = len(count)
+    missing = np.full(n, -1, dtype=np.int64)
+
+    if zoom < max_zoom:
+        child_start = level['child_start']
+        child_end = np.append(child_start[1:], level['child_end'])
+    else:
+        child_start = child_end = missing
+
+    return [
+        ('count', INT32, count),
+        ('active', INT32, level['active']),
+        ('lat', FLOAT32, level['lat_sum'] / np.maximum(count, 1)),
+        ('lng', FLOAT32, level['lng_sum'] / np.maximum(count, 1)),
+        ('min_lat', FLOAT32, level['min_lat']),
+        ('min_lng', FLOAT32, level['min_lng']),
+        ('max_lat', FLOAT32, level['max_lat']),
+        ('max_lng', FLOAT32, level['max_lng']),
+        ('parent', INT32, level['parent'] if zoom > min_zoom else missing),
+        ('child_start', INT32, child_start),
+        ('child_end', INT32, child_end),
+        ('point_start', INT32, np.cumsum(count) - count)
+    ]
+
+def write_clusters(customers, out_dir=DEFAULT_CLUSTERS_DIR, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                   cell_size=DEFAULT_CELL_SIZE):
+    """Write the cluster pyramid of customer records (list of dicts or DataFrame) to out_dir
+
+    Returns the index dict.
+    """
+
+    df = customers if isinstance(customers, pd.DataFrame) else pd.DataFrame(customers)
+    if len(df) == 0:
+        df = pd.DataFrame({'id': [], 'latitude': [], 'longitude': [], 'is_active': []})
+
+    levels, order = build_cluster_pyramid(df['latitude'].to_numpy(dtype=np.float64),
+                                          df['longitude'].to_numpy(dtype=np.float64),
+                                          df['is_active'].to_numpy(dtype=bool),
+                                          min_zoom, max_zoom, cell_size)
+
+    # Replace clusters from earlier runs
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    write_columns(os.path.join(out_dir, 'customers.bin'), len(order), [('id', INT32, df['id'].to_numpy()[order])])
+
+    index = {
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'cell_size': cell_size,
+        'total_customers': len(df),
+        'clusters': {}
+    }
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        columns = level_columns(levels[zoom], zoom, min_zoom, max_zoom)
+        write_columns(os.path.join(out_dir, f'{zoom}.bin'), len(levels[zoom]['count']), columns)
+        index['clusters'][str(zoom)] = len(levels[zoom]['count'])
+
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+
+    print(f"Cluster pyramid written to {out_dir} "
+          f"({index['clusters'][str(min_zoom)]} clusters at zoom {min_zoom}, "
+          f"{index['clusters'][str(max_zoom)]} at zoom {max_zoom})")
+    return index
@@ -0,0 +1,277 @@
+"""
+Versioned snapshots and deltas of the map data
+
+The map data is rewritten on every run, so a browser that already holds
+yesterday's customers downloads all of them again although only a few
+changed. publish_map_data keeps publish/ up to date instead:
+
+    publish/manifest.json
+        {"version": N, "snapshot": "customers.v<N>.json", "checksum": ...,
+         "total_customers": ..., "generated_at": ...,
+         "deltas": [{"from": K, "to": K + 1, "file": ..., "checksum": ..., "size": ...}, ...]}
+    publish/customers.v<N>.json
+        copy of the map data of the latest version ({"customers": [...], "metadata": {...}})
+    publish/customers.v<K>-v<K+1>.delta.json
+        patch turning the customers of version K into those of version K + 1
+
+A new version is published only when the customers changed. The manifest
+lists the unbroken chain of up to keep deltas leading to version N; a
+client holding version K applies the deltas from K up to N in order and
+any other client downloads the snapshot.
+
+Customers are matched by customer_number. Customers sharing a number (or
+without one, 0) are told apart by their order: the second customer with
+number 20847 has the key '20847#2'. A delta holds
+
+    removed     keys of the customers that are gone
+    updated     [[key, {field: new value}], ...] for changed fields other than the coordinates
+    moved       [[key, latitude, longitude], ...]
+    added       [[position, record], ...] by ascending position in the new version
+    checksum    checksum of the customers of the new version
+
+Keys refer to the old version. A delta is applied by dropping the removed
+customers, updating and moving the others, inserting the added ones at
+their positions and renumbering the ids from 1. Customers are matched in
+order: a customer that moved relative to the others (or whose '#n' key
+shifted because an earlier duplicate was removed) is removed and added
+again.
+
+The checksum is a SHA-256 over the customers column by column, in sorted
+field order: the field name followed by a NUL byte, then the values,
+strings as UTF-8 each followed by a NUL byte, numbers and booleans as
+little-endian float64. It does not depend on how JSON numbers are
+formatted, so the client (src/utils/customerDeltas.js) computes the same
+value after patching. Every delta is applied here and checked against the
+checksum before it is published.
+"""
+
+import bisect
+import hashlib
+import json
+import operator
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_PUBLISH_DIR = 'publish'
+DEFAULT_KEEP_VERSIONS = 10
+MANIFEST_FILE = 'manifest.json'
+
+COORDINATE_FIELDS = ('latitude', 'longitude')
+
+# Renumbered from 1 when a delta is applied, never part of a delta
+POSITION_FIELD = 'id'
+
+def customer_keys(customers):
+    """Delta key of every customer: its customer_number, '#<occurrence>' from the second on"""
+    seen = defaultdict(int)
+    keys = []
+    for record in customers:
+        number = record['customer_number']
+        seen[number] += 1
+        keys.append(str(number) if seen[number] == 1 else f'{number}#{seen[number]}')
+    return keys
+
+def customers_checksum(customers):
+    """Column-wise SHA-256 hex digest of customer records (see the module docstring)"""
+    digest = hashlib.sha256()
+    if customers:
+        for field in sorted(customers[0]):
+            digest.update(field.encode('utf-8') + b'\0')
+            values = [record[field] for record in customers]
+            if isinstance(values[0], str):
+                digest.update(''.join(value + '\0' for value in values).encode('utf-8'))
+            else:
+                digest.update(np.asarray(values, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+def snapshot_name(version):
+    return f'customers.v{version}.json'
+
+def delta_name(from_version, to_version):
+    return f'customers.v{from_version}-v{to_version}.delta.json'
+
+def in_order_matches(old_positions):
+    """Indices of a longest increasing subsequence of old_positions (None entries are skipped)"""
+    tails = []        # old position ending the best subsequence of each length
+    tail_indices = []
+    parents = [None] * len(old_positions)
+    for index, position in enumerate(old_positions):
+        if position is None:
+            continue
+        length = bisect.bisect_left(tails, position)
+        if length == len(tails):
+            tails.append(position)
+            tail_indices.append(index)
+        else:
+            tails[length] = position
+            tail_indices[length] = index
+        parents[index] = tail_indices[length - 1] if length else None
+
+    matches = []
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        matches.append(index)
+        index = parents[index]
+    return set(matches)
+
+def build_delta(previous, current, from_version, to_version, checksum=None):
+    """Delta turning previous into current records, or None when the fields differ
+
+    Customers whose key is kept but that moved relative to the others (e.g.
+    when the export was reordered) are removed and added again. checksum
+    is that of current, when already known.
+    """
+
+    old_keys = customer_keys(previous)
+    new_keys = customer_keys(current)
+    key_positions = dict(zip(old_keys, range(len(old_keys))))
+    old_positions = [key_positions.get(key) for key in new_keys]
+    matches = in_order_matches(old_positions)
+    matched_keys = {new_keys[index] for index in matches}
+
+    delta = {
+        'from': from_version,
+        'to': to_version,
+        'removed': [key for key in old_keys if key not in matched_keys],
+        'updated': [],
+        'moved': [],
+        'added': [],
+        'checksum': checksum or customers_checksum(current)
+    }
+
+    fields = [field for field in (current[0] if current else {}) if field != POSITION_FIELD]
+    compared = operator.itemgetter(*fields) if fields else None
+
+    for position, (key, record) in enumerate(zip(new_keys, current)):
+        if position not in matches:
+            delta['added'].append([position, record])
+            continue
+
+        old = previous[old_positions[position]]
+        if old.keys() != record.keys():
+            return None
+        if compared(old) == compared(record):
+            continue
+
+        changes = {field: value for field, value in record.items()
+                   if field != POSITION_FIELD and field not in COORDINATE_FIELDS and old[field] != value}
+        if changes:
+            delta['updated'].append([key, changes])
+        if any(old[field] != record[field] for field in COORDINATE_FIELDS):
+            delta['moved'].append([key, record['latitude'], record['longitude']])
+
+    return delta
+
+def apply_delta(previous, delta):
+    """Records of the delta's new version, given those of its old version"""
+    removed = set(delta['removed'])
+    updated = dict((key, changes) for key, changes in delta['updated'])
+    moved = {key: (lat, lng) for key, lat, lng in delta['moved']}
+    added = iter(delta['added'])
+    next_added = next(added, None)
+
+    customers = []
+    for key, record in zip(customer_keys(previous), previous):
+        if key in removed:
+            continue
+        while next_added is not None and next_added[0] == len(customers):
+            customers.append(dict(next_added[1]))
+            next_added = next(added, None)
+        record = dict(record)
+        record.update(updated.get(key, {}))
+        if key in moved:
+            record['latitude'], record['longitude'] = moved[key]
+        customers.append(record)
+
+    while next_added is not None:
+        customers.append(dict(next_added[1]))
+        next_added = next(added, None)
+
+    for position, record in enumerate(customers):
+        record[POSITION_FIELD] = position + 1
+    return customers
+
+def write_json(obj, filename):
+    """Write compact JSON atomically, so clients never read a partial file"""
+    temp_file = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_file, filename)
+
+def load_manifest(directory=DEFAULT_PUBLISH_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def publish_map_data(customers, map_file='customers_for_map.json', directory=DEFAULT_PUBLISH_DIR,
+                     keep=DEFAULT_KEEP_VERSIONS):
+    """Publish the customers written to map_file as a new version with a delta from the previous one
+
+    Returns the manifest.
+    """
+
+    checksum = customers_checksum(customers)
+    manifest = load_manifest(directory)
+    if manifest is not None and manifest['checksum'] == checksum:
+        print(f"Map data unchanged, still at version {manifest['version']}")
+        return manifest
+
+    os.makedirs(directory, exist_ok=True)
+    version = manifest['version'] + 1 if manifest else 1
+    deltas = manifest['deltas'] if manifest else []
+
+    if manifest is not None:
+        with open(os.path.join(directory, manifest['snapshot']), 'r', encoding='utf-8') as f:
+            previous = json.load(f)['customers']
+        delta = build_delta(previous, customers, manifest['version'], version, checksum)
+        if delta is not None and customers_checksum(apply_delta(previous, delta)) != checksum:
+            delta = None
+
+        if delta is None:
+            print(f"No delta from version {manifest['version']}, clients will download the snapshot")
+        else:
+            filename = delta_name(manifest['version'], version)
+            write_json(delta, os.path.join(directory, filename))
+            deltas.append({'from': manifest['version'], 'to': version, 'file': filename, 'checksum': checksum,
+                           'size': os.path.getsize(os.path.join(directory, filename))})
+            print(f"Delta {filename}: {len(delta['added'])} added, {len(delta['removed'])} removed, "
+                  f"{len(delta['updated'])} updated, {len(delta['moved'])} moved")
+
+    snapshot = snapshot_name(version)
+    temp_file = os.path.join(directory, f'{snapshot}.{os.getpid()}.tmp')
+    shutil.copyfile(map_file, temp_file)
+    os.replace(temp_file, os.path.join(directory, snapshot))
+
+    # Only the unbroken chain of the last keep deltas leading to this version is useful
+    chain = []
+    for entry in reversed(deltas):
+        if len(chain) == keep or entry['to'] != (chain[0]['from'] if chain else version):
+            break
+        chain.insert(0, entry)
+    expired = [entry['file'] for entry in deltas if entry not in chain]
+
+    new_manifest = {
+        'version': version,
+        'snapshot': snapshot,
+        'checksum': checksum,
+        'total_customers': len(customers),
+        'generated_at': datetime.now().isoformat(),
+        'deltas': chain
+    }
+    write_json(new_manifest, os.path.join(directory, MANIFEST_FILE))
+
+    # Old files go only after the manifest stopped pointing at them
+    for name in expired + ([manifest['snapshot']] if manifest else []):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"Published map data version {version} to {directory}/ "
+          f"({len(new_manifest['deltas'])} deltas kept)")
+    return new_manifest
@@ -0,0 +1,110 @@
+"""
+Quadkey/XYZ tiling of the map data for viewport-only loading
+
+Customers are partitioned into Web Mercator tiles for every zoom level in a
+configurable range. Each non-empty tile is written to tiles/{z}/{x}/{y}.json
+(compact JSON, {"customers": [...]}) and tiles/manifest.json lists every tile
+with its quadkey, customer count and bounding box of the customers in it, so
+a client can fetch only the tiles that intersect its viewport.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TILES_DIR = 'tiles'
+DEFAULT_MIN_ZOOM = 5
+DEFAULT_MAX_ZOOM = 10
+
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+
+def mercator_xy(lat, lng):
+    """Vectorized normalized Web Mercator coordinates in [0, 1) (x east, y south)"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lng = np.asarray(lng, dtype=np.float64)
+    lat_rad = np.radians(lat)
+    x = (lng + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    return x, y
+
+def tile_xy(lat, lng, zoom):
+    """Vectorized Web Mercator tile coordinates (x, y) of points at a zoom level"""
+    mx, my = mercator_xy(lat, lng)
+    n = 1 << zoom
+    x = np.floor(mx * n).astype(np.int64)
+    y = np.floor(my * n).astype(np.int64)
+    return np.clip(x, 0, n - 1), np.clip(y, 0, n - 1)
+
+def quadkey(x, y, zoom):
+    """Bing Maps quadkey of a single tile"""
+    digits = []
+    for level in range(zoom, 0, -1):
+        mask = 1 << (level - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+def tile_groups(lat, lng, zoom):
+    """Group point indices by tile
+
+    Returns (tile_ids, starts, order) where order sorts the points by tile,
+    and the points of tile_ids[i] are order[starts[i]:starts[i + 1]].
+    Tile ids are x * 2**zoom + y.
+    """
+    x, y = tile_xy(lat, lng, zoom)
+    tile_ids = x * (1 << zoom) + y
+    order = np.argsort(tile_ids, kind='stable')
+    unique_ids, starts = np.unique(tile_ids[order], return_index=True)
+    return unique_ids, np.append(starts, len(order)), order
+
+def write_tiles(customers, out_dir=DEFAULT_TILES_DIR, min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM):
+    """Write one JSON file per non-empty tile for every zoom in [min_zoom, max_zoom] plus a manifest
+
+    customers may be a list of records or a DataFrame with latitude/longitude columns.
+    """
+
+    df = customers if isinstance(customers, pd.DataFrame) else pd.DataFrame(customers)
+    records = df.to_dict('records')
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    lng = df['longitude'].to_numpy(dtype=np.float64)
+
+    # Replace tiles from earlier runs
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    manifest = {'min_zoom': min_zoom, 'max_zoom': max_zoom, 'total_customers': len(records), 'tiles': {}}
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        tile_ids, starts, order = tile_groups(lat, lng, zoom)
+        tiles = []
+
+        for i, tile_id in enumerate(tile_ids.tolist()):
+            x, y = divmod(tile_id, 1 << zoom)
+            members = order[starts[i]:starts[i + 1]]
+
+            tile_dir = os.path.join(out_dir, str(zoom), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f'{y}.json'), 'w', encoding='utf-8') as f:
+                json.dump({'customers': [records[j] for j in members]}, f, ensure_ascii=False, separators=(',', ':'))
+
+            tiles.append({
+                'x': x,
+                'y': y,
+                'quadkey': quadkey(x, y, zoom),
+                'count': len(members),
+                'bounds': [float(lat[members].min()), float(lng[members].min()),
+                           float(lat[members].max()), float(lng[members].max())]
+            })
+
+        manifest['tiles'][str(zoom)] = tiles
+        print(f"Zoom {zoom}: {len(tiles)} tiles")
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+
+    print(f"Tiles written to {out_dir}")
+    return manifest
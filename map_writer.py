@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class MapDataOutput:
+    """Write text to a file and, optionally, to .gz/.br siblings and a content hash in one pass"""
+
+    def __init__(self, filename, precompress=False):
+        self.filename = filename
+        self.precompress = precompress
+        self.file = open(filename, 'wb')
+        self.hasher = hashlib.sha256()
+        self.gzip_file = None
+        self.brotli_file = None
+        self.brotli_compressor = None
+
+        if precompress:
+            self.gzip_file = gzip.open(filename + '.gz', 'wb', compresslevel=9)
+            if brotli is not None:
+                self.brotli_file = open(filename + '.br', 'wb')
+                self.brotli_compressor = brotli.Compressor(quality=11)
+            else:
+                print("brotli is not installed, skipping .br output")
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.hasher.update(data)
+        if self.gzip_file is not None:
+            self.gzip_file.write(data)
+        if self.brotli_compressor is not None:
+            self.brotli_file.write(self.brotli_compressor.process(data))
+
+    def close(self):
+        """Close all outputs and return the list of files written"""
+        self.file.close()
+        written = [self.filename]
+        if self.gzip_file is not None:
+            self.gzip_file.close()
+            written.append(self.filename + '.gz')
+        if self.brotli_compressor is not None:
+            self.brotli_file.write(self.brotli_compressor.finish())
+            self.brotli_file.close()
+            written.append(self.filename + '.br')
+        return written
+
+    def content_hash(self, length=12):
+        return self.hasher.hexdigest()[:length]
+
+def hashed_name(filename, content_hash):
+    """customers_for_map.json -> customers_for_map.<hash>.json"""
+    base, ext = os.path.splitext(filename)
+    return f'{base}.{content_hash}{ext}'
+
+def manifest_name(filename):
+    """customers_for_map.json -> customers_for_map.manifest.json"""
+    base, ext = os.path.splitext(filename)
+    return f'{base}.manifest{ext}'
+
+def publish_hashed_copies(output, metadata):
+    """Copy the written files to content-hashed names and write a manifest pointing at them
+
+    Hashed copies listed in the previous manifest are removed, so the output
+    directory only holds the current version.
+    """
+
+    filename = output.filename
+    directory = os.path.dirname(filename)
+    content_hash = output.content_hash()
+
+    try:
+        with open(manifest_name(filename), 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previous = None
+
+    if previous and previous.get('hash') != content_hash:
+        for name in [previous.get('file')] + list(previous.get('encodings', {}).values()):
+            if name and os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+
+    manifest = {
+        'file': os.path.basename(hashed_name(filename, content_hash)),
+        'hash': content_hash,
+        'encodings': {},
+        'total_customers': metadata['total_customers'],
+        'generated_at': metadata['generated_at']
+    }
+
+    for written in output.close():
+        suffix = written[len(filename):]
+        target = hashed_name(filename, content_hash) + suffix
+        with open(written, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(src.read())
+        if suffix:
+            manifest['encodings']['gzip' if suffix == '.gz' else 'br'] = os.path.basename(target)
+
+    with open(manifest_name(filename), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Published {manifest['file']} (+ {', '.join(manifest['encodings']) or 'no'} precompressed copies)")
+    return manifest
+
+def write_map_data_stream(records, filename='customers_for_map.json', note='', compact=True, precompress=False):
+    """Write customer records to the map JSON file as they arrive
+
+    Customers are written one at a time and the metadata is counted in the
+    same pass, then written after the customers list. compact drops all
+    whitespace; otherwise the layout matches json.dump(..., indent=2).
+    precompress also writes .gz/.br siblings, content-hashed copies and a
+    manifest naming the current version.
+
+    Returns the metadata dict.
+    """
+
+    output = MapDataOutput(filename, precompress)
+    total = 0
+    active = 0
+
+    if compact:
+        def dumps(obj, depth):
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+        newline, indent, space = '', '', ''
+    else:
+        def dumps(obj, depth):
+            return json.dumps(obj, ensure_ascii=False, indent=2).replace('\n', '\n' + '  ' * depth)
+        newline, indent, space = '\n', '  ', ' '
+
+    output.write('{' + newline + indent + '"customers":' + space + '[')
+    for record in records:
+        output.write((',' if total else '') + newline + indent * 2 + dumps(record, 2))
+        total += 1
+        active += bool(record['is_active'])
+
+    metadata = {
+        'total_customers': total,
+        'active_customers': active,
+        'inactive_customers': total - active,
+        'generated_at': datetime.now().isoformat(),
+        'note': note
+    }
+
+    if total:
+        output.write(newline + indent)
+    output.write('],' + newline + indent + '"metadata":' + space + dumps(metadata, 1) + newline + '}')
+
+    if precompress:
+        publish_hashed_copies(output, metadata)
+    else:
+        output.close()
+
+    print(f"Map data saved to {filename}")
+    return metadata
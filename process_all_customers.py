@@ -3,22 +3,61 @@ import numpy as np
 import json
 import os
 from datetime import datetime
+from improved_data_processor import iter_customer_export, SOURCE_CSV, TEXT_EXPORT_DTYPES
+from instrumentation import RunReport, instrumented
+from clean_cache import cached_table
 
+# Bump whenever the cleaning rules below change so the cached cleaned table is rebuilt
+CLEANING_VERSION = 1
+
+@instrumented
 def clean_and_standardize_data():
     """Clean and standardize all customer data from the CSV files"""
     
     print("Reading and processing customer data...")
     
-    # Read the main CSV file
-    df = pd.read_csv('updated_Excel_with_Customer_details - updated_Excel_with_Customer_details.csv.csv')
+    # The cleaned table is reused from the clean cache while the export is unchanged
+    df_with_addresses = cached_table(SOURCE_CSV, 'process_all_customers', CLEANING_VERSION, clean_export)
+    
+    print(f"Records with addresses: {len(df_with_addresses)}")
+    print(f"Active customers: {df_with_addresses['is_active'].sum()}")
+    print(f"Inactive customers: {len(df_with_addresses) - df_with_addresses['is_active'].sum()}")
+    
+    # Show data quality statistics
+    print(f"\nData quality:")
+    print(f"Records with street: {(df_with_addresses['street'].str.len() > 0).sum()}")
+    print(f"Records with postal code: {(df_with_addresses['postal_code'].str.len() > 0).sum()}")
+    print(f"Records with city: {(df_with_addresses['city'].str.len() > 0).sum()}")
+    print(f"Records with country: {(df_with_addresses['country'].str.len() > 0).sum()}")
+    
+    return df_with_addresses
+
+def clean_export():
+    """Read and clean the export, numbering the records that have an address"""
+    
+    # Read the main CSV file in chunks and clean each chunk on its own,
+    # so only one raw chunk is held in memory at a time
+    total_records = 0
+    cleaned_chunks = []
+    for chunk in iter_customer_export(dtype=TEXT_EXPORT_DTYPES):
+        total_records += len(chunk)
+        cleaned_chunks.append(clean_chunk(chunk))
+    df_with_addresses = pd.concat(cleaned_chunks)
+    
+    print(f"Total records: {total_records}")
     
-    # Clean column names
-    df.columns = ['customer_number', 'customer_name', 'is_active', 'street', 'postal_code', 'city', 'country']
+    # Create customer identifier (name or number if name is missing)
+    df_with_addresses['customer_identifier'] = df_with_addresses.apply(lambda row: 
+        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != '' 
+        else f"Customer {row['customer_number']}", axis=1)
     
-    print(f"Total records: {len(df)}")
+    # Add a unique ID for each record
+    df_with_addresses['id'] = range(1, len(df_with_addresses) + 1)
     
-    # Clean the data
-    print("Cleaning data...")
+    return df_with_addresses
+
+def clean_chunk(df):
+    """Clean one chunk of the raw export and keep only rows with address information"""
     
     # Standardize active status
     df['is_active'] = df['is_active'].str.lower().map({'ja': True, 'nein': False, 'yes': True, 'no': False})
@@ -44,28 +83,7 @@ def clean_and_standardize_data():
     df['full_address'] = df.apply(lambda row: create_full_address(row), axis=1)
     
     # Remove rows with no address information
-    df_with_addresses = df[df['full_address'] != ''].copy()
-    
-    # Create customer identifier (name or number if name is missing)
-    df_with_addresses['customer_identifier'] = df_with_addresses.apply(lambda row: 
-        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != '' 
-        else f"Customer {row['customer_number']}", axis=1)
-    
-    # Add a unique ID for each record
-    df_with_addresses['id'] = range(1, len(df_with_addresses) + 1)
-    
-    print(f"Records with addresses: {len(df_with_addresses)}")
-    print(f"Active customers: {df_with_addresses['is_active'].sum()}")
-    print(f"Inactive customers: {len(df_with_addresses) - df_with_addresses['is_active'].sum()}")
-    
-    # Show data quality statistics
-    print(f"\nData quality:")
-    print(f"Records with street: {df_with_addresses['street'].str.len() > 0}.sum()")
-    print(f"Records with postal code: {df_with_addresses['postal_code'].str.len() > 0}.sum()")
-    print(f"Records with city: {df_with_addresses['city'].str.len() > 0}.sum()")
-    print(f"Records with country: {df_with_addresses['country'].str.len() > 0}.sum()")
-    
-    return df_with_addresses
+    return df[df['full_address'] != ''].copy()
 
 def create_full_address(row):
     """Create a full address string for geocoding"""
@@ -85,6 +103,7 @@ def create_full_address(row):
     
     return ', '.join(parts) if parts else ''
 
+@instrumented
 def create_sample_geocoded_data(df, sample_size=100):
     """Create sample geocoded data for demonstration purposes"""
     
@@ -136,6 +155,7 @@ def create_sample_geocoded_data(df, sample_size=100):
     
     return sample_data
 
+@instrumented
 def save_data_for_map(data, filename='customers_for_map.json'):
     """Save data in the format needed for the map"""
     
@@ -156,6 +176,7 @@ def save_data_for_map(data, filename='customers_for_map.json'):
     print(f"Map data saved to {filename}")
     return map_data
 
+@instrumented(rows=False)
 def create_csv_summary(df, filename='customer_summary.csv'):
     """Create a summary CSV file"""
     
@@ -170,35 +191,37 @@ def create_csv_summary(df, filename='customer_summary.csv'):
 
 def main():
     """Main function to process all customer data"""
-    print("=== aboutwater Customer Data Processing ===")
-    print()
-    
-    # Clean and standardize the data
-    df = clean_and_standardize_data()
-    
-    # Create sample geocoded data
-    sample_data = create_sample_geocoded_data(df, sample_size=200)
-    
-    # Save data for the map
-    map_data = save_data_for_map(sample_data)
-    
-    # Create summary
-    summary = create_csv_summary(df)
-    
-    print("\n=== Processing Complete ===")
-    print(f"Total customers processed: {len(df)}")
-    print(f"Sample data created: {len(sample_data)}")
-    print(f"Active customers in sample: {map_data['metadata']['active_customers']}")
-    print(f"Inactive customers in sample: {map_data['metadata']['inactive_customers']}")
-    
-    print("\nFiles created:")
-    print("- customers_for_map.json (for the map)")
-    print("- customer_summary.csv (summary statistics)")
-    
-    print("\nNext steps:")
-    print("1. Open the HTML map file to visualize customers")
-    print("2. Use the JSON data for further analysis")
-    print("3. For production use, replace mock coordinates with real geocoding")
+    with RunReport() as report:
+        print("=== aboutwater Customer Data Processing ===")
+        print()
+        
+        # Clean and standardize the data
+        df = clean_and_standardize_data()
+        
+        # Create sample geocoded data
+        sample_data = create_sample_geocoded_data(df, sample_size=200)
+        
+        # Save data for the map
+        map_data = save_data_for_map(sample_data)
+        
+        # Create summary
+        summary = create_csv_summary(df)
+        
+        print("\n=== Processing Complete ===")
+        print(f"Total customers processed: {len(df)}")
+        print(f"Sample data created: {len(sample_data)}")
+        print(f"Active customers in sample: {map_data['metadata']['active_customers']}")
+        print(f"Inactive customers in sample: {map_data['metadata']['inactive_customers']}")
+        
+        print("\nFiles created:")
+        print("- customers_for_map.json (for the map)")
+        print("- customer_summary.csv (summary statistics)")
+        
+        print("\nNext steps:")
+        print("1. Open the HTML map file to visualize customers")
+        print("2. Use the JSON data for further analysis")
+        print("3. For production use, replace mock coordinates with real geocoding")
+    report.save()
 
 if __name__ == "__main__":
     main()
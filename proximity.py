@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch proximity queries: nearest customers and customers within a radius
+
+Customers are indexed in a KD-tree over their unit-sphere coordinates
+(x, y, z). Straight-line (chord) distance on the unit sphere grows with the
+great-circle distance, so a radius in km becomes a chord radius and
+nearest-by-chord is nearest-by-haversine.
+
+The tree is implicit and balanced: at level l, node i holds the points
+order[i * n // 2**l:(i + 1) * n // 2**l], split at the median of its widest
+axis. Each level of the build is one segmented sort, and every node keeps
+the bounding box of its points.
+
+Queries are answered for many query points at once. A radius query walks
+the tree one level at a time with all (query, node) pairs whose box lies
+within reach, then checks the points of the remaining leaves. A k-nearest
+query first takes the smallest node around the query point that holds at
+least k points; its k-th distance bounds the search, which then runs as a
+radius query. Large batches are split across worker processes.
+
+Usage:
+    python proximity.py depot LAT LNG RADIUS_KM [--active]
+    python proximity.py nearest CUSTOMER_ID [--k 5] [--active]
+    python proximity.py benchmark [--customers 1000000] [--queries 2000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from customer_query import QueryIndex, haversine_km, EARTH_RADIUS_KM, DEFAULT_QUERY_INDEX
+
+DEFAULT_LEAF_SIZE = 32
+DEFAULT_BATCH_SIZE = 256
+
+# Below this many query points the process pool costs more than it saves
+MIN_PARALLEL_QUERIES = 20000
+
+def unit_vectors(lat, lng):
+    """(n, 3) unit-sphere coordinates of lat/lng points in degrees"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+def chord_from_km(distance_km):
+    """Unit-sphere chord length of a great-circle distance"""
+    return 2.0 * np.sin(np.minimum(np.asarray(distance_km, dtype=np.float64) / EARTH_RADIUS_KM, math.pi) / 2.0)
+
+def km_from_chord(chord):
+    """Great-circle distance in km of a unit-sphere chord length"""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0))
+
+def expand_ranges(starts, ends):
+    """Concatenation of arange(start, end) for every pair, and the pair of each element"""
+    lengths = ends - starts
+    owners = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) - offsets[owners] + starts[owners], owners
+
+class ProximityIndex:
+    """KD-tree over unit-sphere coordinates of customers, for batch k-nearest and radius queries"""
+
+    def __init__(self, lat, lng, ids=None, leaf_size=DEFAULT_LEAF_SIZE):
+        points = unit_vectors(lat, lng)
+        count = len(points)
+        self.count = count
+        self.depth = max(0, math.ceil(math.log2(max(count, 1) / leaf_size)))
+
+        order = np.arange(count)
+        for level in range(self.depth):
+            bounds = np.arange((1 << level) + 1) * count // (1 << level)
+            segment = np.repeat(np.arange(1 << level), np.diff(bounds))
+            coordinates = points[order]
+            axis = self.widest_axes(coordinates, bounds)
+            # Segments are 4 apart and coordinates within [-1, 1], so one sort orders both
+            order = order[np.argsort(coordinates[np.arange(count), axis[segment]] + 4.0 * segment)]
+
+        self.order = order
+        self.points = points[order]
+        self.ids = (np.arange(count) if ids is None else np.asarray(ids))[order]
+        self.lat = np.asarray(lat, dtype=np.float64)[order]
+        self.lng = np.asarray(lng, dtype=np.float64)[order]
+
+        # Bounding boxes of the leaves, merged pairwise up to the root
+        leaves = np.arange((1 << self.depth) + 1) * count // (1 << self.depth)
+        self.leaf_bounds = leaves
+        non_empty = leaves[:-1] < leaves[1:]
+        low = np.full((1 << self.depth, 3), np.inf)
+        high = np.full((1 << self.depth, 3), -np.inf)
+        if count:
+            low[non_empty] = np.minimum.reduceat(self.points, leaves[:-1][non_empty], axis=0)
+            high[non_empty] = np.maximum.reduceat(self.points, leaves[:-1][non_empty], axis=0)
+        self.low, self.high = [low], [high]
+        for _ in range(self.depth):
+            self.low.insert(0, np.minimum(self.low[0][0::2], self.low[0][1::2]))
+            self.high.insert(0, np.maximum(self.high[0][0::2], self.high[0][1::2]))
+
+    @staticmethod
+    def widest_axes(coordinates, bounds):
+        """Axis of the largest spread of each segment"""
+        starts = bounds[:-1]
+        non_empty = starts < bounds[1:]
+        spread = np.zeros((len(starts), 3))
+        if non_empty.any():
+            spread[non_empty] = (np.maximum.reduceat(coordinates, starts[non_empty], axis=0) -
+                                 np.minimum.reduceat(coordinates, starts[non_empty], axis=0))
+        return np.argmax(spread, axis=1)
+
+    @classmethod
+    def from_query_index(cls, filename=DEFAULT_QUERY_INDEX, active_only=False, leaf_size=DEFAULT_LEAF_SIZE):
+        """Index the customers of the pipeline's query index (customers_query.bin)"""
+        index = QueryIndex(filename)
+        keep = index.active if active_only else np.ones(len(index.ids), dtype=bool)
+        return cls(index.lat[keep].astype(np.float64), index.lng[keep].astype(np.float64), index.ids[keep],
+                   leaf_size=leaf_size)
+
+    def node_points(self, level, nodes):
+        """(start, end) of the points of nodes at a level"""
+        return nodes * self.count // (1 << level), (nodes + 1) * self.count // (1 << level)
+
+    def radius_pairs(self, queries, chords):
+        """(query, point position, chord) of all points within each query's chord radius"""
+
+        pair_query = np.arange(len(queries))
+        pair_node = np.zeros(len(queries), dtype=np.int64)
+        for level in range(self.depth + 1):
+            point = queries[pair_query]
+            gap = (np.maximum(self.low[level][pair_node] - point, 0) +
+                   np.maximum(point - self.high[level][pair_node], 0))
+            near = np.einsum('ij,ij->i', gap, gap) <= chords[pair_query] ** 2
+            pair_query, pair_node = pair_query[near], pair_node[near]
+            if level < self.depth:
+                pair_query = np.repeat(pair_query, 2)
+                pair_node = (pair_node[:, None] * 2 + np.array([0, 1])).ravel()
+
+        starts, ends = self.node_points(self.depth, pair_node)
+        positions, owners = expand_ranges(starts, ends)
+        owners = pair_query[owners]
+        difference = self.points[positions] - queries[owners]
+        distance = np.sqrt(np.einsum('ij,ij->i', difference, difference))
+        inside = distance <= chords[owners]
+
+        owners, positions, distance = owners[inside], positions[inside], distance[inside]
+        order = np.lexsort((self.ids[positions], distance, owners))
+        return owners[order], positions[order], distance[order]
+
+    def knn_bounds(self, queries, k):
+        """Chord distance to the k-th nearest point of the smallest enclosing node holding >= k points"""
+
+        level = self.depth
+        while level > 0 and self.count // (1 << level) < k:
+            level -= 1
+
+        # Walk down to the node containing each query, choosing by box distance
+        nodes = np.zeros(len(queries), dtype=np.int64)
+        for current in range(level):
+            children = (nodes[:, None] * 2 + np.array([0, 1]))
+            gap = (np.maximum(self.low[current + 1][children] - queries[:, None, :], 0) +
+                   np.maximum(queries[:, None, :] - self.high[current + 1][children], 0))
+            nodes = children[np.arange(len(queries)), np.argmin(np.einsum('ijk,ijk->ij', gap, gap), axis=1)]
+
+        starts, ends = self.node_points(level, nodes)
+        positions, owners = expand_ranges(starts, ends)
+        difference = self.points[positions] - queries[owners]
+        distance = np.sqrt(np.einsum('ij,ij->i', difference, difference))
+        distance = distance[np.lexsort((distance, owners))]
+        first = np.searchsorted(owners, np.arange(len(queries)))
+        return distance[first + k - 1]
+
+    def query_batch(self, lat, lng, k=None, radius_km=None):
+        """One batch of a k-nearest (k) or radius (radius_km) query; see knn and within_radius"""
+        queries = unit_vectors(lat, lng)
+        if k is not None:
+            # Rounding slack, so the bounding point itself is never lost
+            chords = self.knn_bounds(queries, k) * (1 + 1e-9) + 1e-12
+        else:
+            chords = np.broadcast_to(chord_from_km(radius_km), (len(queries),)).astype(np.float64)
+        owners, positions, distance = self.radius_pairs(queries, chords)
+        if k is not None:
+            rank = np.arange(len(owners)) - np.searchsorted(owners, owners)
+            keep = rank < k
+            owners, positions, distance = owners[keep], positions[keep], distance[keep]
+        return owners, self.ids[positions], km_from_chord(distance)
+
+    def run_batches(self, lat, lng, workers, batch_size, **query):
+        """Run query_batch over batches of query points, in worker processes for large batches"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        starts = list(range(0, len(lat), batch_size))
+        batches = [(lat[start:start + batch_size], lng[start:start + batch_size]) for start in starts]
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if len(lat) < MIN_PARALLEL_QUERIES:
+            workers = 1
+
+        if workers == 1:
+            results = [self.query_batch(batch_lat, batch_lng, **query) for batch_lat, batch_lng in batches]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=set_worker_index, initargs=(self,)) as executor:
+                results = list(executor.map(worker_query_batch, batches, [query] * len(batches),
+                                            chunksize=max(1, len(batches) // (workers * 4))))
+
+        if not results:
+            return np.zeros(0, dtype=np.int64), self.ids[:0], np.zeros(0)
+        owners = np.concatenate([owners + start for (owners, _, _), start in zip(results, starts)])
+        return owners, np.concatenate([ids for _, ids, _ in results]), np.concatenate([km for _, _, km in results])
+
+    def knn(self, lat, lng, k=5, workers=None, batch_size=DEFAULT_BATCH_SIZE, frame=False):
+        """k nearest customers of each query point
+
+        Returns (ids, distances_km) arrays of shape (queries, k), nearest
+        first (ties by id); rows are padded with -1 / inf when the index
+        holds fewer than k customers. frame=True returns a DataFrame with
+        query, rank, id and distance_km instead.
+        """
+        k_used = min(k, self.count)
+        count = len(np.atleast_1d(lat))
+        ids = np.full((count, k), -1, dtype=np.int64)
+        distances = np.full((count, k), np.inf)
+        if k_used:
+            owners, found, km = self.run_batches(lat, lng, workers, batch_size, k=k_used)
+            rank = np.arange(len(owners)) - np.searchsorted(owners, owners)
+            ids[owners, rank] = found
+            distances[owners, rank] = km
+        if frame:
+            import pandas as pd
+            found = ids >= 0
+            return pd.DataFrame({'query': np.nonzero(found)[0], 'rank': np.nonzero(found)[1] + 1,
+                                 'id': ids[found], 'distance_km': distances[found]})
+        return ids, distances
+
+    def within_radius(self, lat, lng, radius_km, workers=None, batch_size=DEFAULT_BATCH_SIZE, frame=False):
+        """Customers within radius_km of each query point
+
+        Returns (query, ids, distances_km) flat arrays sorted by query, then
+        distance; frame=True returns them as a DataFrame.
+        """
+        owners, ids, km = self.run_batches(lat, lng, workers, batch_size, radius_km=radius_km)
+        if frame:
+            import pandas as pd
+            return pd.DataFrame({'query': owners, 'id': ids, 'distance_km': km})
+        return owners, ids, km
+
+_worker_index = None
+
+def set_worker_index(index):
+    global _worker_index
+    _worker_index = index
+
+def worker_query_batch(batch, query):
+    return _worker_index.query_batch(*batch, **query)
+
+def brute_force_knn(lat, lng, ids, query_lat, query_lng, k):
+    """Reference k-nearest by haversine over all points, one query at a time"""
+    result = np.full((len(query_lat), k), -1, dtype=np.int64)
+    for row, (point_lat, point_lng) in enumerate(zip(query_lat, query_lng)):
+        distance = haversine_km(point_lat, point_lng, lat, lng)
+        nearest = np.lexsort((ids, distance))[:k]
+        result[row, :len(nearest)] = ids[nearest]
+    return result
+
+def benchmark(customers=1000000, queries=2000, k=10, radius_km=10.0, seed=42, workers=None, brute_force_queries=200):
+    """Time index build and batch queries at the given size and check them against brute force"""
+    from improved_data_processor import COUNTRY_COORDS, GERMAN_CITIES
+
+    rng = np.random.default_rng(seed)
+    centres = list(GERMAN_CITIES.values()) + list(COUNTRY_COORDS.values())
+    picks = rng.integers(0, len(centres), size=customers)
+    lat = np.array([centres[i]['lat'] for i in range(len(centres))])[picks]
+    lng = np.array([centres[i]['lng'] for i in range(len(centres))])[picks]
+    spread = np.array([centres[i]['spread'] for i in range(len(centres))])[picks]
+    lat = lat + rng.uniform(-0.5, 0.5, customers) * spread
+    lng = lng + rng.uniform(-0.5, 0.5, customers) * spread
+    ids = np.arange(1, customers + 1)
+    sample = rng.integers(0, customers, size=queries)
+    query_lat = lat[sample] + rng.normal(0, 0.05, queries)
+    query_lng = lng[sample] + rng.normal(0, 0.05, queries)
+
+    start = time.perf_counter()
+    index = ProximityIndex(lat, lng, ids)
+    print(f"Built index over {customers} customers in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    nearest, _ = index.knn(query_lat, query_lng, k=k, workers=workers)
+    knn_seconds = time.perf_counter() - start
+    print(f"{k}-nearest for {queries} queries: {knn_seconds:.2f} s ({knn_seconds / queries * 1000:.2f} ms per query)")
+
+    start = time.perf_counter()
+    owners, _, _ = index.within_radius(query_lat, query_lng, radius_km, workers=workers)
+    radius_seconds = time.perf_counter() - start
+    print(f"{radius_km} km radius for {queries} queries: {radius_seconds:.2f} s, {len(owners)} matches "
+          f"({radius_seconds / queries * 1000:.2f} ms per query)")
+
+    checked = min(brute_force_queries, queries)
+    start = time.perf_counter()
+    reference = brute_force_knn(lat, lng, ids, query_lat[:checked], query_lng[:checked], k)
+    brute_seconds = (time.perf_counter() - start) / checked
+    mismatches = int((reference != nearest[:checked]).any(axis=1).sum())
+    print(f"Brute force: {brute_seconds * 1000:.2f} ms per query, "
+          f"{brute_seconds / (knn_seconds / queries):.0f}x slower; {mismatches} of {checked} queries differ")
+    return mismatches
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Nearest customers and customers within a radius')
+    parser.add_argument('--index', default=DEFAULT_QUERY_INDEX, help='query index file to load customers from')
+    parser.add_argument('--active', action='store_true', help='only consider active customers')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for large batches')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    depot = commands.add_parser('depot', help='customers within a radius of a point')
+    depot.add_argument('lat', type=float)
+    depot.add_argument('lng', type=float)
+    depot.add_argument('radius_km', type=float)
+
+    nearest = commands.add_parser('nearest', help='nearest customers of a customer')
+    nearest.add_argument('customer_id', type=int)
+    nearest.add_argument('--k', type=int, default=5)
+
+    bench = commands.add_parser('benchmark', help='compare with brute force on synthetic customers')
+    bench.add_argument('--customers', type=int, default=1000000)
+    bench.add_argument('--queries', type=int, default=2000)
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == 'benchmark':
+        sys.exit(1 if benchmark(args.customers, args.queries, workers=args.workers) else 0)
+
+    if not os.path.exists(args.index):
+        print(f"{args.index} not found, run improved_data_processor.py --query-index first")
+        sys.exit(1)
+    index = ProximityIndex.from_query_index(args.index, active_only=args.active)
+
+    if args.command == 'depot':
+        _, ids, km = index.within_radius(args.lat, args.lng, args.radius_km)
+        print(f"{len(ids)} customers within {args.radius_km} km")
+        for customer_id, distance in list(zip(ids.tolist(), km.tolist()))[:20]:
+            print(f"  {customer_id:>8}  {distance:.2f} km")
+        return
+
+    position = np.nonzero(index.ids == args.customer_id)[0]
+    if len(position) == 0:
+        source = QueryIndex(args.index)
+        position = np.nonzero(source.ids == args.customer_id)[0]
+        if len(position) == 0:
+            print(f"Customer {args.customer_id} not found")
+            sys.exit(1)
+        lat, lng = float(source.lat[position[0]]), float(source.lng[position[0]])
+    else:
+        lat, lng = index.lat[position[0]], index.lng[position[0]]
+
+    ids, km = index.knn(lat, lng, k=args.k + 1)
+    nearest = [(customer_id, distance) for customer_id, distance in zip(ids[0].tolist(), km[0].tolist())
+               if customer_id not in (args.customer_id, -1)][:args.k]
+    print(f"Nearest {len(nearest)} customers of {args.customer_id}:")
+    for customer_id, distance in nearest:
+        print(f"  {customer_id:>8}  {distance:.2f} km")
+
+if __name__ == "__main__":
+    main()
@@ -43,6 +43,7 @@ function App() {
       <MapContainer 
         customers={filteredCustomers}
         loading={loading}
+        filters={filters}
       />
       
       {loading && <LoadingSpinner />}
@@ -1,7 +1,14 @@
-import React, { useEffect, useRef } from 'react';
-import { MapContainer, TileLayer, Marker, Popup, useMap } from 'react-leaflet';
+import React, { useEffect, useMemo, useRef, useState } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import L from 'leaflet';
 import 'leaflet/dist/leaflet.css';
+import { loadClusterIndex, loadClusterLevel, clusterMarkers } from '../utils/customerClusters';
+
+// Up to this zoom the precomputed cluster pyramid is drawn instead of one
+// marker per customer (when it is published and only the status filter is set)
+const CLUSTER_MAX_ZOOM = 12;
+
+const DEFAULT_FILTERS = { status: 'all', country: 'all', search: '' };
 
 // Fix for default markers in React Leaflet
 delete L.Icon.Default.prototype._getIconUrl;
@@ -77,8 +84,94 @@ const createCustomIcon = (color) => {
   });
 };
 
-const LeafletMap = ({ customers, mapState, loading }) => {
+// Cluster marker showing the customer count, ringed by the active share
+const createClusterIcon = (cluster) => {
+  const total = cluster.active + cluster.inactive;
+  const activeShare = Math.round(100 * cluster.active / total);
+  const size = Math.min(60, 30 + 6 * Math.log10(cluster.count));
+
+  return L.divIcon({
+    className: 'custom-div-icon',
+    html: `
+      <div style="
+        width: ${size}px;
+        height: ${size}px;
+        border-radius: 50%;
+        background: conic-gradient(#28a745 ${activeShare}%, #dc3545 0);
+        box-shadow: 0 2px 6px rgba(0,0,0,0.3);
+        display: flex;
+        align-items: center;
+        justify-content: center;
+      ">
+        <div style="
+          width: ${size - 10}px;
+          height: ${size - 10}px;
+          border-radius: 50%;
+          background-color: white;
+          display: flex;
+          align-items: center;
+          justify-content: center;
+          font-weight: bold;
+          color: #333;
+          font-size: 12px;
+        ">
+          ${cluster.count}
+        </div>
+      </div>
+    `,
+    iconSize: [size, size],
+    iconAnchor: [size / 2, size / 2],
+  });
+};
+
+// Clusters of the current zoom level; clicking one zooms in to its children
+const ClusterLayer = ({ index, zoom, status }) => {
+  const map = useMap();
+  const [level, setLevel] = useState(null);
+  const levelZoom = Math.max(index.min_zoom, Math.min(index.max_zoom, Math.round(zoom)));
+
+  useEffect(() => {
+    let cancelled = false;
+    loadClusterLevel(levelZoom)
+      .then(loaded => { if (!cancelled) setLevel(loaded); })
+      .catch(err => console.warn('Cluster level unavailable:', err));
+    return () => { cancelled = true; };
+  }, [levelZoom]);
+
+  const clusters = useMemo(() => (level ? clusterMarkers(level, status) : []), [level, status]);
+
+  return clusters.map(cluster => (
+    <Marker
+      key={`${level.zoom}-${cluster.id}`}
+      position={cluster.position}
+      icon={createClusterIcon(cluster)}
+      eventHandlers={{
+        click: () => map.setView(cluster.position, Math.max(map.getBoundsZoom(cluster.bounds), map.getZoom() + 1))
+      }}
+    />
+  ));
+};
+
+// Draw clusters at low zoom and the individual customer markers otherwise
+const CustomerLayer = ({ clusterIndex, filters, children }) => {
+  const map = useMap();
+  const [zoom, setZoom] = useState(map.getZoom());
+
+  useMapEvents({
+    zoomend: () => setZoom(map.getZoom())
+  });
+
+  const showClusters = clusterIndex && filters.country === 'all' && !filters.search && zoom <= CLUSTER_MAX_ZOOM;
+  return showClusters ? <ClusterLayer index={clusterIndex} zoom={zoom} status={filters.status} /> : children;
+};
+
+const LeafletMap = ({ customers, mapState, loading, filters = DEFAULT_FILTERS }) => {
   const mapRef = useRef();
+  const [clusterIndex, setClusterIndex] = useState(null);
+
+  useEffect(() => {
+    loadClusterIndex().then(setClusterIndex);
+  }, []);
 
   // Create markers for customers
   const markers = customers.map(customer => {
@@ -166,7 +259,9 @@ const LeafletMap = ({ customers, mapState, loading }) => {
       
       <MapUpdater customers={customers} mapState={mapState} />
       
-      {markers}
+      <CustomerLayer clusterIndex={clusterIndex} filters={filters}>
+        {markers}
+      </CustomerLayer>
     </MapContainer>
   );
 };
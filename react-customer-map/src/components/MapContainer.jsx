@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import LeafletMap from './LeafletMap';
 import MapControls from './MapControls';
 
-const MapContainer = ({ customers, loading }) => {
+const MapContainer = ({ customers, loading, filters }) => {
   const [mapState, setMapState] = useState({
     mapType: 'roadmap', // 'roadmap' or 'satellite'
     is3DEnabled: false,
@@ -36,6 +36,7 @@ const MapContainer = ({ customers, loading }) => {
         customers={customers}
         mapState={mapState}
         loading={loading}
+        filters={filters}
       />
       
       <MapControls 
@@ -1,22 +1,135 @@
 import { useState, useEffect, useMemo } from 'react';
+import { readCustomerBinary, customerBinaryToObjects } from '../utils/customerBinary';
+import { loadSearchIndex, searchCustomerIds } from '../utils/customerSearch';
+import { loadPublishedCustomers } from '../utils/customerDeltas';
+
+// Sorted id list without repeats whose customers all satisfy matches
+function idsMatch(ids, customersById, matches) {
+  return ids.every((id, i) => (i === 0 || ids[i - 1] < id) && customersById.has(id) && matches(customersById.get(id)));
+}
+
+// True when the facet id lists describe exactly these customers: every
+// listed id is a loaded customer with that status or country, and every
+// customer is listed once per facet
+function facetsMatch(facets, customers) {
+  if (facets.total !== customers.length) return false;
+  const customersById = new Map(customers.map(customer => [customer.id, customer]));
+  const { status, country } = facets.ids;
+  const countryIds = Object.values(country).reduce((total, ids) => total + ids.length, 0);
+
+  return status.active.length + status.inactive.length === customers.length &&
+    idsMatch(status.active, customersById, customer => customer.is_active === true) &&
+    idsMatch(status.inactive, customersById, customer => customer.is_active === false) &&
+    countryIds === customers.filter(customer => customer.country).length &&
+    Object.entries(country).every(([code, ids]) => idsMatch(ids, customersById, customer => customer.country === code));
+}
+
+// Facet id lists written by customer_facets.py; null when not published or
+// written by another run than the loaded customers
+async function loadFacets(customers) {
+  let facets;
+  try {
+    const response = await fetch('/customers_facets.json');
+    const contentType = response.headers.get('content-type') || '';
+    if (!response.ok || !contentType.includes('json')) return null;
+    facets = await response.json();
+  } catch {
+    // No facet index published
+    return null;
+  }
+
+  if (!facetsMatch(facets, customers)) {
+    console.warn('Facet index does not match the customer data, filtering without it');
+    return null;
+  }
+  return facets;
+}
+
+// Linear substring search, used when no search index is published
+function matchesSearch(customer, search) {
+  const searchText = `${customer.customer_identifier} ${customer.customer_number} ${customer.city} ${customer.country}`.toLowerCase();
+  return searchText.includes(search.toLowerCase());
+}
+
+// Intersection of sorted id lists
+function intersectSorted(lists) {
+  return lists.reduce((result, list) => {
+    const matches = [];
+    let i = 0;
+    let j = 0;
+    while (i < result.length && j < list.length) {
+      if (result[i] < list[j]) i++;
+      else if (result[i] > list[j]) j++;
+      else {
+        matches.push(result[i]);
+        i++;
+        j++;
+      }
+    }
+    return matches;
+  });
+}
+
+// The data processor can publish a content-hashed copy of the customer data
+// and name it in a manifest; fall back to the plain file when there is none.
+async function resolveDataUrl() {
+  try {
+    const response = await fetch('/customers_for_map.manifest.json', { cache: 'no-cache' });
+    if (response.ok) {
+      const manifest = await response.json();
+      if (manifest.file) return `/${manifest.file}`;
+    }
+  } catch {
+    // No manifest published
+  }
+  return '/customers_for_map.json';
+}
+
+// Prefer the versioned data (only the deltas since the last visit are
+// downloaded), then the columnar binary file (typed-array views, no JSON
+// parsing) and fall back to the JSON data when neither has been published.
+async function loadCustomerData() {
+  try {
+    const published = await loadPublishedCustomers();
+    if (published) return published;
+  } catch (err) {
+    console.warn('Versioned customer data unavailable:', err);
+  }
+
+  try {
+    const response = await fetch('/customers_for_map.bin');
+    const contentType = response.headers.get('content-type') || '';
+    if (response.ok && !contentType.includes('text/html')) {
+      return customerBinaryToObjects(readCustomerBinary(await response.arrayBuffer()));
+    }
+  } catch (err) {
+    console.warn('Binary customer data unavailable, falling back to JSON:', err);
+  }
+
+  const response = await fetch(await resolveDataUrl());
+
+  if (!response.ok) {
+    throw new Error('Failed to load customer data');
+  }
+
+  const data = await response.json();
+  return data.customers || [];
+}
 
 export function useCustomers(filters) {
   const [customers, setCustomers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [searchIndex, setSearchIndex] = useState(null);
+  const [facets, setFacets] = useState(null);
+
+  const customersById = useMemo(() => new Map(customers.map(customer => [customer.id, customer])), [customers]);
 
   useEffect(() => {
     const loadCustomers = async () => {
       try {
         setLoading(true);
-        const response = await fetch('/customers_for_map.json');
-        
-        if (!response.ok) {
-          throw new Error('Failed to load customer data');
-        }
-        
-        const data = await response.json();
-        const customerData = data.customers || [];
+        const customerData = await loadCustomerData();
         
         // Filter out customers with invalid coordinates
         const validCustomers = customerData.filter(customer => 
@@ -31,6 +144,10 @@ export function useCustomers(filters) {
         setCustomers(validCustomers);
         setError(null);
         console.log(`Loaded ${validCustomers.length} customers with valid coordinates`);
+
+        // The indexes cover all loaded customers, before the coordinate filter
+        loadSearchIndex(customerData).then(setSearchIndex);
+        loadFacets(customerData).then(setFacets);
         
       } catch (err) {
         console.error('Error loading customer data:', err);
@@ -43,10 +160,28 @@ export function useCustomers(filters) {
     loadCustomers();
   }, []);
 
+  // Customer ids matching the search, from the prebuilt index when published
+  const searchMatches = useMemo(() => {
+    if (!filters.search || !searchIndex) return null;
+    return searchCustomerIds(searchIndex, filters.search);
+  }, [filters.search, searchIndex]);
+
   // Filter customers based on current filters
   const filteredCustomers = useMemo(() => {
     if (!customers.length) return [];
 
+    // Status and country filters as an intersection of the facet id lists
+    if (facets && (filters.status !== 'all' || filters.country !== 'all')) {
+      const lists = [];
+      if (filters.status !== 'all') lists.push(facets.ids.status[filters.status] || []);
+      if (filters.country !== 'all') lists.push(facets.ids.country[filters.country] || []);
+
+      return intersectSorted(lists)
+        .filter(id => !searchMatches || searchMatches.has(id))
+        .map(id => customersById.get(id))
+        .filter(customer => customer && (searchMatches || !filters.search || matchesSearch(customer, filters.search)));
+    }
+
     return customers.filter(customer => {
       // Status filter
       if (filters.status !== 'all') {
@@ -60,14 +195,15 @@ export function useCustomers(filters) {
       }
       
       // Search filter
-      if (filters.search) {
-        const searchText = `${customer.customer_identifier} ${customer.customer_number} ${customer.city} ${customer.country}`.toLowerCase();
-        if (!searchText.includes(filters.search.toLowerCase())) return false;
+      if (searchMatches) {
+        if (!searchMatches.has(customer.id)) return false;
+      } else if (filters.search && !matchesSearch(customer, filters.search)) {
+        return false;
       }
       
       return true;
     });
-  }, [customers, filters]);
+  }, [customers, customersById, facets, filters, searchMatches]);
 
   return {
     customers,
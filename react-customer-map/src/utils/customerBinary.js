@@ -0,0 +1,121 @@
+// Reader for the columnar customer map format written by map_binary.py
+// (customers_for_map.bin). See the module docstring there for the layout.
+
+const MAGIC = 'AWCB';
+const FORMAT_VERSION = 1;
+const HEADER_SIZE = 16;
+const DIRECTORY_ENTRY_SIZE = 32;
+
+const FLOAT32 = 1;
+const INT32 = 2;
+const BITSET = 3;
+const DICT = 4;
+const STRING = 5;
+
+const decoder = new TextDecoder('utf-8');
+
+function readStrings(buffer, start, count) {
+  const offsets = new Uint32Array(buffer, start, count + 1);
+  const bytes = new Uint8Array(buffer, start + 4 * (count + 1), offsets[count]);
+  const strings = new Array(count);
+  for (let i = 0; i < count; i++) {
+    strings[i] = decoder.decode(bytes.subarray(offsets[i], offsets[i + 1]));
+  }
+  return strings;
+}
+
+function readColumn(buffer, type, offset, length, rowCount) {
+  switch (type) {
+    case FLOAT32:
+      return new Float32Array(buffer, offset, rowCount);
+    case INT32:
+      return new Int32Array(buffer, offset, rowCount);
+    case BITSET:
+      return new Uint8Array(buffer, offset, length);
+    case DICT: {
+      const uniqueCount = new DataView(buffer).getUint32(offset, true);
+      return {
+        codes: new Uint32Array(buffer, offset + 4, rowCount),
+        values: readStrings(buffer, offset + 4 + 4 * rowCount, uniqueCount)
+      };
+    }
+    case STRING:
+      return { offset, rowCount };
+    default:
+      throw new Error(`Unknown column type ${type}`);
+  }
+}
+
+// Parse the header and return typed-array views over the file without copying.
+// Numeric columns are Float32Array/Int32Array, is_active is a little-endian
+// bitset, dictionary columns are { codes, values } and string columns are
+// decoded on first access.
+export function readCustomerBinary(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+  if (magic !== MAGIC) {
+    throw new Error('Not a customer map binary file');
+  }
+  const version = view.getUint32(4, true);
+  if (version !== FORMAT_VERSION) {
+    throw new Error(`Unsupported customer map binary version ${version}`);
+  }
+
+  const rowCount = view.getUint32(8, true);
+  const columnCount = view.getUint32(12, true);
+  const columns = {};
+
+  for (let i = 0; i < columnCount; i++) {
+    const entry = HEADER_SIZE + i * DIRECTORY_ENTRY_SIZE;
+    const nameBytes = new Uint8Array(buffer, entry, 20);
+    const name = decoder.decode(nameBytes.subarray(0, nameBytes.indexOf(0) === -1 ? 20 : nameBytes.indexOf(0)));
+    const type = view.getUint32(entry + 20, true);
+    const offset = view.getUint32(entry + 24, true);
+    const length = view.getUint32(entry + 28, true);
+    columns[name] = readColumn(buffer, type, offset, length, rowCount);
+  }
+
+  const stringCache = {};
+  const stringColumn = (name) => {
+    if (!stringCache[name]) {
+      const { offset, rowCount: count } = columns[name];
+      stringCache[name] = readStrings(buffer, offset, count);
+    }
+    return stringCache[name];
+  };
+
+  const isActive = (i) => (columns.is_active[i >> 3] >> (i & 7)) & 1;
+  const dictValue = (name, i) => columns[name].values[columns[name].codes[i]];
+
+  return { rowCount, columns, isActive, dictValue, stringColumn };
+}
+
+// Materialize the same customer objects as customers_for_map.json
+export function customerBinaryToObjects(table) {
+  const { rowCount, columns, isActive, dictValue, stringColumn } = table;
+  const identifiers = stringColumn('customer_identifier');
+  const customers = new Array(rowCount);
+
+  for (let i = 0; i < rowCount; i++) {
+    const street = dictValue('street', i);
+    const postalCode = dictValue('postal_code', i);
+    const city = dictValue('city', i);
+    const country = dictValue('country', i);
+
+    customers[i] = {
+      id: columns.id[i],
+      customer_number: columns.customer_number[i],
+      customer_identifier: identifiers[i],
+      is_active: Boolean(isActive(i)),
+      street,
+      postal_code: postalCode,
+      city,
+      country,
+      full_address: [street, postalCode, city, country].map(part => part.trim()).filter(Boolean).join(', '),
+      latitude: columns.latitude[i],
+      longitude: columns.longitude[i]
+    };
+  }
+
+  return customers;
+}
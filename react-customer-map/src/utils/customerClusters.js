@@ -0,0 +1,64 @@
+// Loader for the marker cluster pyramid written by map_clusters.py
+// (clusters/index.json plus one columnar file per zoom level).
+import { readCustomerBinary } from './customerBinary';
+
+const levelCache = new Map();
+
+// Returns the pyramid index, or null when the clusters were not published.
+export async function loadClusterIndex() {
+  try {
+    const response = await fetch('/clusters/index.json');
+    const contentType = response.headers.get('content-type') || '';
+    if (response.ok && contentType.includes('json')) {
+      return await response.json();
+    }
+  } catch {
+    // No cluster pyramid published
+  }
+  return null;
+}
+
+// Load the clusters of one zoom level (cached). Columns are typed arrays:
+// count, active, lat, lng, min_lat, min_lng, max_lat, max_lng, parent,
+// child_start, child_end and point_start.
+export function loadClusterLevel(zoom) {
+  if (!levelCache.has(zoom)) {
+    const level = fetch(`/clusters/${zoom}.bin`)
+      .then(response => {
+        if (!response.ok) throw new Error(`Failed to load clusters for zoom ${zoom}`);
+        return response.arrayBuffer();
+      })
+      .then(buffer => {
+        const { rowCount, columns } = readCustomerBinary(buffer);
+        return { zoom, rowCount, columns };
+      });
+    levelCache.set(zoom, level);
+    level.catch(() => levelCache.delete(zoom));
+  }
+  return levelCache.get(zoom);
+}
+
+// Clusters of a level with the number of customers matching the status
+// filter ('all', 'active' or 'inactive'); empty clusters are dropped.
+export function clusterMarkers(level, status = 'all') {
+  const { rowCount, columns } = level;
+  const markers = [];
+
+  for (let i = 0; i < rowCount; i++) {
+    const total = columns.count[i];
+    const active = columns.active[i];
+    const count = status === 'active' ? active : status === 'inactive' ? total - active : total;
+    if (count === 0) continue;
+
+    markers.push({
+      id: i,
+      count,
+      active,
+      inactive: total - active,
+      position: [columns.lat[i], columns.lng[i]],
+      bounds: [[columns.min_lat[i], columns.min_lng[i]], [columns.max_lat[i], columns.max_lng[i]]]
+    });
+  }
+
+  return markers;
+}
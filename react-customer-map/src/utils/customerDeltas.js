@@ -0,0 +1,162 @@
+// Client side of the versioned map data written by map_publish.py (publish/).
+// The customers of the last loaded version are kept in IndexedDB; on the next
+// visit only the deltas since that version are downloaded and applied, and the
+// result is checked against the published checksum. Key and checksum rules
+// must match customer_keys and customers_checksum there.
+
+const PUBLISH_URL = '/publish';
+const DB_NAME = 'customer-map';
+const STORE = 'published';
+const HELD_KEY = 'customers';
+
+const encoder = new TextEncoder();
+
+export function customerKeys(customers) {
+  const seen = new Map();
+  return customers.map(customer => {
+    const number = customer.customer_number;
+    const occurrence = (seen.get(number) || 0) + 1;
+    seen.set(number, occurrence);
+    return occurrence === 1 ? String(number) : `${number}#${occurrence}`;
+  });
+}
+
+// Column-wise SHA-256: field name, then strings as NUL-terminated UTF-8 or
+// numbers and booleans as little-endian float64, fields in sorted order
+export async function customersChecksum(customers) {
+  const parts = [];
+  if (customers.length) {
+    for (const field of Object.keys(customers[0]).sort()) {
+      parts.push(encoder.encode(`${field}\0`));
+      if (typeof customers[0][field] === 'string') {
+        parts.push(encoder.encode(customers.map(customer => `${customer[field]}\0`).join('')));
+      } else {
+        const view = new DataView(new ArrayBuffer(8 * customers.length));
+        customers.forEach((customer, i) => view.setFloat64(8 * i, Number(customer[field]), true));
+        parts.push(new Uint8Array(view.buffer));
+      }
+    }
+  }
+
+  const bytes = new Uint8Array(parts.reduce((total, part) => total + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    bytes.set(part, offset);
+    offset += part.length;
+  }
+
+  const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+  return Array.from(digest, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+export function applyDelta(customers, delta) {
+  const removed = new Set(delta.removed);
+  const updated = new Map(delta.updated);
+  const moved = new Map(delta.moved.map(([key, latitude, longitude]) => [key, [latitude, longitude]]));
+  const added = delta.added;
+  let nextAdded = 0;
+
+  const result = [];
+  const insertAdded = () => {
+    while (nextAdded < added.length && added[nextAdded][0] === result.length) {
+      result.push({ ...added[nextAdded][1] });
+      nextAdded++;
+    }
+  };
+
+  customerKeys(customers).forEach((key, i) => {
+    if (removed.has(key)) return;
+    insertAdded();
+    const customer = { ...customers[i], ...updated.get(key) };
+    if (moved.has(key)) [customer.latitude, customer.longitude] = moved.get(key);
+    result.push(customer);
+  });
+  insertAdded();
+  while (nextAdded < added.length) result.push({ ...added[nextAdded++][1] });
+
+  result.forEach((customer, i) => {
+    customer.id = i + 1;
+  });
+  return result;
+}
+
+function openDatabase() {
+  return new Promise((resolve, reject) => {
+    const request = indexedDB.open(DB_NAME, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(STORE);
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+async function readHeld() {
+  const db = await openDatabase();
+  return new Promise((resolve, reject) => {
+    const request = db.transaction(STORE).objectStore(STORE).get(HELD_KEY);
+    request.onsuccess = () => resolve(request.result || null);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+async function storeHeld(held) {
+  try {
+    const db = await openDatabase();
+    await new Promise((resolve, reject) => {
+      const transaction = db.transaction(STORE, 'readwrite');
+      transaction.objectStore(STORE).put(held, HELD_KEY);
+      transaction.oncomplete = resolve;
+      transaction.onerror = () => reject(transaction.error);
+    });
+  } catch (err) {
+    console.warn('Could not keep the customer data for the next visit:', err);
+  }
+}
+
+async function fetchJson(path, options) {
+  const response = await fetch(`${PUBLISH_URL}/${path}`, options);
+  const contentType = response.headers.get('content-type') || '';
+  if (!response.ok || !contentType.includes('json')) return null;
+  return response.json();
+}
+
+// Customers of the manifest's version patched from the held ones, or null
+// when the deltas do not reach it or the result does not match the checksum
+async function patchHeld(held, manifest) {
+  const deltasFrom = new Map(manifest.deltas.map(entry => [entry.from, entry]));
+  let { version, customers } = held;
+  while (version !== manifest.version) {
+    const entry = deltasFrom.get(version);
+    const delta = entry && await fetchJson(entry.file);
+    if (!delta) return null;
+    customers = applyDelta(customers, delta);
+    version = entry.to;
+  }
+  return (await customersChecksum(customers)) === manifest.checksum ? customers : null;
+}
+
+// Returns the customers of the latest published version, or null when
+// nothing was published.
+export async function loadPublishedCustomers() {
+  const manifest = await fetchJson('manifest.json', { cache: 'no-cache' }).catch(() => null);
+  if (!manifest) return null;
+
+  const held = await readHeld().catch(() => null);
+  if (held && held.version === manifest.version) return held.customers;
+
+  if (held) {
+    try {
+      const customers = await patchHeld(held, manifest);
+      if (customers) {
+        await storeHeld({ version: manifest.version, customers });
+        return customers;
+      }
+    } catch (err) {
+      console.warn('Customer data deltas unavailable, downloading the snapshot:', err);
+    }
+  }
+
+  const snapshot = await fetchJson(manifest.snapshot);
+  if (!snapshot) return null;
+  await storeHeld({ version: manifest.version, customers: snapshot.customers });
+  return snapshot.customers;
+}
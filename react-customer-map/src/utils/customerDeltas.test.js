@@ -0,0 +1,42 @@
+// Run with `npm test` (node --test). The fixture is written by the Python side
+// (tests/fixtures/customer_deltas.json, checked in tests/test_map_publish.py),
+// so the checksum and delta rules of map_publish.py are held to the same values.
+
+import assert from 'node:assert/strict';
+import { readFileSync } from 'node:fs';
+import { test } from 'node:test';
+
+import { applyDelta, customerKeys, customersChecksum } from './customerDeltas.js';
+
+const fixture = JSON.parse(
+  readFileSync(new URL('../../../tests/fixtures/customer_deltas.json', import.meta.url), 'utf-8'),
+);
+
+test('checksums match map_publish.customers_checksum', async () => {
+  assert.equal(await customersChecksum(fixture.previous), fixture.checksums.previous);
+  assert.equal(await customersChecksum(fixture.current), fixture.checksums.current);
+});
+
+test('keys tell customers sharing a number apart', () => {
+  assert.deepEqual(customerKeys(fixture.previous),
+    ['20847', '0', '20850', '20850#2', '21000', '21001', '21002', '0#2']);
+});
+
+test('the published delta turns the old customers into the new ones', async () => {
+  const customers = applyDelta(fixture.previous, fixture.delta);
+
+  assert.deepEqual(customers, fixture.current);
+  assert.equal(await customersChecksum(customers), fixture.delta.checksum);
+});
+
+test('applying a delta leaves the held customers untouched', () => {
+  const previous = structuredClone(fixture.previous);
+  applyDelta(previous, fixture.delta);
+  assert.deepEqual(previous, fixture.previous);
+});
+
+test('a changed customer changes the checksum', async () => {
+  const changed = fixture.current.map(customer => ({ ...customer }));
+  changed[0].latitude += 1e-9;
+  assert.notEqual(await customersChecksum(changed), fixture.checksums.current);
+});
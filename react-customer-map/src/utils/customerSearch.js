@@ -0,0 +1,116 @@
+// Query side of the trigram search index written by search_index.py
+// (customers_search_index.json). Folding and the checksum must match
+// fold_text and texts_checksum there.
+
+const FOLDED_CHARACTERS = { 'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss' };
+
+const SEARCH_INDEX_VERSION = 2;
+
+const encoder = new TextEncoder();
+
+export function foldText(text) {
+  return String(text)
+    .toLowerCase()
+    .replace(/[äöüß]/g, char => FOLDED_CHARACTERS[char])
+    .normalize('NFKD')
+    .replace(/\p{M}/gu, '');
+}
+
+function trigrams(text) {
+  const result = new Set();
+  for (let i = 0; i + 3 <= text.length; i++) {
+    result.add(text.slice(i, i + 3));
+  }
+  return result;
+}
+
+// Keep the sorted positions of `positions` that also occur in `other`
+function intersect(positions, other) {
+  return positions.filter(position => {
+    let low = 0;
+    let high = other.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (other[mid] < position) low = mid + 1;
+      else high = mid;
+    }
+    return other[low] === position;
+  });
+}
+
+// Field value as it appears in the search text (null -> 'null', like field_text)
+function fieldText(value) {
+  return value === null || value === undefined ? 'null' : String(value);
+}
+
+// SHA-256 of the field texts, each followed by a NUL character
+export async function textsChecksum(customers, fields) {
+  const text = customers.map(customer => fields.map(field => `${fieldText(customer[field])}\0`).join('')).join('');
+  const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', encoder.encode(text)));
+  return Array.from(digest, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+// Returns the index of the loaded customers, or null when it was not
+// published or was built from other customer data (e.g. an older run).
+export async function loadSearchIndex(customers) {
+  let index;
+  try {
+    const response = await fetch('/customers_search_index.json');
+    const contentType = response.headers.get('content-type') || '';
+    if (!response.ok || !contentType.includes('json')) return null;
+    index = await response.json();
+  } catch {
+    // No search index published
+    return null;
+  }
+
+  const matches = index.version === SEARCH_INDEX_VERSION &&
+    index.ids.length === customers.length &&
+    index.ids.every((id, i) => id === customers[i].id) &&
+    index.checksum === await textsChecksum(customers, index.fields);
+  if (!matches) {
+    console.warn('Search index does not match the customer data, searching without it');
+    return null;
+  }
+
+  index.postings = new Map();
+  index.texts = customers.map(customer => index.fields.map(field => foldText(fieldText(customer[field]))).join(' '));
+  return index;
+}
+
+// Sorted document positions containing a trigram (stored gap-encoded)
+function posting(index, trigram) {
+  if (!index.postings.has(trigram)) {
+    let position = 0;
+    index.postings.set(trigram, (index.trigrams[trigram] || []).map(gap => (position += gap)));
+  }
+  return index.postings.get(trigram);
+}
+
+function candidates(index, query) {
+  if (query.length < 3) {
+    // Every occurrence lies inside some trigram containing the query
+    const positions = new Set(index.short);
+    for (const trigram of Object.keys(index.trigrams)) {
+      if (trigram.includes(query)) posting(index, trigram).forEach(position => positions.add(position));
+    }
+    return [...positions];
+  }
+
+  const lists = [...trigrams(query)]
+    .map(trigram => posting(index, trigram))
+    .sort((a, b) => a.length - b.length);
+  return lists.slice(1).reduce(intersect, lists[0]);
+}
+
+// Set of customer ids whose search text contains the query
+export function searchCustomerIds(index, query) {
+  const folded = foldText(query);
+  if (!folded) return new Set(index.ids);
+
+  const ids = new Set();
+  for (const position of candidates(index, folded)) {
+    if (index.texts[position].includes(folded)) ids.add(index.ids[position]);
+  }
+  return ids;
+}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prebuilt customer search index
+
+The map's search box matches the query as a substring of
+"customer_identifier customer_number city country". This module builds an
+inverted trigram index over the same text so a search only verifies the
+customers that contain every trigram of the query, instead of scanning all
+of them.
+
+Text is folded before indexing and querying: lower case, ä/ö/ü/ß written
+as ae/oe/ue/ss and other accents dropped, so 'München', 'MUENCHEN' and
+'muenchen' all match each other. Folding works character by character, so
+every match of the plain lower-case substring search is still found.
+
+The index is written as compact JSON (customers_search_index.json):
+
+    version     format version
+    fields      the searched fields, in text order
+    ids         customer id of each document
+    checksum    SHA-256 of the field texts the index was built from
+    short       documents whose text is shorter than a trigram
+    trigrams    {trigram: document positions}, ascending and gap-encoded (the
+                first position, then the differences to the previous one)
+
+The texts themselves are not stored: candidates are verified against the
+customers loaded from the map data. The index is only used with the
+customers it was built from, so an index whose ids or checksum do not
+match is rejected. The checksum is taken over the field texts (before
+folding), each as UTF-8 followed by a NUL byte, so the browser
+(src/utils/customerSearch.js) computes the same value.
+
+Usage:  python search_index.py [QUERY ...]
+"""
+
+import hashlib
+import json
+import os
+import sys
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+FORMAT_VERSION = 2
+DEFAULT_SEARCH_INDEX = 'customers_search_index.json'
+DEFAULT_MAP_FILE = 'customers_for_map.json'
+SEARCH_FIELDS = ['customer_identifier', 'customer_number', 'city', 'country']
+
+FOLDED_CHARACTERS = {'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'}
+
+def fold_text(text):
+    """Lower-case text, transliterate German umlauts/ß and strip other accents"""
+    text = str(text).lower()
+    if text.isascii():
+        return text
+    for char, replacement in FOLDED_CHARACTERS.items():
+        text = text.replace(char, replacement)
+    return ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+
+def field_text(value):
+    """Field value as it appears in the search text (None -> 'null', like the browser)"""
+    return 'null' if value is None else str(value)
+
+def texts_checksum(customers, fields=SEARCH_FIELDS):
+    """SHA-256 hex digest of the field texts of the customers (see the module docstring)"""
+    digest = hashlib.sha256()
+    for customer in customers:
+        digest.update(''.join(field_text(customer.get(field)) + '\0' for field in fields).encode('utf-8'))
+    return digest.hexdigest()
+
+def trigrams(text):
+    """Distinct trigrams of a string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """Trigram index over the folded search text of the customers (docs: their folded field values)"""
+
+    def __init__(self, data, docs):
+        self.data = data
+        self.fields = data['fields']
+        self.ids = data['ids']
+        self.docs = docs
+        self.texts = [' '.join(doc) for doc in self.docs]
+        self.short = np.asarray(data['short'], dtype=np.int64)
+        self.postings = {}
+
+    @classmethod
+    def from_customers(cls, customers):
+        """Build the index from customer records (dicts with the SEARCH_FIELDS and id)"""
+
+        docs = []
+        short = []
+        postings = defaultdict(list)
+
+        for position, customer in enumerate(customers):
+            doc = [fold_text(field_text(customer.get(field))) for field in SEARCH_FIELDS]
+            docs.append(doc)
+
+            text = ' '.join(doc)
+            if len(text) < 3:
+                short.append(position)
+            for trigram in trigrams(text):
+                postings[trigram].append(position)
+
+        return cls({
+            'version': FORMAT_VERSION,
+            'fields': SEARCH_FIELDS,
+            'ids': [customer['id'] for customer in customers],
+            'checksum': texts_checksum(customers),
+            'short': short,
+            'trigrams': {trigram: np.diff(positions, prepend=0).tolist()
+                         for trigram, positions in sorted(postings.items())}
+        }, docs)
+
+    @classmethod
+    def load(cls, customers, filename=DEFAULT_SEARCH_INDEX):
+        """Load the index of the given customer records
+
+        Raises ValueError when the index has another format version or was
+        built from other customers.
+        """
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported search index version: {data.get('version')}")
+        if (data['ids'] != [customer['id'] for customer in customers] or
+                data['checksum'] != texts_checksum(customers, data['fields'])):
+            raise ValueError(f"{filename} was built from other customer data")
+        docs = [[fold_text(field_text(customer.get(field))) for field in data['fields']] for customer in customers]
+        return cls(data, docs)
+
+    @classmethod
+    def open_default(cls, customers, filename=DEFAULT_SEARCH_INDEX):
+        """Load the index of the given customers, or return None if it has not been built"""
+        if not os.path.exists(filename):
+            return None
+        return cls.load(customers, filename)
+
+    def save(self, filename=DEFAULT_SEARCH_INDEX):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'))
+        print(f"Search index saved to {filename} ({len(self.ids)} customers, {len(self.data['trigrams'])} trigrams)")
+
+    def posting(self, trigram):
+        """Sorted document positions containing a trigram"""
+        if trigram not in self.postings:
+            self.postings[trigram] = np.cumsum(np.asarray(self.data['trigrams'].get(trigram, []), dtype=np.int64))
+        return self.postings[trigram]
+
+    def candidates(self, query):
+        """Document positions that may contain the folded query"""
+
+        if len(query) < 3:
+            # Every occurrence lies inside some trigram containing the query
+            lists = [self.posting(trigram) for trigram in self.data['trigrams'] if query in trigram]
+            return np.union1d(np.unique(np.concatenate(lists)) if lists else self.short, self.short)
+
+        lists = sorted((self.posting(trigram) for trigram in trigrams(query)), key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if len(result) == 0:
+                break
+            positions = np.minimum(np.searchsorted(other, result), max(len(other) - 1, 0))
+            result = result[other[positions] == result] if len(other) else result[:0]
+        return result
+
+    def search(self, query, field=None):
+        """Customer ids whose search text (or one field) contains the query, in export order"""
+
+        query = fold_text(query)
+        if field is None:
+            texts = self.texts
+        else:
+            column = self.fields.index(field)
+            texts = [doc[column] for doc in self.docs]
+
+        if not query:
+            return list(self.ids)
+
+        return [self.ids[position] for position in self.candidates(query).tolist() if query in texts[position]]
+
+def write_search_index(customers, filename=DEFAULT_SEARCH_INDEX):
+    """Build the search index of customer records and save it"""
+    index = SearchIndex.from_customers(customers)
+    index.save(filename)
+    return index
+
+def main():
+    with open(DEFAULT_MAP_FILE, 'r', encoding='utf-8') as f:
+        customers = json.load(f)['customers']
+    try:
+        index = SearchIndex.open_default(customers)
+    except ValueError as e:
+        print(f"{e}, run improved_data_processor.py --search-index again")
+        sys.exit(1)
+    if index is None:
+        print(f"{DEFAULT_SEARCH_INDEX} not found, run improved_data_processor.py --search-index first")
+        sys.exit(1)
+
+    for query in sys.argv[1:]:
+        ids = index.search(query)
+        print(f"{query}: {len(ids)} customers")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Seeded synthetic customer exports for benchmarks
+
+Generates exports of any size with the column schema of the real export
+(Kunden-Nr., Kundenkürzel, Kunde aktiv j/n, L-Straße, L-PLZ, L-Ort,
+L-Land), following its value distributions:
+
+- postal code, city and country are drawn together from the rows of the
+  real export, so the country/city distribution and its dirty values
+  (street names and coordinates in the country column, '0', empty cells)
+  come out at their real rates
+- streets are real street names with a new house number, customer names
+  and the active flag are drawn from the real values
+- customer numbers are sequential, with the real share of missing numbers
+- on top of that, DIRTY_RATE of the address cells are replaced by '0' or
+  'nan', the placeholders the cleaning step has to remove
+
+The same rows, seed and source export always give the same file.
+
+Usage:  python synthetic_export.py ROWS [OUTPUT] [--seed SEED]
+"""
+
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+
+from improved_data_processor import SOURCE_CSV
+
+EXPORT_HEADER = ['Kunden-Nr.', 'Kundenkürzel', 'Kunde aktiv j/n', 'L-Straße', 'L-PLZ', 'L-Ort', 'L-Land']
+
+DEFAULT_CHUNK_SIZE = 1000000
+DIRTY_RATE = 0.002
+DIRTY_VALUES = np.array(['0', 'nan'], dtype=object)
+ADDRESS_FIELDS = ['L-Straße', 'L-PLZ', 'L-Ort', 'L-Land']
+
+FIRST_CUSTOMER_NUMBER = 10000
+HOUSE_NUMBER = re.compile(r'\s+\d+\s*[a-zA-Z]?(?:[-/]\s*\d+\s*[a-zA-Z]?)?$')
+
+def load_profile(path=SOURCE_CSV):
+    """Columns of the real export that the synthetic rows are drawn from"""
+
+    real = pd.read_csv(path, dtype=str, keep_default_na=False)
+    real.columns = EXPORT_HEADER
+
+    streets = real['L-Straße'].str.strip()
+    profile = {field: real[field].to_numpy(dtype=object) for field in EXPORT_HEADER}
+    profile['street_names'] = streets.str.replace(HOUSE_NUMBER, '', regex=True).to_numpy(dtype=object)
+    profile['house_number_rate'] = float(streets.str.contains(HOUSE_NUMBER).mean())
+    profile['missing_number_rate'] = float((real['Kunden-Nr.'] == '').mean())
+    return profile
+
+def draw(rng, values, rows):
+    """rows values drawn with replacement, i.e. following their frequencies"""
+    return values[rng.integers(0, len(values), size=rows)]
+
+def generate_export_frame(rows, profile, rng, first_number=FIRST_CUSTOMER_NUMBER):
+    """DataFrame of rows synthetic export rows with the real export's columns"""
+
+    # Postal code, city and country of one real row each
+    locations = rng.integers(0, len(profile['L-Land']), size=rows)
+
+    streets = draw(rng, profile['street_names'], rows)
+    house_numbers = rng.integers(1, 200, size=rows).astype(str).astype(object)
+    numbered = (streets != '') & (rng.random(rows) < profile['house_number_rate'])
+    streets = np.where(numbered, streets + ' ' + house_numbers, streets)
+
+    numbers = np.arange(first_number, first_number + rows).astype(str).astype(object)
+    numbers[rng.random(rows) < profile['missing_number_rate']] = ''
+
+    frame = pd.DataFrame({
+        'Kunden-Nr.': numbers,
+        'Kundenkürzel': draw(rng, profile['Kundenkürzel'], rows),
+        'Kunde aktiv j/n': draw(rng, profile['Kunde aktiv j/n'], rows),
+        'L-Straße': streets,
+        'L-PLZ': profile['L-PLZ'][locations],
+        'L-Ort': profile['L-Ort'][locations],
+        'L-Land': profile['L-Land'][locations]
+    })
+
+    for field in ADDRESS_FIELDS:
+        dirty = rng.random(rows) < DIRTY_RATE
+        frame.loc[dirty, field] = DIRTY_VALUES[rng.integers(0, len(DIRTY_VALUES), size=int(dirty.sum()))]
+
+    return frame
+
+def write_synthetic_export(filename, rows, seed=42, source=SOURCE_CSV, chunksize=DEFAULT_CHUNK_SIZE):
+    """Write a synthetic export of rows rows to filename, chunk by chunk"""
+
+    profile = load_profile(source)
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, max(rows, 1), chunksize):
+        frame = generate_export_frame(min(chunksize, rows - start), profile, rng,
+                                      first_number=FIRST_CUSTOMER_NUMBER + start)
+        frame.to_csv(filename, index=False, header=start == 0, mode='w' if start == 0 else 'a')
+
+    print(f"Synthetic export with {rows} rows saved to {filename}")
+    return filename
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a seeded synthetic customer export')
+    parser.add_argument('rows', type=int, help='number of customer rows')
+    parser.add_argument('output', nargs='?', help='output CSV (default: synthetic_export_ROWS.csv)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    args = parser.parse_args()
+
+    write_synthetic_export(args.output or f'synthetic_export_{args.rows}.csv', args.rows, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
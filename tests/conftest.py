@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules live at the top level of the repository
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,21 @@
+"""Grouping of rows by canonical address"""
+
+import pandas as pd
+
+from address_resolution import dedupe_addresses
+
+def test_spellings_of_one_address_share_a_group():
+    df = pd.DataFrame({
+        'street': ['Hauptstraße 5', 'hauptstr.5', 'Hauptstr, 5', 'Hauptstraße 7', None],
+        'postal_code': ['D-01067', '1067', '01067', '01067', '01067'],
+        'city': ['Dresden', ' DRESDEN', 'Dresden', 'Dresden', 'Dresden'],
+        'country': ['DE', 'DE', 'DE', 'DE', 'DE'],
+    })
+    codes, locations = dedupe_addresses(df, ['street', 'postal_code', 'city', 'country'])
+
+    assert codes.tolist() == [0, 0, 0, 1, 2]
+    assert locations.to_dict('records') == [
+        {'street': 'Hauptstraße 5', 'postal_code': '01067', 'city': 'Dresden', 'country': 'DE'},
+        {'street': 'Hauptstraße 7', 'postal_code': '01067', 'city': 'Dresden', 'country': 'DE'},
+        {'street': '', 'postal_code': '01067', 'city': 'Dresden', 'country': 'DE'},
+    ]
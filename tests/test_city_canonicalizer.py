@@ -0,0 +1,40 @@
+"""City canonicalization keeps districts and long names but never guesses another town"""
+
+import pytest
+
+from city_canonicalizer import CityCanonicalizer
+from improved_data_processor import CITY_ALIASES, CITY_DISTRICTS, GERMAN_CITIES
+
+@pytest.fixture
+def canonicalizer():
+    return CityCanonicalizer(GERMAN_CITIES, CITY_ALIASES, CITY_DISTRICTS, cache_file=None)
+
+@pytest.mark.parametrize('city', ['Halle/Westfalen', 'Münster-Sarmsheim', 'Essen / Oldenburg', 'Mülheim-Kärlich',
+                                  'Halle (Westf.)', 'Offenbach an der Queich', 'Heidelberg, Baden-Württemberg',
+                                  'Rostock-Nienhagen'])
+def test_other_towns_and_states_stay_unknown(canonicalizer, city):
+    assert canonicalizer.canonicalize(city) is None
+
+def test_frankfurt_an_der_oder_is_not_frankfurt_am_main(canonicalizer):
+    assert canonicalizer.canonicalize('Frankfurt an der Oder') == 'Frankfurt (Oder)'
+
+@pytest.mark.parametrize('city, expected', [
+    ('München', 'München'), ('MUENCHEN ', 'München'), ('Munchen', 'München'), ('Munich', 'München'),
+    ('München-Pasing', 'München'), ('München  (Flughafen)', 'München'), ('Köln - Porz', 'Köln'),
+    ('Hamburg/Altona', 'Hamburg'), ('Berlin 10', 'Berlin'), ('Berlin, Germany', 'Berlin'),
+    ('Frankfurt am Main', 'Frankfurt'), ('Frankfurt a. M.', 'Frankfurt'), ('Frankfurt / Main', 'Frankfurt'),
+    ('Frankfurt am Main (Rödelheim)', 'Frankfurt'), ('Frankfurt/Oder', 'Frankfurt (Oder)'),
+    ('Halle (Saale)', 'Halle'), ('Halle/Saale', 'Halle'), ('Halle-Ammendorf', 'Halle'),
+    ('Münster-Albachten', 'Münster'), ('Freiburg i. Br.', 'Freiburg'), ('Güterslohn', 'Gütersloh'),
+])
+def test_spellings_districts_and_long_names(canonicalizer, city, expected):
+    assert canonicalizer.canonicalize(city) == expected
+
+def test_cache_is_reused_and_invalidated(tmp_path):
+    cache_file = str(tmp_path / 'city_canonical_cache.json')
+    first = CityCanonicalizer(GERMAN_CITIES, CITY_ALIASES, CITY_DISTRICTS, cache_file=cache_file)
+    assert first.canonicalize_many(['Köln-Porz', 'Halle/Westfalen']).tolist() == ['Köln', '']
+
+    assert CityCanonicalizer(GERMAN_CITIES, CITY_ALIASES, CITY_DISTRICTS, cache_file=cache_file).memo == first.memo
+    # Other districts make the persisted results stale
+    assert CityCanonicalizer(GERMAN_CITIES, CITY_ALIASES, {}, cache_file=cache_file).memo == {}
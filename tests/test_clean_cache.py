@@ -0,0 +1,86 @@
+"""The clean cache rebuilds when its key changes and a hit gives the freshly cleaned table"""
+
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from conftest import ROOT
+from clean_cache import cached_table
+from customer_facets import CustomerFacets
+from improved_data_processor import SOURCE_CSV, STRING_DTYPE, clean_and_standardize_data, clean_customer_frame, \
+    read_customer_export
+
+def write_export(path, rows=400, start=0):
+    with open(os.path.join(ROOT, SOURCE_CSV), 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    path.write_text(lines[0] + ''.join(lines[1 + start:1 + start + rows]), encoding='utf-8')
+    return str(path)
+
+class Builder:
+    """build() callback counting its calls"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return pd.DataFrame({'id': [1, 2], 'city': pd.Series(['Köln', None], dtype=STRING_DTYPE)})
+
+def test_key_changes_rebuild(tmp_path):
+    export = write_export(tmp_path / 'export.csv')
+    cache_dir = str(tmp_path / 'cache')
+    build = Builder()
+
+    def load(version=1, extra=None):
+        return cached_table(export, 'clean', version, build, extra=extra, string_dtype=STRING_DTYPE,
+                            cache_dir=cache_dir)
+
+    load()
+    load()
+    assert build.calls == 1
+
+    load(version=2)
+    assert build.calls == 2
+    load(version=2, extra={'atlantis': 'XA'})
+    assert build.calls == 3
+
+    # Same size, other bytes
+    with open(export, 'r+b') as f:
+        f.seek(-2, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-2, os.SEEK_END)
+        f.write(b'X' if last != b'X' else b'Y')
+    load(version=2, extra={'atlantis': 'XA'})
+    assert build.calls == 4
+    load(version=2, extra={'atlantis': 'XA'})
+    assert build.calls == 4
+
+    # Only the newest table of the step is kept
+    assert len(glob.glob(os.path.join(cache_dir, 'clean.*.arrow'))) == 1
+
+@pytest.mark.parametrize('start', [0, 3000])
+def test_hit_equals_fresh_clean(tmp_path, monkeypatch, capsys, start):
+    monkeypatch.chdir(tmp_path)
+    export = write_export(tmp_path / 'export.csv', start=start)
+
+    fresh_facets = CustomerFacets()
+    fresh = clean_and_standardize_data(export, facets=fresh_facets)
+    assert glob.glob(os.path.join('cache', '*.arrow'))
+
+    capsys.readouterr()
+    cached_facets = CustomerFacets()
+    cached = clean_and_standardize_data(export, facets=cached_facets)
+    assert 'Loading cleaned data from' in capsys.readouterr().out
+
+    pd.testing.assert_frame_equal(cached, fresh, check_exact=True)
+    pd.testing.assert_series_equal(cached.dtypes, fresh.dtypes)
+    for column in ['country', 'city']:
+        assert cached[column].cat.categories.equals(fresh[column].cat.categories)
+    assert cached_facets.to_dict() == fresh_facets.to_dict()
+
+    uncached = clean_customer_frame(read_customer_export(export), verbose=False)
+    pd.testing.assert_frame_equal(cached, uncached, check_exact=True)
@@ -0,0 +1,72 @@
+"""The vectorized full_address and customer_identifier columns match the row-wise originals"""
+
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from improved_data_processor import (EXPORT_COLUMNS, EXPORT_DTYPES, SOURCE_CSV, TEXT_EXPORT_DTYPES,
+                                     build_full_addresses, clean_country_codes, clean_customer_frame,
+                                     create_full_address, load_config)
+
+# Rows with missing, blank and whitespace-only fields next to ordinary ones
+EDGE_CASE_EXPORT = '''Kunden-Nr.,Kundenkürzel,Kunde aktiv j/n,L-Straße,L-PLZ,L-Ort,L-Land
+1,Müller GmbH,ja,Hauptstraße 1,10115,Berlin,DE
+2,,ja,Hauptstraße 2,10115,Berlin,DE
+3,   ,nein,  Gartenweg 3  ,  80331 ,  München  , DE
+4,Leer,ja,,,,
+5,Blank,ja,   ,   ,   ,
+6,Nur Ort,ja,,,Hamburg,
+7,Nur Land,ja,   ,,,AT
+8,,ja,,0,Köln,0
+9,\t,ja,Ringstraße 9,,,
+10,Null,ja,0,0,0,0
+'''
+
+def read_export(source, dtype):
+    df = pd.read_csv(source, dtype=dtype)
+    df.columns = EXPORT_COLUMNS
+    return df
+
+def baseline_clean(raw):
+    """Cleaned rows of a raw export read with TEXT_EXPORT_DTYPES, built row by row like the original code"""
+    df = raw.copy()
+    aliases = load_config().get('data_processing', {}).get('country_aliases', {})
+    df['country'] = clean_country_codes(df['country'], aliases).astype(object)
+    for column in ['postal_code', 'city', 'street']:
+        df[column] = df[column].astype(str).str.strip().replace(['nan', '0'], '')
+    df['full_address'] = df.apply(lambda row: create_full_address(row), axis=1)
+    df = df[df['full_address'] != ''].copy()
+    df['customer_identifier'] = df.apply(lambda row:
+        row['customer_name'] if pd.notna(row['customer_name']) and row['customer_name'].strip() != ''
+        else f"Customer {int(row['customer_number'])}", axis=1)
+    return df
+
+SOURCES = {
+    'shipped': lambda: os.path.join(ROOT, SOURCE_CSV),
+    'edge_cases': lambda: io.StringIO(EDGE_CASE_EXPORT)
+}
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_matches_row_wise_baseline(source):
+    expected = baseline_clean(read_export(SOURCES[source](), TEXT_EXPORT_DTYPES))
+    cleaned = clean_customer_frame(read_export(SOURCES[source](), EXPORT_DTYPES), verbose=False)
+
+    assert cleaned.index.tolist() == expected.index.tolist()
+    assert build_full_addresses(cleaned).tolist() == expected['full_address'].tolist()
+    assert cleaned['customer_identifier'].astype(object).tolist() == expected['customer_identifier'].tolist()
+
+def test_edge_cases():
+    cleaned = clean_customer_frame(read_export(io.StringIO(EDGE_CASE_EXPORT), EXPORT_DTYPES),
+                                   verbose=False).set_index('customer_number')
+    full_addresses = dict(zip(cleaned.index, build_full_addresses(cleaned)))
+
+    assert full_addresses[3] == 'Gartenweg 3, 80331, München, DE'
+    assert full_addresses[6] == 'Hamburg'
+    assert full_addresses[8] == 'Köln'
+    assert 4 not in full_addresses and 5 not in full_addresses and 10 not in full_addresses
+    assert cleaned.loc[2, 'customer_identifier'] == 'Customer 2'
+    assert cleaned.loc[3, 'customer_identifier'] == 'Customer 3'
+    assert cleaned.loc[9, 'customer_identifier'] == 'Customer 9'
@@ -0,0 +1,37 @@
+"""Country codes resolved once per distinct value match the row-wise resolution"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from conftest import ROOT
+from improved_data_processor import (COUNTRY_CATEGORIES, EXPORT_COLUMNS, EXPORT_DTYPES, SOURCE_CSV,
+                                     clean_country_codes, resolve_country)
+
+RAW_COUNTRIES = ['DE', ' de ', 'Deutschland', 'AUSTRIA', 'Österreich', 'uk', 'Sl', 'L', 'CH', '0', '', '   ',
+                 np.nan, None, 'Hauptstraße 5', '48.13, 11.57', 'Atlantis', 'DE']
+
+def test_matches_row_wise_resolution_on_shipped_export():
+    export = pd.read_csv(os.path.join(ROOT, SOURCE_CSV), dtype=EXPORT_DTYPES)
+    export.columns = EXPORT_COLUMNS
+    countries = export['country']
+    cleaned = clean_country_codes(countries)
+
+    assert cleaned.index.equals(countries.index)
+    assert cleaned.astype(object).tolist() == [resolve_country(value) for value in countries]
+    assert cleaned.value_counts()['DE'] > len(countries) // 2
+
+def test_resolves_aliases_and_junk():
+    countries = pd.Series(RAW_COUNTRIES, index=range(100, 100 + len(RAW_COUNTRIES)), name='country')
+    cleaned = clean_country_codes(countries)
+
+    assert cleaned.index.equals(countries.index) and cleaned.name == 'country'
+    assert list(cleaned.cat.categories[:len(COUNTRY_CATEGORIES)]) == COUNTRY_CATEGORIES
+    assert cleaned.astype(object).tolist() == ['DE', 'DE', 'DE', 'AT', 'AT', 'GB', 'SI', 'LU', 'CH', '', '', '',
+                                               '', '', '', '', '', 'DE']
+
+def test_extra_aliases():
+    cleaned = clean_country_codes(pd.Series(['Atlantis', 'Bayern', 'DE']), {' atlantis ': 'xa', 'Bayern': 'DE'})
+    assert cleaned.astype(object).tolist() == ['XA', 'DE', 'DE']
+    assert 'XA' in cleaned.cat.categories
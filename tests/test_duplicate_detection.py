@@ -0,0 +1,64 @@
+"""Blocking, sorted-neighbourhood pairing and clustering of duplicate customers"""
+
+import numpy as np
+import pandas as pd
+
+from duplicate_detection import cluster_pairs, detect_duplicates, find_duplicate_pairs
+
+def customer_frame(rows):
+    df = pd.DataFrame(rows, columns=['customer_identifier', 'street', 'postal_code', 'city'])
+    df['id'] = range(1, len(df) + 1)
+    df['customer_number'] = 1000 + df['id']
+    df['country'] = 'DE'
+    return df
+
+CUSTOMERS = customer_frame([
+    ('Stadtwerke Gießen GmbH', 'Lahnstraße 31', '35398', 'Gießen'),        # 1: duplicate of 2
+    ('Stadtwerke Giessen', 'Lahnstr. 31', '35398', 'Gießen'),               # 2
+    ('Stadtwerke Gießen GmbH', 'Marburger Straße 12', '35398', 'Gießen'),   # 3: near miss, other street
+    ('Bäckerei Schmidt', 'Bahnhofstraße 4', '72221', 'Haiterbach'),         # 4: same as 5 but another block
+    ('Bäckerei Schmidt', 'Bahnhofstraße 4', '72222', 'Haiterbach'),         # 5
+    ('Autohaus Meyer KG', 'Industriestr. 7', '80331', 'München'),           # 6: 6, 7 and 8 form one cluster
+    ('Autohaus Meyer', 'Industriestraße 7', '80331', 'München'),            # 7
+    ('Autohaus Meyer', 'Industriestraße 7a', '80331', 'München'),           # 8
+])
+
+def pair_set(id_a, id_b):
+    return set(zip(id_a.tolist(), id_b.tolist()))
+
+def test_pairs():
+    id_a, id_b, scores = find_duplicate_pairs(CUSTOMERS, workers=1)
+    pairs = pair_set(id_a, id_b)
+
+    assert (1, 2) in pairs
+    assert (1, 3) not in pairs and (2, 3) not in pairs
+    assert (4, 5) not in pairs
+    assert {(6, 7), (7, 8)} <= pairs
+    assert (id_a < id_b).all() and (scores >= 0.8).all()
+
+def test_window_limits_comparisons():
+    # Customer 2 sorts between 1 and 3 by street and by name, so only a window of 3 compares 1 with 3
+    df = customer_frame([
+        ('Kanzlei Abel', 'Hafenweg 3', '10115', 'Berlin'),
+        ('Kanzlei Abel Notar', 'Hafenweg 3/1', '10115', 'Berlin'),
+        ('Kanzlei Abel Partner', 'Hafenweg 3 a', '10115', 'Berlin'),
+    ])
+
+    assert (1, 3) in pair_set(*find_duplicate_pairs(df, window=3, workers=1)[:2])
+    assert (1, 3) not in pair_set(*find_duplicate_pairs(df, window=2, workers=1)[:2])
+
+def test_cluster_pairs():
+    clusters = cluster_pairs(np.array([7, 6, 1, 10]), np.array([8, 7, 2, 11]), np.array([0.9, 0.95, 0.85, 0.8]))
+
+    assert clusters['id'].tolist() == [1, 2, 6, 7, 8, 10, 11]
+    assert clusters['cluster'].tolist() == [1, 1, 2, 2, 2, 3, 3]
+    assert clusters['score'].tolist() == [0.85, 0.85, 0.95, 0.95, 0.9, 0.8, 0.8]
+
+def test_detect_duplicates(tmp_path):
+    filename = str(tmp_path / 'customer_duplicates.csv')
+    detect_duplicates(CUSTOMERS, filename, workers=1)
+    result = pd.read_csv(filename)
+
+    assert list(result.columns) == ['cluster', 'id', 'customer_number', 'customer_identifier', 'street',
+                                    'postal_code', 'city', 'score']
+    assert result.groupby('cluster')['id'].apply(list).tolist() == [[1, 2], [6, 7, 8]]
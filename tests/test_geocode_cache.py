@@ -0,0 +1,100 @@
+"""GeocodeCache lookups, expiry, eviction and persistence"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from geocode_cache import MISS, GeocodeCache
+from geocoding_pipeline import Provider, geocode_many
+
+KNOWN = {
+    'Nagolder Straße 16, 72221, Haiterbach, DE': (48.5282, 8.6486),
+    'Marienplatz 1, 80331, München, DE': (48.1374, 11.5755),
+}
+
+class StubGeocoder:
+    """Answers from KNOWN and counts the remote calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def geocode(self, address):
+        with self.lock:
+            self.calls += 1
+        if address not in KNOWN:
+            return None
+        latitude, longitude = KNOWN[address]
+        return SimpleNamespace(latitude=latitude, longitude=longitude, raw={'importance': 0.5})
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode_cache.sqlite'))
+    yield cache
+    cache.close()
+
+def test_hit_after_miss(cache):
+    assert cache.get('Marienplatz 1, München') is MISS
+    cache.put('Marienplatz 1, München', 48.1374, 11.5755, 'nominatim', 0.5)
+
+    # The key ignores case, whitespace and separator spacing
+    assert cache.get('marienplatz 1 ,  MÜNCHEN') == {'latitude': 48.1374, 'longitude': 11.5755,
+                                                      'provider': 'nominatim', 'confidence': 0.5}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_negative_result_is_cached(cache):
+    cache.put('Nowhere 1')
+    assert cache.get('Nowhere 1') is None
+
+def test_rerun_makes_no_remote_calls(cache):
+    geocoder = StubGeocoder()
+    providers = [Provider('stub', geocoder)]
+    addresses = list(KNOWN) + ['Unbekannte Straße 1, 99999, Nirgendwo, DE']
+
+    first, stats = geocode_many(addresses, providers, cache=cache, max_concurrent=2)
+    assert geocoder.calls == 3
+    assert (stats['found'], stats['not_found'], stats['cached']) == (2, 1, 0)
+
+    second, stats = geocode_many(addresses, providers, cache=cache, max_concurrent=2)
+    assert geocoder.calls == 3
+    assert stats['cached'] == 3
+    assert second == first
+
+def test_ttl_expiry(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode_cache.sqlite'), ttl=100, negative_ttl=10)
+    cache.put('Marienplatz 1, München', 48.1374, 11.5755, now=1000)
+    cache.put('Nowhere 1', now=1000)
+
+    assert cache.get('Nowhere 1', now=1005) is None
+    assert cache.get('Nowhere 1', now=1011) is MISS
+    assert cache.get('Marienplatz 1, München', now=1100)['latitude'] == 48.1374
+    assert cache.get('Marienplatz 1, München', now=1101) is MISS
+    assert len(cache) == 0
+    cache.close()
+
+def test_lru_eviction(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode_cache.sqlite'), max_entries=2)
+    cache.put('a', 1.0, 1.0, now=1)
+    cache.put('b', 2.0, 2.0, now=2)
+    cache.get('a', now=3)
+    cache.put('c', 3.0, 3.0, now=4)
+
+    assert len(cache) == 2
+    assert cache.get('b', now=5) is MISS
+    assert cache.get('a', now=5) is not MISS
+    assert cache.get('c', now=5) is not MISS
+    cache.close()
+
+def test_persists_across_reopening(tmp_path):
+    path = str(tmp_path / 'geocode_cache.sqlite')
+    cache = GeocodeCache(path)
+    cache.put('Marienplatz 1, München', 48.1374, 11.5755, 'nominatim')
+    cache.put('Nowhere 1')
+    cache.close()
+
+    reopened = GeocodeCache(path)
+    assert reopened.get('Marienplatz 1, München')['provider'] == 'nominatim'
+    assert reopened.get('Nowhere 1') is None
+    assert len(reopened) == 2
+    reopened.close()
@@ -0,0 +1,22 @@
+"""Rate limiting of the geocoding providers"""
+
+import pytest
+
+from geocoding_pipeline import build_providers
+
+def config(delay, **nominatim):
+    return {'data_processing': {'delay_between_requests': delay},
+            'geocoding_services': {'nominatim': {'enabled': True, **nominatim}}}
+
+@pytest.mark.parametrize('delay', [0, -1])
+def test_non_positive_delay_disables_limiter(delay):
+    [provider] = build_providers(config(delay))
+    assert provider.limiter is None
+
+def test_delay_sets_rate():
+    [provider] = build_providers(config(0.5))
+    assert provider.limiter.rate == 2.0
+
+def test_requests_per_second_overrides_delay():
+    [provider] = build_providers(config(0, requests_per_second=5))
+    assert (provider.limiter.rate, provider.limiter.capacity) == (5, 5)
@@ -0,0 +1,63 @@
+"""Incremental rebuilds give the same map data as a full run"""
+
+import json
+import os
+
+import pandas as pd
+
+from conftest import ROOT
+from improved_data_processor import (SOURCE_CSV, clean_customer_frame, create_improved_geocoded_data,
+                                     read_customer_export, save_data_for_map, update_map_data_incrementally)
+
+def read_export(rows):
+    """First rows of the shipped export that have a city, so every row becomes a customer"""
+    export = pd.read_csv(os.path.join(ROOT, SOURCE_CSV), dtype=str)
+    city = export.iloc[:, 5].fillna('').str.strip()
+    return export[(city != '') & (city != '0')].head(rows).reset_index(drop=True)
+
+def write_export(rows, filename):
+    rows.to_csv(filename, index=False)
+    return str(filename)
+
+def load_customers(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return json.load(f)['customers']
+
+def full_run(source, filename):
+    df = clean_customer_frame(read_customer_export(source), verbose=False)
+    save_data_for_map(create_improved_geocoded_data(df), str(filename))
+    return load_customers(filename)
+
+def test_matches_full_run_after_changes(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    export = read_export(400)
+    incremental_file = str(tmp_path / 'customers_for_map.json')
+
+    source = write_export(export.iloc[:300], tmp_path / 'export_1.csv')
+    update_map_data_incrementally(source, incremental_file)
+    assert load_customers(incremental_file) == full_run(source, tmp_path / 'full_1.json')
+
+    # Append rows, change one row's city and drop another row
+    changed = export.copy()
+    changed.iloc[10, 5] = 'Köln'
+    changed = changed.drop(index=20)
+    source = write_export(changed, tmp_path / 'export_2.csv')
+    capsys.readouterr()
+    update_map_data_incrementally(source, incremental_file)
+
+    assert 'Incremental update: 298 unchanged, 101 new or changed, 2 removed' in capsys.readouterr().out
+    assert load_customers(incremental_file) == full_run(source, tmp_path / 'full_2.json')
+
+def test_unchanged_export_reuses_every_row(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    export = read_export(200)
+    source = write_export(export, tmp_path / 'export.csv')
+    filename = str(tmp_path / 'customers_for_map.json')
+
+    update_map_data_incrementally(source, filename)
+    first = load_customers(filename)
+    capsys.readouterr()
+    update_map_data_incrementally(source, filename)
+
+    assert 'Incremental update: 200 unchanged, 0 new or changed, 0 removed' in capsys.readouterr().out
+    assert load_customers(filename) == first
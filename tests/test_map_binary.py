@@ -0,0 +1,79 @@
+"""Round trips of the columnar binary map format"""
+
+import struct
+
+import numpy as np
+import pytest
+
+from map_binary import (FLOAT32, FORMAT_VERSION, HEADER, INT32, STRING, read_columns, read_map_binary,
+                        write_columns, write_map_binary)
+
+CUSTOMERS = [
+    {'id': 1, 'customer_number': 20847, 'customer_identifier': 'Schöttle Getränke-Service', 'is_active': True,
+     'street': 'Nagolder Straße 16', 'postal_code': '72221', 'city': 'Haiterbach', 'country': 'DE',
+     'latitude': 48.5282123456789, 'longitude': 8.6485987654321},
+    {'id': 2, 'customer_number': 21204, 'customer_identifier': 'MB Well Service', 'is_active': False,
+     'street': '', 'postal_code': '', 'city': 'Düsseldorf', 'country': 'DE',
+     'latitude': 51.2277, 'longitude': 6.7735},
+    {'id': 3, 'customer_number': 0, 'customer_identifier': 'Stadtwerke Gießen', 'is_active': True,
+     'street': 'Weißer Weg 3', 'postal_code': '35390', 'city': 'Gießen', 'country': 'DE',
+     'latitude': 50.5841, 'longitude': 8.6784},
+]
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / 'customers.bin')
+    write_map_binary(CUSTOMERS, filename)
+    df = read_map_binary(filename)
+
+    assert len(df) == len(CUSTOMERS)
+    for column in ['id', 'customer_number', 'is_active', 'customer_identifier', 'street', 'postal_code', 'city',
+                   'country']:
+        assert df[column].tolist() == [customer[column] for customer in CUSTOMERS]
+    assert df['full_address'].tolist() == ['Nagolder Straße 16, 72221, Haiterbach, DE', 'Düsseldorf, DE',
+                                           'Weißer Weg 3, 35390, Gießen, DE']
+
+def test_coordinates_are_float32(tmp_path):
+    filename = str(tmp_path / 'customers.bin')
+    write_map_binary(CUSTOMERS, filename)
+    df = read_map_binary(filename)
+
+    for column in ['latitude', 'longitude']:
+        expected = np.array([customer[column] for customer in CUSTOMERS])
+        assert df[column].dtype == np.float32
+        assert np.array_equal(df[column].to_numpy(), expected.astype(np.float32))
+        # float32 keeps about 7 significant digits: well under a metre at these coordinates
+        assert np.abs(df[column].to_numpy() - expected).max() < 1e-5
+
+def test_empty_customer_list(tmp_path):
+    filename = str(tmp_path / 'customers.bin')
+    write_map_binary([], filename)
+    df = read_map_binary(filename)
+
+    assert len(df) == 0
+    assert 'customer_identifier' in df.columns and 'full_address' in df.columns
+
+def test_write_columns_round_trip(tmp_path):
+    filename = str(tmp_path / 'columns.bin')
+    values = [1.5, -2.25, 3.0]
+    write_columns(filename, 3, [('value', FLOAT32, values), ('count', INT32, [1, -2, 3]),
+                                ('name', STRING, ['ä', 'ß', ''])])
+    columns = read_columns(filename)
+
+    assert columns['value'].tolist() == values
+    assert columns['count'].tolist() == [1, -2, 3]
+    assert columns['name'].tolist() == ['ä', 'ß', '']
+
+@pytest.mark.parametrize('magic, version, message', [
+    (b'XXXX', FORMAT_VERSION, 'not a customer map binary file'),
+    (b'AWCB', FORMAT_VERSION + 1, 'Unsupported customer map binary version'),
+])
+def test_rejects_bad_header(tmp_path, magic, version, message):
+    filename = str(tmp_path / 'customers.bin')
+    write_map_binary(CUSTOMERS, filename)
+    with open(filename, 'r+b') as f:
+        _, _, row_count, column_count = HEADER.unpack(f.read(HEADER.size))
+        f.seek(0)
+        f.write(struct.pack('<4sIII', magic, version, row_count, column_count))
+
+    with pytest.raises(ValueError, match=message):
+        read_map_binary(filename)
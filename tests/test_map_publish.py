@@ -0,0 +1,94 @@
+"""Deltas between published versions turn the old customers into the new ones
+
+tests/fixtures/customer_deltas.json is shared with the client
+(react-customer-map/src/utils/customerDeltas.test.js), so both sides are
+held to the same delta and checksums.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+from map_publish import apply_delta, build_delta, customer_keys, customers_checksum
+
+FIXTURE = os.path.join(ROOT, 'tests', 'fixtures', 'customer_deltas.json')
+
+@pytest.fixture(scope='module')
+def fixture():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_fixture_checksums(fixture):
+    assert customers_checksum(fixture['previous']) == fixture['checksums']['previous']
+    assert customers_checksum(fixture['current']) == fixture['checksums']['current']
+    assert fixture['checksums']['previous'] != fixture['checksums']['current']
+
+def test_fixture_delta(fixture):
+    delta = build_delta(fixture['previous'], fixture['current'], 1, 2)
+
+    assert json.loads(json.dumps(delta)) == fixture['delta']
+    assert apply_delta(fixture['previous'], delta) == fixture['current']
+    assert delta['checksum'] == fixture['checksums']['current']
+
+def test_keys_tell_duplicates_apart(fixture):
+    assert customer_keys(fixture['previous']) == ['20847', '0', '20850', '20850#2', '21000', '21001', '21002', '0#2']
+
+def random_customers(rng, count):
+    numbers = rng.integers(0, count // 2, size=count)
+    return [{'id': position + 1, 'customer_number': int(number), 'customer_identifier': f'Kunde {number} Groß',
+             'is_active': bool(rng.random() < 0.8), 'city': str(rng.choice(['Köln', 'Wien', 'Zürich', ''])),
+             'latitude': float(rng.uniform(47, 55)), 'longitude': float(rng.uniform(6, 15))}
+            for position, number in enumerate(numbers)]
+
+def change(rng, previous):
+    """Remove, update, move, swap and insert customers of previous"""
+    current = [dict(record) for record in previous if rng.random() > 0.1]
+    for record in current:
+        roll = rng.random()
+        if roll < 0.1:
+            record['is_active'] = not record['is_active']
+        elif roll < 0.2:
+            record['latitude'] += 0.01
+        elif roll < 0.25:
+            record['customer_identifier'] += ' GmbH'
+            record['longitude'] -= 0.02
+    for _ in range(len(current) // 20):
+        i, j = rng.integers(0, len(current), size=2)
+        current[i], current[j] = current[j], current[i]
+    for added in random_customers(rng, len(current) // 10):
+        current.insert(int(rng.integers(0, len(current) + 1)), added)
+    for position, record in enumerate(current):
+        record['id'] = position + 1
+    return current
+
+@pytest.mark.parametrize('seed', range(5))
+def test_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    versions = [random_customers(rng, 300)]
+    for _ in range(3):
+        versions.append(change(rng, versions[-1]))
+
+    # Chained like a client catching up over several versions
+    customers = versions[0]
+    for version, (previous, current) in enumerate(zip(versions, versions[1:]), 1):
+        delta = build_delta(previous, current, version, version + 1)
+        delta = json.loads(json.dumps(delta))
+        customers = apply_delta(customers, delta)
+        assert customers == current
+        assert customers_checksum(customers) == delta['checksum']
+
+@pytest.mark.parametrize('current', [[], 'same'])
+def test_round_trip_edge_cases(fixture, current):
+    previous = fixture['previous']
+    current = [dict(record) for record in previous] if current == 'same' else current
+
+    delta = build_delta(previous, current, 1, 2)
+    assert apply_delta(previous, delta) == current
+    assert apply_delta([], build_delta([], previous, 0, 1)) == previous
+
+def test_changed_fields_need_a_snapshot(fixture):
+    current = [dict(record, region='Süd') for record in fixture['previous']]
+    assert build_delta(fixture['previous'], current, 1, 2) is None
@@ -0,0 +1,59 @@
+"""The parallel pipeline gives the same customers as a serial run"""
+
+import pandas as pd
+import pytest
+
+from improved_data_processor import (EXPORT_COLUMNS, EXPORT_DTYPES, clean_customer_frame,
+                                     create_improved_geocoded_data, process_customers_parallel,
+                                     read_customer_export, read_export_partition, split_export)
+
+HEADER = 'Kunden-Nr.,Kundenkürzel,Kunde aktiv j/n,L-Straße,L-PLZ,L-Ort,L-Land\n'
+
+CITIES = [('80331', 'München', 'DE'), ('50667', 'Köln', 'DE'), ('1010', 'Wien', 'AT'), ('', 'Halle/Westfalen', 'DE'),
+          ('10115', 'Berlin-Mitte', 'DE'), ('8001', 'Zürich', 'CH')]
+
+def write_export(path):
+    """An export whose middle record has a long quoted street with commas, quotes and line breaks"""
+    rows = []
+    for number in range(1, 41):
+        postal_code, city, country = CITIES[number % len(CITIES)]
+        name = f'"Kunde {number}, ""Wasser"" GmbH"' if number % 3 == 0 else f'Kunde {number}'
+        rows.append(f'{20000 + number},{name},{"ja" if number % 4 else "nein"},Weg {number},'
+                    f'{postal_code},{city},{country}\n')
+    street = '"Hinterhof, Aufgang ""B""\n' + 'Lieferung über Tor 3,\n' * 60 + 'Hauptstraße 1"'
+    rows.insert(20, f'30000,Mitte GmbH,ja,{street},80331,München,DE\n')
+    path.write_text(HEADER + ''.join(rows), encoding='utf-8')
+    return str(path)
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return write_export(tmp_path / 'export.csv')
+
+def test_partition_boundary_inside_quoted_field(export):
+    with open(export, 'rb') as f:
+        data = f.read()
+    start = len(HEADER.encode('utf-8'))
+    street_start = data.index(b'"Hinterhof')
+    street_end = data.index(b'Hauptstra', street_start)
+    # The middle of the data rows, where a two-way split starts looking for a line end, is inside the street
+    assert street_start < start + (len(data) - start) // 2 < street_end
+
+    units = split_export(export, parts=2)
+    assert len(units) == 2
+    assert units[0][2] == data.index(b'\n', street_end) + 1
+
+    rows = pd.concat([read_export_partition(unit) for unit in units], ignore_index=True)
+    expected = pd.read_csv(export, dtype=EXPORT_DTYPES)
+    expected.columns = EXPORT_COLUMNS
+    pd.testing.assert_frame_equal(rows, expected)
+
+@pytest.mark.parametrize('workers, parts', [(1, 1), (1, 2), (1, 7), (2, 2), (2, 5), (3, 12)])
+def test_matches_serial_run(export, workers, parts):
+    serial = create_improved_geocoded_data(clean_customer_frame(read_customer_export(export), verbose=False))
+    records, facets = process_customers_parallel(split_export(export, parts), workers=workers)
+
+    assert len(serial) == 41
+    assert records == serial
+    assert facets.total == len(serial)
+    assert facets.facet_ids()['status']['active'] == [record['id'] for record in serial if record['is_active']]
@@ -0,0 +1,95 @@
+"""KD-tree radius and nearest lookups give the same customers as brute force"""
+
+import numpy as np
+import pytest
+
+import proximity
+from customer_query import haversine_km
+from proximity import ProximityIndex
+
+def customers(count=3000, seed=7):
+    """Clustered points around a few cities plus points spread over the globe, with exact duplicates"""
+    rng = np.random.default_rng(seed)
+    centres = np.array([[48.14, 11.58], [50.94, 6.96], [53.55, 10.0], [-33.87, 151.21], [64.15, -21.94],
+                        [1.29, 103.85], [-17.7, 179.9], [-17.7, -179.9]])
+    picks = rng.integers(0, len(centres), size=count)
+    lat = centres[picks, 0] + rng.normal(0, 0.3, count)
+    lng = centres[picks, 1] + rng.normal(0, 0.3, count)
+    spread = count // 5
+    lat[:spread] = rng.uniform(-89, 89, spread)
+    lng[:spread] = rng.uniform(-180, 180, spread)
+    # Every tenth customer shares the position of the one before, so ties are broken by id
+    lat[10::10], lng[10::10] = lat[9:-1:10], lng[9:-1:10]
+    lng = (lng + 180) % 360 - 180
+    ids = rng.permutation(np.arange(100, 100 + count))
+    return lat, lng, ids
+
+def queries(lat, lng, count=150, seed=11):
+    rng = np.random.default_rng(seed)
+    sample = rng.integers(0, len(lat), size=count)
+    return lat[sample] + rng.normal(0, 0.2, count), lng[sample] + rng.normal(0, 0.2, count)
+
+def brute_force_nearest(lat, lng, ids, query_lat, query_lng, k):
+    distances = [haversine_km(point_lat, point_lng, lat, lng) for point_lat, point_lng in zip(query_lat, query_lng)]
+    nearest = [np.lexsort((ids, distance))[:k] for distance in distances]
+    return (np.array([ids[order] for order in nearest]),
+            np.array([distance[order] for distance, order in zip(distances, nearest)]))
+
+@pytest.fixture(params=[1, 2], ids=['serial', 'pool'])
+def workers(request, monkeypatch):
+    # Let small batches reach the process pool too
+    monkeypatch.setattr(proximity, 'MIN_PARALLEL_QUERIES', 0)
+    return request.param
+
+@pytest.mark.parametrize('leaf_size, k', [(32, 1), (32, 10), (4, 7), (500, 25)])
+def test_nearest_matches_brute_force(workers, leaf_size, k):
+    lat, lng, ids = customers()
+    query_lat, query_lng = queries(lat, lng)
+    index = ProximityIndex(lat, lng, ids, leaf_size=leaf_size)
+
+    found, km = index.knn(query_lat, query_lng, k=k, workers=workers, batch_size=40)
+    expected, expected_km = brute_force_nearest(lat, lng, ids, query_lat, query_lng, k)
+
+    np.testing.assert_array_equal(found, expected)
+    np.testing.assert_allclose(km, expected_km, rtol=1e-9, atol=1e-6)
+
+@pytest.mark.parametrize('leaf_size, radius_km', [(32, 0.5), (32, 25.0), (4, 80.0), (500, 3000.0)])
+def test_radius_matches_brute_force(workers, leaf_size, radius_km):
+    lat, lng, ids = customers()
+    query_lat, query_lng = queries(lat, lng)
+    index = ProximityIndex(lat, lng, ids, leaf_size=leaf_size)
+
+    owners, found, km = index.within_radius(query_lat, query_lng, radius_km, workers=workers, batch_size=40)
+
+    expected_owners, expected_ids, expected_km = [], [], []
+    for query, (point_lat, point_lng) in enumerate(zip(query_lat, query_lng)):
+        distance = haversine_km(point_lat, point_lng, lat, lng)
+        inside = np.nonzero(distance <= radius_km)[0]
+        inside = inside[np.lexsort((ids[inside], distance[inside]))]
+        expected_owners.extend([query] * len(inside))
+        expected_ids.extend(ids[inside])
+        expected_km.extend(distance[inside])
+
+    assert len(owners) > 0
+    np.testing.assert_array_equal(owners, expected_owners)
+    np.testing.assert_array_equal(found, expected_ids)
+    np.testing.assert_allclose(km, expected_km, rtol=1e-9, atol=1e-6)
+
+def test_fewer_customers_than_k():
+    index = ProximityIndex([48.1, 48.2, 52.5], [11.5, 11.6, 13.4], [7, 8, 9])
+
+    found, km = index.knn([48.1], [11.5], k=5)
+    assert found.tolist() == [[7, 8, 9, -1, -1]]
+    assert km[0, 0] == 0 and np.isinf(km[0, 3:]).all()
+
+    frame = index.knn([48.1], [11.5], k=5, frame=True)
+    assert frame['id'].tolist() == [7, 8, 9]
+    assert frame['rank'].tolist() == [1, 2, 3]
+
+def test_empty_index():
+    index = ProximityIndex([], [], [])
+
+    found, km = index.knn([48.1, 50.0], [11.5, 8.0], k=2)
+    assert (found == -1).all() and np.isinf(km).all()
+    owners, found, km = index.within_radius([48.1], [11.5], 100.0)
+    assert len(owners) == len(found) == len(km) == 0
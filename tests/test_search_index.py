@@ -0,0 +1,41 @@
+"""Search index round trip and staleness check"""
+
+import json
+
+import pytest
+
+from search_index import SearchIndex, write_search_index
+
+CUSTOMERS = [
+    {'id': 1, 'customer_identifier': 'Stadtwerke München', 'customer_number': 101, 'city': 'München', 'country': 'DE'},
+    {'id': 2, 'customer_identifier': 'Rheinenergie', 'customer_number': 102, 'city': 'Köln', 'country': 'DE'},
+    {'id': 3, 'customer_identifier': 'AB', 'customer_number': 103, 'city': None, 'country': 'AT'},
+]
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / 'customers_search_index.json')
+    built = write_search_index(CUSTOMERS, filename)
+    loaded = SearchIndex.load(CUSTOMERS, filename)
+
+    with open(filename, 'r', encoding='utf-8') as f:
+        assert 'docs' not in json.load(f)
+    for query, field in [('MUENCHEN', 'city'), ('münchen', None), ('energie', None), ('10', None), ('at', None),
+                         ('null', 'city'), ('xyz', None)]:
+        assert loaded.search(query, field) == built.search(query, field)
+    assert loaded.search('MUENCHEN', field='city') == [1]
+    assert loaded.search('10') == [1, 2, 3]
+
+@pytest.mark.parametrize('customers', [
+    CUSTOMERS[:2],
+    [CUSTOMERS[0], dict(CUSTOMERS[1], city='Bonn'), CUSTOMERS[2]],
+    [dict(customer, id=customer['id'] + 10) for customer in CUSTOMERS],
+])
+def test_rejects_other_customers(tmp_path, customers):
+    filename = str(tmp_path / 'customers_search_index.json')
+    write_search_index(CUSTOMERS, filename)
+
+    with pytest.raises(ValueError, match='built from other customer data'):
+        SearchIndex.load(customers, filename)
+
+def test_open_default_without_index(tmp_path):
+    assert SearchIndex.open_default(CUSTOMERS, str(tmp_path / 'missing.json')) is None